@@ -0,0 +1,108 @@
+"""
+Measures how many attacker x move x defender combinations the damage
+calculator evaluates per second, with every pokemon attacking every
+pokemon with the same damaging moves, and with its own movepool.
+Requires numpy.
+
+Usage:
+    python -m benchmarks.damage_benchmark
+    python -m benchmarks.damage_benchmark --snapshot "snapshot.pdx"
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.fixtures import PokedexFixtures
+
+
+def build_snapshot(directory: str, pokemon: int) -> str:
+    """
+    Writes the generated fixtures to a snapshot.
+    :param directory: a string, the directory of the snapshot.
+    :param pokemon: an int, the number of generated pokemon.
+    :return: a string, the path of the snapshot.
+    """
+    from pokemonretriever.pokedex_snapshot import PokedexSnapshot
+    fixtures = PokedexFixtures(pokemon=pokemon)
+    snapshot = PokedexSnapshot()
+    for req_type in ("pokemon", "move", "ability"):
+        for record in fixtures.records(req_type):
+            snapshot.add(req_type, record)
+    path = os.path.join(directory, "snapshot.pdx")
+    snapshot.save(path)
+    return path
+
+
+def measure(path: str, moves: int) -> dict:
+    """
+    Ranks the damage of every pokemon against every pokemon.
+
+    :param path: a string, the path of the snapshot.
+    :param moves: an int, the number of moves every attacker uses.
+    :return: a dictionary of the measurements
+    """
+    import numpy
+    from pokemonretriever.pokedex_damage import PokedexDamage
+    from pokemonretriever.pokedex_snapshot import PokedexSnapshot
+    store = PokedexSnapshot.load(path)
+    start = time.perf_counter()
+    calculator = PokedexDamage.from_store(store)
+    load = time.perf_counter() - start
+    pokemon = numpy.arange(len(calculator.stats))
+    move_rows = numpy.flatnonzero(calculator.moves.damaging)[:moves]
+    start = time.perf_counter()
+    calculator.rank(pokemon, move_rows, pokemon, limit=10)
+    batch = time.perf_counter() - start
+    start = time.perf_counter()
+    calculator.rank(pokemon[:1], None, pokemon, limit=10)
+    movepool = time.perf_counter() - start
+    combinations = len(pokemon) * len(move_rows) * len(pokemon)
+    return {"pokemon": len(pokemon),
+            "moves": len(move_rows),
+            "load_seconds": round(load, 4),
+            "combinations": combinations,
+            "batch_seconds": round(batch, 4),
+            "combinations_per_second": round(combinations / batch),
+            "movepool_seconds": round(movepool, 4)}
+
+
+def main():
+    """
+    Runs the damage benchmark.
+    :return: None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshot", type=str,
+                        help="Use the pokemon and moves of a snapshot "
+                             "instead of the generated fixtures.")
+    parser.add_argument("--pokemon", type=int,
+                        default=PokedexFixtures.NATIONAL_DEX,
+                        help="The number of generated pokemon.")
+    parser.add_argument("--moves", type=int, default=100,
+                        help="The number of moves every pokemon uses.")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the results as json.")
+    args = parser.parse_args()
+    if args.snapshot:
+        result = measure(args.snapshot, args.moves)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            result = measure(build_snapshot(directory, args.pokemon),
+                             args.moves)
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"Pokemon:                 {result['pokemon']}")
+    print(f"Moves per attacker:      {result['moves']}")
+    print(f"Load:                    {result['load_seconds']} s")
+    print(f"Combinations:            {result['combinations']}")
+    print(f"Ranked in:               {result['batch_seconds']} s")
+    print(f"Combinations per second: {result['combinations_per_second']}")
+    print(f"One movepool vs the dex: {result['movepool_seconds']} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Generates PokeAPI-shaped fixtures for the benchmarks, so they can run
+without the real API.
+"""
+
+import random
+
+TYPES = ("normal", "fire", "water", "electric", "grass", "ice", "fighting",
+         "poison", "ground", "flying", "psychic", "bug", "rock", "ghost",
+         "dragon", "dark", "steel", "fairy")
+STATS = ("hp", "attack", "defense", "special-attack", "special-defense",
+         "speed")
+DAMAGE_CLASSES = ("physical", "special", "status")
+GENERATIONS = tuple(f"generation-{numeral}" for numeral in
+                    ("i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix"))
+VERSION_GROUPS = ("red-blue", "yellow", "gold-silver", "crystal",
+                  "ruby-sapphire", "emerald", "firered-leafgreen",
+                  "diamond-pearl", "platinum", "heartgold-soulsilver",
+                  "black-white", "black-2-white-2", "x-y",
+                  "omega-ruby-alpha-sapphire", "sun-moon",
+                  "ultra-sun-ultra-moon", "sword-shield",
+                  "scarlet-violet")
+BASE_URL = "https://pokeapi.co/api/v2/{}/{}/"
+
+
+class PokedexFixtures:
+    """
+    A deterministic, synthetic copy of the PokeAPI dataset. Records have
+    the same shape as real responses, including the large fields the
+    application does not use, such as sprites and game indices.
+    """
+    NATIONAL_DEX = 1025
+    MOVES = 919
+    ABILITIES = 307
+
+    def __init__(self, pokemon: int = NATIONAL_DEX, moves: int = MOVES,
+                 abilities: int = ABILITIES, seed: int = 3522):
+        """
+        Generates the fixtures.
+
+        :param pokemon: an int, the number of pokemon.
+        :param moves: an int, the number of moves.
+        :param abilities: an int, the number of abilities.
+        :param seed: an int, the seed of the generator.
+        """
+        self.random = random.Random(seed)
+        self.resources = {"pokemon": {}, "move": {}, "ability": {},
+                          "stat": {}}
+        for stat_id, name in enumerate(STATS, 1):
+            self.add("stat", {"id": stat_id, "name": name,
+                              "is_battle_only": False})
+        for move_id in range(1, moves + 1):
+            self.add("move", self.__move(move_id))
+        holders = {ability_id: [] for ability_id in range(1, abilities + 1)}
+        for pokemon_id in range(1, pokemon + 1):
+            record = self.__pokemon(pokemon_id, moves, abilities)
+            for ability in record["abilities"]:
+                holders[int(ability["ability"]["url"].split("/")[-2])] \
+                    .append(record["name"])
+            self.add("pokemon", record)
+        for ability_id, names in holders.items():
+            self.add("ability", self.__ability(ability_id, names))
+
+    def add(self, req_type: str, record: dict):
+        """
+        Adds a record, reachable by id and by name.
+        :param req_type: a string
+        :param record: a dictionary
+        :return: None
+        """
+        self.resources[req_type][str(record["id"])] = record
+        self.resources[req_type][record["name"]] = record
+
+    def get(self, req_type: str, req_id):
+        """
+        Looks up a record by id or name.
+        :param req_type: a string
+        :param req_id: a string or int
+        :return: a dictionary, or None
+        """
+        return self.resources.get(req_type, {}) \
+            .get(str(req_id).strip().lower())
+
+    def records(self, req_type: str) -> list:
+        """
+        Gets every record of a resource type, in id order.
+        :param req_type: a string
+        :return: a list of dictionaries
+        """
+        records = {id(record): record for record
+                   in self.resources[req_type].values()}
+        return sorted(records.values(), key=lambda record: record["id"])
+
+    @staticmethod
+    def reference(req_type: str, resource_id: int, name: str) -> dict:
+        """
+        Builds a named API resource reference.
+        :param req_type: a string
+        :param resource_id: an int
+        :param name: a string
+        :return: a dictionary
+        """
+        return {"name": name, "url": BASE_URL.format(req_type, resource_id)}
+
+    def __move(self, move_id: int) -> dict:
+        """
+        Generates a move.
+        :param move_id: an int
+        :return: a dictionary
+        """
+        damage_class = self.random.choice(DAMAGE_CLASSES)
+        status = damage_class == "status"
+        return {
+            "id": move_id, "name": f"move-{move_id}",
+            "accuracy": self.random.choice((None, 70, 85, 90, 95, 100, 100)),
+            "pp": self.random.choice((5, 10, 15, 20, 25, 30, 35, 40)),
+            "power": None if status else self.random.randrange(20, 155, 5),
+            "priority": 0,
+            "type": self.reference("type", 1, self.random.choice(TYPES)),
+            "damage_class": self.reference("move-damage-class", 1,
+                                           damage_class),
+            "generation": self.reference("generation", 1,
+                                         self.random.choice(GENERATIONS)),
+            "effect_entries": [{
+                "effect": "Inflicts regular damage with no additional "
+                          "effect.",
+                "short_effect": "Inflicts regular damage.",
+                "language": {"name": "en", "url": BASE_URL.format(
+                    "language", 9)}}],
+            "flavor_text_entries": [{
+                "flavor_text": "A physical attack in which the user "
+                               "charges and slams into the target.",
+                "language": {"name": "en"},
+                "version_group": {"name": version_group}}
+                for version_group in VERSION_GROUPS],
+            "learned_by_pokemon": [],
+            "target": self.reference("move-target", 10, "selected-pokemon")
+        }
+
+    def __pokemon(self, pokemon_id: int, moves: int,
+                  abilities: int) -> dict:
+        """
+        Generates a pokemon.
+        :param pokemon_id: an int
+        :param moves: an int, the number of moves to choose from.
+        :param abilities: an int, the number of abilities to choose from.
+        :return: a dictionary
+        """
+        move_ids = self.random.sample(range(1, moves + 1),
+                                      min(moves, self.random.randint(20,
+                                                                     110)))
+        ability_ids = self.random.sample(range(1, abilities + 1),
+                                         min(abilities, 3))
+        return {
+            "id": pokemon_id, "name": f"pokemon-{pokemon_id}",
+            "height": self.random.randint(1, 200),
+            "weight": self.random.randint(1, 9999),
+            "base_experience": self.random.randint(30, 340),
+            "types": [{"slot": slot, "type": self.reference("type", 1, name)}
+                      for slot, name in enumerate(self.random.sample(
+                          TYPES, self.random.choice((1, 2))), 1)],
+            "stats": [{"base_stat": self.random.randint(5, 200),
+                       "effort": 0,
+                       "stat": self.reference("stat", stat_id, name)}
+                      for stat_id, name in enumerate(STATS, 1)],
+            "abilities": [{"ability": self.reference(
+                               "ability", ability_id,
+                               f"ability-{ability_id}"),
+                           "is_hidden": slot == 3, "slot": slot}
+                          for slot, ability_id in enumerate(ability_ids, 1)],
+            "moves": [{"move": self.reference("move", move_id,
+                                              f"move-{move_id}"),
+                       "version_group_details": [{
+                           "level_learned_at": self.random.choice(
+                               (0, 0, 0, 1, 5, 10, 20, 30, 40)),
+                           "move_learn_method": {"name": "level-up"},
+                           "version_group": {"name": version_group}}
+                           for version_group in self.random.sample(
+                               VERSION_GROUPS, self.random.randint(1, 12))]}
+                      for move_id in move_ids],
+            "game_indices": [{"game_index": pokemon_id,
+                              "version": {"name": version_group}}
+                             for version_group in VERSION_GROUPS],
+            "sprites": {side: f"https://raw.githubusercontent.com/PokeAPI/"
+                              f"sprites/master/sprites/pokemon/{side}/"
+                              f"{pokemon_id}.png"
+                        for side in ("front_default", "back_default",
+                                     "front_shiny", "back_shiny")}
+        }
+
+    def __ability(self, ability_id: int, holders: list) -> dict:
+        """
+        Generates an ability.
+        :param ability_id: an int
+        :param holders: a list of the names of the pokemon with it.
+        :return: a dictionary
+        """
+        return {
+            "id": ability_id, "name": f"ability-{ability_id}",
+            "generation": self.reference("generation", 3,
+                                         self.random.choice(GENERATIONS)),
+            "effect_entries": [{
+                "effect": "Strengthens moves of the pokemon's own type."
+                          "\n\nThis ability has no effect outside of "
+                          "battle.",
+                "short_effect": "Strengthens moves of the pokemon's type.",
+                "language": {"name": "en"}}],
+            "pokemon": [{"is_hidden": False, "slot": 1,
+                         "pokemon": {"name": name, "url": ""}}
+                        for name in holders]
+        }
@@ -0,0 +1,123 @@
+"""
+Measures the memory retained per Pokemon after loading the full national
+dex, with the compact Pokemon objects and with a reconstruction of the
+original dict-backed ones, on the same payloads.
+
+Usage:
+    python -m benchmarks.memory_benchmark
+    python -m benchmarks.memory_benchmark --snapshot "snapshot.pdx"
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from benchmarks.fixtures import PokedexFixtures
+from pokemonretriever.pokedex_object import Pokemon
+from pokemonretriever.pokedex_parser import PokedexPokemonParser
+
+
+class BaselinePokemon:
+    """
+    The Pokemon object as it was before __slots__, interning and the
+    move arrays: every attribute lives in the instance __dict__, names
+    are the decoded strings, and stats and moves are lists of
+    (name, value) tuples.
+    """
+
+    def __init__(self, name: str, id: int, height: int, weight: int,
+                 types: list, stats: list, abilities: list, moves: list):
+        """
+        Instantiates a BaselinePokemon with the parameters of Pokemon.
+        """
+        self.name = name.title()
+        self.id = id
+        self.height = height
+        self.weight = weight
+        self.type = [pokemon_type['type']['name'] for pokemon_type in types]
+        self.stats = [(stat['stat']['name'], stat['base_stat'])
+                      for stat in stats]
+        self.abilities = [ability['ability']['name']
+                          for ability in abilities]
+        self.moves = [(move['move']['name'],
+                       move['version_group_details'][0]['level_learned_at']
+                       if move['version_group_details'] else "")
+                      for move in moves]
+
+
+def load_payloads(args) -> list:
+    """
+    Gets the raw json of every pokemon to load.
+    :param args: the namespace of the benchmark arguments.
+    :return: a list of strings
+    """
+    if args.snapshot:
+        from pokemonretriever.pokedex_snapshot import PokedexSnapshot
+        store = PokedexSnapshot.load(args.snapshot)
+        return [json.dumps(record) for record in store.records("pokemon")]
+    fixtures = PokedexFixtures(pokemon=args.pokemon)
+    return [json.dumps(record) for record in fixtures.records("pokemon")]
+
+
+def measure(payloads: list, pokemon_type=Pokemon) -> dict:
+    """
+    Decodes and builds every Pokemon, and measures the memory they
+    retain once the decoded responses are released.
+
+    :param payloads: a list of json strings
+    :param pokemon_type: the class to build, Pokemon or BaselinePokemon.
+    :return: a dictionary of the measurements
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    pokemon = [pokemon_type(**PokedexPokemonParser.parse(
+        json.loads(payload))) for payload in payloads]
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"pokemon": len(pokemon),
+            "bytes_before": before,
+            "bytes_after": after,
+            "peak_bytes": peak,
+            "bytes_per_pokemon": round((after - before) / len(pokemon))}
+
+
+def main():
+    """
+    Runs the memory benchmark.
+    :return: None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshot", type=str,
+                        help="Load the pokemon of a snapshot instead of the "
+                             "generated fixtures.")
+    parser.add_argument("--pokemon", type=int,
+                        default=PokedexFixtures.NATIONAL_DEX,
+                        help="The number of generated pokemon.")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the results as json.")
+    args = parser.parse_args()
+    payloads = load_payloads(args)
+    baseline = measure(payloads, BaselinePokemon)
+    compact = measure(payloads)
+    ratio = round(baseline["bytes_per_pokemon"] /
+                  compact["bytes_per_pokemon"], 2)
+    if args.json:
+        print(json.dumps({"baseline": baseline, "compact": compact,
+                          "ratio": ratio}))
+        return
+    print(f"Pokemon loaded:          {compact['pokemon']}")
+    for label, result in (("Baseline", baseline), ("Compact", compact)):
+        print(f"{label}:")
+        print(f"  Traced before loading: {result['bytes_before']} bytes")
+        print(f"  Traced after loading:  {result['bytes_after']} bytes")
+        print(f"  Peak while loading:    {result['peak_bytes']} bytes")
+        print(f"  Retained per Pokemon:  {result['bytes_per_pokemon']} "
+              f"bytes")
+    print(f"Baseline / compact:      {ratio}x")
+
+
+if __name__ == "__main__":
+    main()
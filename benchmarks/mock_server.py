@@ -0,0 +1,261 @@
+"""
+A local stand-in for PokeAPI that serves the benchmark fixtures with a
+configurable latency, jitter and error rate. Resources are served with
+an ETag and a Last-Modified header, and conditional requests for
+resources that did not change are answered with 304 Not Modified.
+
+Usage:
+    python -m benchmarks.mock_server --port 8000 --latency 0.05
+    python3 pokedex.py pokemon --inputdata "1" --no-cache \
+        --api-url "http://127.0.0.1:8000/api/v2"
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from aiohttp import web
+
+from benchmarks.fixtures import PokedexFixtures
+
+
+class MockPokeAPI:
+    """
+    An aiohttp application answering the resource and list endpoints of
+    PokeAPI from a PokedexFixtures. Every response is delayed by the
+    latency plus or minus a uniform jitter, and a share of the requests
+    fails with a 503 so that retries are exercised.
+
+    A share of the resources, the change rate, is treated as modified
+    when the server starts: their ETag and Last-Modified differ from one
+    server run to the next, while the other resources keep the same
+    validators, as if they never changed.
+    """
+    ROOT = "/api/v2"
+    PUBLISHED_AT = 1577836800
+
+    def __init__(self, fixtures: PokedexFixtures, latency: float = 0,
+                 jitter: float = 0, error_rate: float = 0,
+                 seed: int = 3522, change_rate: float = 0):
+        """
+        Initializes a MockPokeAPI.
+
+        :param fixtures: a PokedexFixtures, the data to serve.
+        :param latency: a number, the mean seconds a response takes.
+        :param jitter: a number, the most seconds a response's latency
+                       differs from the mean.
+        :param error_rate: a number from 0 to 1, the share of requests
+                           answered with a 503.
+        :param seed: an int, the seed of the latency and error draws.
+        :param change_rate: a number from 0 to 1, the share of resources
+                            modified when the server starts.
+        """
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.seed = seed
+        self.change_rate = change_rate
+        self.started_at = time.time()
+        self.payloads = {}
+        self.validators = {}
+
+    def application(self) -> web.Application:
+        """
+        Builds the aiohttp application.
+        :return: a web.Application
+        """
+        app = web.Application()
+        app.router.add_get(self.ROOT + "/{req_type}/", self.list_resources)
+        app.router.add_get(self.ROOT + "/{req_type}/{req_id}",
+                           self.get_resource)
+        app.router.add_get(self.ROOT + "/{req_type}/{req_id}/",
+                           self.get_resource)
+        return app
+
+    async def delay(self) -> bool:
+        """
+        Waits for the simulated latency and draws whether the request
+        fails.
+        :return: a boolean, True if the request should fail.
+        """
+        latency = self.latency + self.random.uniform(-self.jitter,
+                                                     self.jitter)
+        if latency > 0:
+            await asyncio.sleep(latency)
+        return self.random.random() < self.error_rate
+
+    def failure(self) -> web.Response:
+        """
+        Builds the response of a failed request.
+        :return: a web.Response
+        """
+        return web.Response(status=503, reason="Service Unavailable")
+
+    async def get_resource(self, request: web.Request) -> web.Response:
+        """
+        Answers a single resource by id or name.
+        :param request: a web.Request
+        :return: a web.Response
+        """
+        if await self.delay():
+            return self.failure()
+        req_type = request.match_info["req_type"]
+        record = self.fixtures.get(req_type, request.match_info["req_id"])
+        if record is None:
+            return web.Response(status=404, reason="Not Found")
+        key = (req_type, record["id"])
+        if key not in self.payloads:
+            self.payloads[key] = json.dumps(record).encode("UTF-8")
+            self.validators[key] = self.make_validators(
+                key, self.payloads[key])
+        headers = self.validators[key]
+        if self.not_modified(request, headers):
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=self.payloads[key], headers=headers,
+                            content_type="application/json")
+
+    def make_validators(self, key: tuple, payload: bytes) -> dict:
+        """
+        Builds the ETag and Last-Modified of a resource. Resources drawn
+        as modified get validators from the server's start time.
+        :param key: a tuple of the resource type and id.
+        :param payload: bytes, the body of the resource.
+        :return: a dictionary of response headers
+        """
+        draw = random.Random(f"{self.seed}:{key[0]}:{key[1]}").random()
+        modified_at = self.PUBLISHED_AT
+        digest = hashlib.sha1(payload)
+        if draw < self.change_rate:
+            modified_at = self.started_at
+            digest.update(repr(self.started_at).encode("UTF-8"))
+        return {"ETag": f'"{digest.hexdigest()}"',
+                "Last-Modified": formatdate(modified_at, usegmt=True)}
+
+    @staticmethod
+    def not_modified(request: web.Request, headers: dict) -> bool:
+        """
+        Checks the validators of a conditional request. If-None-Match
+        takes precedence over If-Modified-Since.
+        :param request: a web.Request
+        :param headers: a dictionary, the validators of the resource.
+        :return: a boolean, True if the client's copy is current.
+        """
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/")
+                    for tag in if_none_match.split(",")]
+            return "*" in tags or headers["ETag"] in tags
+        if_modified_since = request.headers.get("If-Modified-Since")
+        if if_modified_since is None:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(headers["Last-Modified"]) <= since
+
+    async def list_resources(self, request: web.Request) -> web.Response:
+        """
+        Answers a page of the list endpoint of a resource type.
+        :param request: a web.Request
+        :return: a web.Response
+        """
+        if await self.delay():
+            return self.failure()
+        req_type = request.match_info["req_type"]
+        if req_type not in self.fixtures.resources:
+            return web.Response(status=404, reason="Not Found")
+        limit = int(request.query.get("limit", 20))
+        offset = int(request.query.get("offset", 0))
+        records = self.fixtures.records(req_type)
+        page = records[offset:offset + limit]
+        next_url = None
+        if offset + limit < len(records):
+            next_url = str(request.url.with_query(limit=limit,
+                                                  offset=offset + limit))
+        return web.json_response({
+            "count": len(records), "next": next_url,
+            "results": [self.fixtures.reference(req_type, record["id"],
+                                                record["name"])
+                        for record in page]})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Starts serving in the running event loop.
+
+        :param host: a string
+        :param port: an int, 0 to pick a free port.
+        :return: a tuple of the web.AppRunner and the root url.
+        """
+        runner = web.AppRunner(self.application(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        port = runner.addresses[0][1]
+        return runner, f"http://{host}:{port}{self.ROOT}"
+
+
+async def serve(args):
+    """
+    Serves the fixtures until the process is stopped.
+    :param args: the namespace of the server arguments.
+    :return: None
+    """
+    fixtures = PokedexFixtures(pokemon=args.pokemon)
+    server = MockPokeAPI(fixtures, args.latency, args.jitter,
+                         args.error_rate, change_rate=args.change_rate)
+    runner, url = await server.start(args.host, args.port)
+    print(f"Serving on {url}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def setup_arguments(parser: argparse.ArgumentParser = None):
+    """
+    Adds the arguments that configure the mock server.
+    :param parser: an ArgumentParser, or None for a new one.
+    :return: the ArgumentParser
+    """
+    parser = parser if parser else argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="The mean seconds a response takes.")
+    parser.add_argument("--jitter", type=float, default=0.01,
+                        help="The most seconds a response's latency "
+                             "differs from the mean.")
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="The share of requests answered with a 503.")
+    parser.add_argument("--change-rate", type=float, default=0,
+                        help="The share of resources modified when the "
+                             "server starts, which conditional requests "
+                             "download again.")
+    parser.add_argument("--pokemon", type=int,
+                        default=PokedexFixtures.NATIONAL_DEX,
+                        help="The number of generated pokemon.")
+    return parser
+
+
+def main():
+    """
+    Runs the mock server.
+    :return: None
+    """
+    parser = setup_arguments()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="The port to listen on, 0 for any free port.")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Measures how much of a full download a refresh of the response cache
+costs when most resources did not change. The pokedex first fills an
+empty cache from a local mock PokeAPI, then the mock server restarts
+with a share of its resources modified and the same report is run with
+--revalidate. Results are printed as json.
+
+Usage:
+    python -m benchmarks.revalidation_benchmark
+    python -m benchmarks.revalidation_benchmark --size 500 --change-rate 0.1
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import mock_server
+from benchmarks.throughput_benchmark import start_server
+
+
+def run_report(api_url: str, directory: str, args,
+               revalidate: bool) -> dict:
+    """
+    Generates a report with the response cache in a directory.
+
+    :param api_url: a string, the root url of the mock server.
+    :param directory: a string, the directory of the input file, the
+                      report and the cache.
+    :param args: the namespace of the benchmark arguments.
+    :param revalidate: a boolean, True to revalidate every cached
+                       response.
+    :return: a dictionary of the measurements
+    """
+    from pokedex import Pokedex, Request
+    from pokemonretriever.pokedex_metrics import metrics
+    input_file = os.path.join(directory, "input.txt")
+    with open(input_file, mode="w", encoding="UTF-8") as file:
+        file.write("\n".join(str(index % args.pokemon + 1)
+                             for index in range(args.size)))
+    request = Request("pokemon", args.expanded, input_file=input_file,
+                      output_file=os.path.join(directory, "output.txt"),
+                      cache_dir=os.path.join(directory, "cache"),
+                      concurrency=args.concurrency, api_url=api_url,
+                      index_file=None, revalidate=revalidate)
+    pokedex = Pokedex(request)
+    metrics.reset()
+    metrics.enable()
+
+    async def generate():
+        async with request.api:
+            await pokedex.generate_report()
+
+    with open(os.devnull, mode="w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        started_at = time.perf_counter()
+        try:
+            asyncio.run(generate())
+        finally:
+            elapsed = time.perf_counter() - started_at
+            sys.stdout = stdout
+    metrics.disable()
+    request.cache.close()
+    decode = metrics.timers.get("decode", (0, 0.0))
+    return {"seconds": round(elapsed, 4),
+            "requests": metrics.counters.get("requests", 0),
+            "not_modified": metrics.counters.get("not_modified", 0),
+            "bytes_received": metrics.counters.get("bytes_received", 0),
+            "decoded": decode[0],
+            "decode_seconds": round(decode[1], 4),
+            "failures": len(request.api.failures)}
+
+
+def main():
+    """
+    Runs the full download and the refresh and prints the results as
+    json.
+    :return: None
+    """
+    parser = mock_server.setup_arguments()
+    parser.set_defaults(change_rate=0.05)
+    parser.add_argument("--size", type=int, default=151,
+                        help="The number of entries of the input file.")
+    parser.add_argument("--expanded", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for phase, revalidate in (("full", False), ("refresh", True)):
+            process, api_url = start_server(args)
+            try:
+                results[phase] = run_report(api_url, directory, args,
+                                            revalidate)
+            finally:
+                process.terminate()
+                process.wait()
+    full, refresh = results["full"], results["refresh"]
+    results["bandwidth_ratio"] = round(
+        refresh["bytes_received"] / full["bytes_received"], 4) \
+        if full["bytes_received"] else None
+    results["decode_ratio"] = round(
+        refresh["decode_seconds"] / full["decode_seconds"], 4) \
+        if full["decode_seconds"] else None
+    print(json.dumps({"server": {"latency": args.latency,
+                                 "change_rate": args.change_rate,
+                                 "pokemon": args.pokemon},
+                      "size": args.size, "expanded": args.expanded,
+                      "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Measures the throughput and latency of the pokedex against a local mock
+PokeAPI, for input files of 1, 100 and 1000 entries in normal and
+expanded mode. Results are printed as json so they can be compared
+between runs.
+
+Usage:
+    python -m benchmarks.throughput_benchmark
+    python -m benchmarks.throughput_benchmark --sizes 100 --latency 0.05
+"""
+
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks import mock_server
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SIZES = (1, 100, 1000)
+MODES = ("normal", "expanded")
+
+
+def percentile(values: list, rank: float):
+    """
+    Gets a nearest-rank percentile.
+    :param values: a list of numbers
+    :param rank: a number from 0 to 100
+    :return: a number, or None if there are no values.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(rank / 100 * len(values)) - 1)]
+
+
+def peak_rss() -> int:
+    """
+    Gets the peak resident set size of the current process.
+    :return: an int, in bytes, or None if it cannot be measured.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def count_objects(pokemon_objects: list) -> int:
+    """
+    Counts the PokedexObjects of a report, including the objects of the
+    expanded attributes.
+    :param pokemon_objects: a list of PokedexObjects
+    :return: an int
+    """
+    count = 0
+    for pokemon_object in pokemon_objects:
+        count += 1
+        for attribute in getattr(pokemon_object, "expanded_attributes", ()):
+            count += len(getattr(pokemon_object, attribute))
+    return count
+
+
+def run_scenario(api_url: str, size: int, mode: str, options: dict) -> dict:
+    """
+    Generates a report for an input file of `size` pokemon. This runs in
+    a fresh process, so the peak RSS is the scenario's own.
+
+    :param api_url: a string, the root url of the mock server.
+    :param size: an int, the number of entries of the input file.
+    :param mode: a string, "normal" or "expanded".
+    :param options: a dictionary of the Request's network options.
+    :return: a dictionary of the measurements
+    """
+    from pokedex import Pokedex, Request
+    latencies = []
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, "input.txt")
+        with open(input_file, mode="w", encoding="UTF-8") as file:
+            file.write("\n".join(str(index % options["pokemon"] + 1)
+                                 for index in range(size)))
+        request = Request("pokemon", mode == "expanded",
+                          input_file=input_file,
+                          output_file=os.path.join(directory, "output.txt"),
+                          use_cache=False,
+                          concurrency=options["concurrency"],
+                          retries=options["retries"],
+                          timeout=options["timeout"], api_url=api_url)
+        request.api.request_hook = \
+            lambda req_type, req_id, status, seconds: \
+            latencies.append(seconds)
+        pokedex = Pokedex(request)
+        counts = []
+
+        class CountingWriter(pokedex.writer):
+            """
+            The writer of the report, counting the objects it writes.
+            """
+
+            def write(self, pokedex_object):
+                counts.append(count_objects((pokedex_object,)))
+                super().write(pokedex_object)
+
+        pokedex.writer = CountingWriter
+
+        async def generate():
+            async with request.api:
+                await pokedex.generate_report()
+
+        with open(os.devnull, mode="w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            started_at = time.perf_counter()
+            try:
+                asyncio.run(generate())
+            finally:
+                elapsed = time.perf_counter() - started_at
+                sys.stdout = stdout
+    objects = sum(counts)
+    return {"scenario": f"{mode}-{size}",
+            "mode": mode,
+            "entries": size,
+            "seconds": round(elapsed, 4),
+            "requests": len(latencies),
+            "failures": len(request.api.failures),
+            "requests_per_sec": round(len(latencies) / elapsed, 2),
+            "latency_p50_ms": round(percentile(latencies, 50) * 1000, 3)
+            if latencies else None,
+            "latency_p99_ms": round(percentile(latencies, 99) * 1000, 3)
+            if latencies else None,
+            "objects": objects,
+            "objects_per_sec": round(objects / elapsed, 2),
+            "peak_rss_bytes": peak_rss()}
+
+
+def start_server(args):
+    """
+    Starts the mock server in its own process, so serving does not
+    compete with the measured client for the interpreter.
+    :param args: the namespace of the benchmark arguments.
+    :return: a tuple of the server process and its root url.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_server", "--port", "0",
+         "--latency", str(args.latency), "--jitter", str(args.jitter),
+         "--error-rate", str(args.error_rate),
+         "--change-rate", str(args.change_rate),
+         "--pokemon", str(args.pokemon)],
+        stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Serving on "):
+        process.kill()
+        raise RuntimeError("The mock server did not start")
+    return process, line[len("Serving on "):].strip()
+
+
+def main():
+    """
+    Runs every scenario and prints the results as json.
+    :return: None
+    """
+    parser = mock_server.setup_arguments()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help="The number of entries of the input files.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--output", type=str,
+                        help="Also write the results to this json file.")
+    args = parser.parse_args()
+    options = {"pokemon": args.pokemon, "concurrency": args.concurrency,
+               "retries": args.retries, "timeout": args.timeout}
+    process, api_url = start_server(args)
+    results = []
+    try:
+        context = multiprocessing.get_context("spawn")
+        for mode in args.modes:
+            for size in args.sizes:
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    results.append(pool.submit(run_scenario, api_url, size,
+                                               mode, options).result())
+    finally:
+        process.terminate()
+        process.wait()
+    report = {"server": {"latency": args.latency, "jitter": args.jitter,
+                         "error_rate": args.error_rate,
+                         "pokemon": args.pokemon},
+              "options": options,
+              "python": sys.version.split()[0],
+              "results": results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, mode="w", encoding="UTF-8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,27 @@ Contains the class definition for Requests and Pokedex.
 """
 
 import argparse
+import os
+import sys
+from collections import deque
 from enum import Enum
 from pokemonretriever.pokedex_object_factory import PokemonFactory, \
     PokemonMoveFactory, PokemonAbilityFactory
+from pokemonretriever.pokedex_object import Pokemon, PokemonAbility, \
+    PokemonMove
 from pokemonretriever.pokedex_request import PokedexAPI
+from pokemonretriever.pokedex_index import PokedexIndex
+from pokemonretriever.pokedex_metrics import PokedexMetrics, metrics
+from pokemonretriever.pokedex_postings import PokedexPostings
+from pokemonretriever.pokedex_progress import PokedexInputFile, \
+    PokedexProgress
+from pokemonretriever.pokedex_query import PokedexQueryEngine
+from pokemonretriever.pokedex_cache import PokedexCache
+from pokemonretriever.pokedex_scheduler import RequestScheduler
+from pokemonretriever.pokedex_service import PokedexService
+from pokemonretriever.pokedex_snapshot import PokedexSnapshot
+from pokemonretriever.pokedex_writer import WRITERS
+from pokemonretriever.pokedex_workers import PokedexWorkerPool
 import asyncio
 
 
@@ -24,7 +41,23 @@ class Request:
 
     def __init__(self, mode: str, expanded: bool = False, 
                  input_data: str = None, input_file: str = None, 
-                 output_file: str = None):
+                 output_file: str = None, use_cache: bool = True,
+                 cache_dir: str = None,
+                 cache_ttl: float = PokedexCache.DEFAULT_TTL,
+                 cache_size: int = PokedexCache.DEFAULT_MAX_SIZE,
+                 concurrency: int = RequestScheduler.DEFAULT_CONCURRENCY,
+                 rps: float = None,
+                 retries: int = RequestScheduler.DEFAULT_RETRIES,
+                 timeout: float = RequestScheduler.DEFAULT_TIMEOUT,
+                 stream: bool = False, ordered: bool = False,
+                 snapshot_file: str = None, expand: list = None,
+                 api_url: str = PokedexAPI.DEFAULT_URL,
+                 output_format: str = "text",
+                 index_file: str = PokedexIndex.DEFAULT_PATH,
+                 workers: int = None,
+                 chunk_size: int = PokedexInputFile.DEFAULT_CHUNK_SIZE,
+                 resume: bool = False, progress_file: str = None,
+                 revalidate: bool = False, learners: bool = False):
         """
         Initializes a Request object.
 
@@ -36,39 +69,151 @@ class Request:
         :param input_file: a string, the relative path of the file.
         :param output_file: a string, the name of the output file
                             that contains data of the request.
+        :param use_cache: a boolean, False to bypass the on-disk
+                          response cache.
+        :param cache_dir: a string, the directory of the response cache.
+        :param cache_ttl: a number, the seconds a cached response stays
+                          fresh.
+        :param cache_size: an int, the size budget of the cache in bytes.
+        :param concurrency: an int, the maximum number of HTTP requests
+                            in flight.
+        :param rps: a number, the maximum HTTP requests started per
+                    second, or None for no limit.
+        :param retries: an int, the retries of a request that failed
+                        with a timeout, 429 or 5xx response.
+        :param timeout: a number, the seconds a single attempt may take.
+        :param stream: a boolean, True to print and write each result as
+                       soon as it resolves instead of at the end.
+        :param ordered: a boolean, True to keep streamed results in
+                        input order.
+        :param snapshot_file: a string, the path of a snapshot to answer
+                              the request from without any network I/O.
+        :param expand: a list of the Pokemon attributes to expand, from
+                       Pokemon.EXPANDABLE. Expands them all if None and
+                       expanded is True.
+        :param api_url: a string, the root url of the API.
+        :param output_format: a string, the format of the report, from
+                              WRITERS. Only the text format is also
+                              printed on the console.
+        :param index_file: a string, the path of the name and id index,
+                           or None to not use one. The index is only
+                           used if the file exists.
+        :param workers: an int, the number of worker processes that
+                        parse, build and render the results, or None to
+                        do it in the event loop.
+        :param chunk_size: an int, the number of lines of the input file
+                           read and processed at a time.
+        :param resume: a boolean, True to resume the report of an
+                       interrupted run from its progress file.
+        :param progress_file: a string, the path of the progress file.
+                              Defaults to the output file with a
+                              .progress suffix.
+        :param revalidate: a boolean, True to revalidate every cached
+                           response with a conditional request, even if
+                           it has not expired.
+        :param learners: a boolean, True to list the pokemon that learn
+                         every move from the reverse indexes of the
+                         snapshot. Only supported for mode 'move'. Uses
+                         the default snapshot if there is no
+                         snapshot_file.
         """
         if input_file is not None and ".txt" not in input_file:
             raise Exception("File extension must be .txt")
+        if learners and mode != PokedexMode.MOVE.value:
+            raise Exception("--learners is only supported for mode type "
+                            "'move'")
+        if learners and workers:
+            raise Exception("--learners cannot be used with --workers")
+        if learners and not snapshot_file:
+            snapshot_file = PokedexSnapshot.DEFAULT_PATH
         self.mode = mode
-        self.expanded = expanded if expanded is not None else False
-        self.input_data = [input_data]
-        self.input_file = input_file
-        if input_file:
-            self.__process_file_to_data()
+        self.expanded = bool(expanded) or bool(expand)
+        self.expand = expand
+        self.input_data = [input_data] if not input_file else None
+        self.input_file = PokedexInputFile(input_file, chunk_size) \
+            if input_file else None
         self.output_file = output_file
-        self.api = PokedexAPI()
+        self.output_format = output_format
+        self.stream = stream
+        self.ordered = ordered
+        self.workers = workers
+        self.resume = resume
+        self.progress_file = progress_file
+        self.snapshot = PokedexSnapshot.load(snapshot_file) \
+            if snapshot_file else None
+        self.learners = PokedexPostings.open(self.snapshot) \
+            if learners else None
+        self.cache = PokedexCache(cache_dir, cache_ttl, cache_size) \
+            if use_cache and self.snapshot is None else None
+        self.scheduler = RequestScheduler(concurrency, rps, retries, timeout)
+        self.index = PokedexIndex.load(index_file) if index_file else None
+        self.api = PokedexAPI(self.cache, self.scheduler, self.snapshot,
+                              connection_limit=concurrency,
+                              base_url=api_url, index=self.index,
+                              revalidate=revalidate)
 
-    def __process_file_to_data(self):
+    def input_chunks(self, start: int = 0):
         """
-        Grabs data from input file.
-        :return: None
+        Reads the input in chunks. Only one chunk of the input file is
+        held in memory at a time.
+
+        :param start: an int, the number of lines of the input file to
+                      skip.
+        :return: a generator of (line, chunk) tuples, where line is the
+                 number of input lines read up to the end of the chunk
+                 and chunk is a list of identifiers.
         """
-        try:
-            with open(file=self.input_file, mode='r', encoding='UTF-8') as f:
-                self.input_data = [line.rstrip('\n').lower() for line in f]
-        except OSError as e:
-            raise FileNotFoundError(e)
+        chunks = self.input_file.chunks(start) if self.input_file \
+            else [(1, self.input_data)]
+        for line, chunk in chunks:
+            yield line, self.__canonicalize_input(chunk)
 
-    def process_request(self) -> list:
+    def __canonicalize_input(self, input_data: list) -> list:
         """
-        Calls the API class to make the HTTP request.
+        Replaces every identifier of the input with the id of its
+        resource. Identifiers the index does not know are dropped and
+        reported as failures, with the closest names as suggestions,
+        without sending any request.
+        :param input_data: a list of identifiers
+        :return: a list of identifiers
+        """
+        if self.index is None:
+            return input_data
+        known, failures = self.index.check(self.mode, input_data)
+        self.api.failures.extend(failures)
+        return known
+
+    async def process_request(self) -> list:
+        """
+        Calls the API class to make the HTTP request for the whole input.
         :return: a list
         """
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        info = loop.run_until_complete(
-            self.api.process_requests(self.mode, self.input_data))
-        return info
+        responses = []
+        for line, chunk in self.input_chunks():
+            responses.extend(await self.api.process_requests(self.mode,
+                                                             chunk))
+        return responses
+
+    async def stream_request(self, input_data: list):
+        """
+        Calls the API class to make the HTTP requests of a chunk of the
+        input, yielding each response as soon as it resolves. Responses
+        are yielded in input order if the request is ordered.
+        :param input_data: a list of identifiers
+        :return: an async generator of (index, response) tuples
+        """
+        responses = self.api.stream_requests(self.mode, input_data)
+        if not self.ordered:
+            async for index, response in responses:
+                yield index, response
+            return
+        reorder_buffer = {}
+        next_index = 0
+        async for index, response in responses:
+            reorder_buffer[index] = response
+            while next_index in reorder_buffer:
+                yield next_index, reorder_buffer.pop(next_index)
+                next_index += 1
 
     def __str__(self):
         """
@@ -78,20 +223,29 @@ class Request:
         return f"Request: \n" \
                f"Mode: {self.mode}\n" \
                f"Expanded?: {self.expanded}\n" \
+               f"Expand: {self.expand if self.expand else 'NA'}\n" \
                f"Input Data: {self.input_data if not None else 'NA'}\n" \
-               f"Input File: {self.input_file if not None else 'NA'}\n" \
-               f"Output File: {self.output_file if not None else 'NA'}\n"
+               f"Input File: " \
+               f"{self.input_file.path if self.input_file else 'NA'}\n" \
+               f"Output File: {self.output_file if not None else 'NA'}\n" \
+               f"Output Format: {self.output_format}\n"
 
 
 class Pokedex:
     """
     Represents the driver class of the program.
     """
+    STREAM_WINDOW = 50
     factory_map = {
         PokedexMode.POKEMON: PokemonFactory,
         PokedexMode.ABILITY: PokemonAbilityFactory,
         PokedexMode.MOVE: PokemonMoveFactory
     }
+    object_map = {
+        PokedexMode.POKEMON: Pokemon,
+        PokedexMode.ABILITY: PokemonAbility,
+        PokedexMode.MOVE: PokemonMove
+    }
 
     def __init__(self, request):
         """
@@ -100,47 +254,361 @@ class Pokedex:
         """
         self.request = request
         self.factory = self.factory_map[PokedexMode(self.request.mode)]
+        self.writer = WRITERS[self.request.output_format]
         self.container = []
+        self.progress = self.__load_progress()
+        self.previous_failures = list(self.progress.failures) \
+            if self.progress is not None else []
+
+    def new_factory(self, data_set: list = None):
+        """
+        Instantiates the factory of the request's mode. Move factories
+        list the learners of every move if the request asks for them.
+        :param data_set: a list, the records the factory creates.
+        :return: a PokedexObjectFactory
+        """
+        factory = self.factory(data_set or [],
+                               is_expanded=self.request.expanded,
+                               api=self.request.api,
+                               expand=self.request.expand)
+        if self.request.learners is not None:
+            factory.learners = self.request.learners
+        return factory
 
-    def get_pokemon_objects(self):
+    def __load_progress(self):
+        """
+        Gets the progress of a report generated from an input file: the
+        checkpoint of an interrupted run if the request is resumed, or
+        the start of the input otherwise.
+        :return: a PokedexProgress, or None if there is no input file.
+        """
+        if self.request.input_file is None:
+            return None
+        path = self.request.progress_file \
+            if self.request.progress_file \
+            else self.output_file + PokedexProgress.SUFFIX
+        key = {"input_file": os.path.abspath(self.request.input_file.path),
+               "mode": self.request.mode,
+               "expanded": self.request.expanded,
+               "expand": list(self.request.expand or ()),
+               "format": self.request.output_format}
+        if self.request.resume:
+            return PokedexProgress.load(path, key)
+        return PokedexProgress(path, key)
+
+    async def get_pokemon_objects(self):
         """
         Gets the PokemonObjects created by the Factory classes.
         :return: None
         """
-        info = self.request.process_request()
-        factory = self.factory(info, is_expanded=self.request.expanded)
-        for pokemon_object in factory.create():
-            print(pokemon_object)
-            self.container.append(pokemon_object)
+        info = await self.request.process_request()
+        factory = self.new_factory(info)
+        await factory.load()
+        self.container.extend(factory.create())
 
-    def generate_report(self):
+    async def generate_report(self):
         """
         Writes the report of the request to a .txt file. Output.txt is the
-        default if no file is specified.
+        default if no file is specified. Text reports are printed on the
+        console as they are written, so each object is rendered once.
+        The input is processed a chunk at a time, and the progress is
+        saved after each chunk.
+        :return: None
+        """
+        if self.request.workers:
+            await self.worker_report()
+            return
+        if self.request.stream:
+            await self.stream_report()
+            return
+        factory = self.new_factory()
+        with self.open_writer() as writer:
+            for line, chunk in self.request.input_chunks(self.start_line):
+                data_set = await self.request.api.process_requests(
+                    self.request.mode, chunk)
+                await factory.load(data_set)
+                for pokedex_object in factory.build_many(
+                        [data for data in data_set if data is not None]):
+                    writer.write(pokedex_object)
+                self.checkpoint(writer, line)
+        self.finish(writer)
+
+    async def stream_report(self):
+        """
+        Prints and writes each PokemonObject to the report as soon as its
+        response resolves, without keeping the objects in memory. The
+        progress is saved after each chunk of the input.
+
+        Expanded results are written a window of STREAM_WINDOW results
+        at a time, so that the stats, moves and abilities of a whole
+        window are prefetched in one batch.
+        :return: None
+        """
+        factory = self.new_factory()
+        window_size = self.STREAM_WINDOW if self.request.expanded else 1
+        with self.open_writer() as writer:
+            for line, chunk in self.request.input_chunks(self.start_line):
+                window = []
+                async for index, data in self.request.stream_request(chunk):
+                    if data is None:
+                        continue
+                    window.append(data)
+                    if len(window) >= window_size:
+                        await self.__write_window(factory, writer, window)
+                        window = []
+                await self.__write_window(factory, writer, window)
+                self.checkpoint(writer, line)
+        self.finish(writer)
+
+    async def worker_report(self):
+        """
+        Fetches the input in batches and has a pool of worker processes
+        parse, build and render each batch while the next one is
+        fetched. Rendered entries are written in input order as soon as
+        their batch is done.
+        :return: None
+        """
+        factory = self.new_factory()
+        expand = tuple(factory.expand or ()) if factory.is_expanded else ()
+        related_data = {}
+        pending = deque()
+        with self.open_writer() as writer, \
+                PokedexWorkerPool(self.request.workers, self.factory,
+                                  self.writer, expand) as pool:
+            for line, chunk in self.request.input_chunks(self.start_line):
+                for start in range(0, len(chunk), pool.batch_size):
+                    data_set = await self.request.api.process_requests(
+                        self.request.mode,
+                        chunk[start:start + pool.batch_size])
+                    related = {}
+                    if expand:
+                        related = await self.__fetch_related(
+                            factory.related_names(data_set), related_data)
+                    last = start + pool.batch_size >= len(chunk)
+                    pending.append((pool.render(data_set, related),
+                                    line if last else None))
+                    while len(pending) > pool.workers:
+                        await self.__write_batch(writer, *pending.popleft())
+            while pending:
+                await self.__write_batch(writer, *pending.popleft())
+        self.finish(writer)
+
+    async def __write_batch(self, writer, batch, line: int = None):
+        """
+        Writes a batch rendered by the worker pool to the report.
+
+        :param writer: a PokedexWriter
+        :param batch: an asyncio Future of the list of rendered entries.
+        :param line: an int, the number of input lines done once the
+                     batch is written, to save the progress at, or None
+                     if the batch does not end a chunk.
+        :return: None
+        """
+        with metrics.timer("workers"):
+            batch = await batch
+        for rendered in batch:
+            writer.write_rendered(rendered)
+        if line is not None:
+            self.checkpoint(writer, line)
+
+    async def __fetch_related(self, related_names: dict,
+                              related_data: dict) -> dict:
+        """
+        Gets the responses of the stats, moves and abilities a batch
+        expands into. Each name is only requested once per report.
+
+        :param related_names: a dictionary of resource type to a list of
+                              names.
+        :param related_data: a dictionary of resource type to a
+                             dictionary of the responses fetched so far,
+                             by name.
+        :return: a dictionary of resource type to a list of
+                 (name, response) pairs.
+        """
+        related = {}
+        for req_type, names in related_names.items():
+            fetched = related_data.setdefault(req_type, {})
+            missing = [name for name in names if name not in fetched]
+            if missing:
+                fetched.update(zip(missing, await self.request.api
+                                   .process_requests(req_type, missing)))
+            related[req_type] = [(name, fetched[name]) for name in names]
+        return related
+
+    @property
+    def start_line(self) -> int:
+        """
+        The number of input lines a resumed report skips.
+        :return: an int
+        """
+        return self.progress.line if self.progress is not None else 0
+
+    def open_writer(self):
+        """
+        Instantiates the writer of the report, resuming the report at
+        the saved checkpoint if there is one.
+        :return: a PokedexWriter
+        """
+        columns = self.object_map[PokedexMode(self.request.mode)] \
+            .RECORD_FIELDS
+        if self.progress is None or not self.progress.started:
+            return self.writer(self.output_file, echo=sys.stdout,
+                               columns=columns)
+        writer = self.writer(self.output_file, echo=sys.stdout,
+                             offset=self.progress.offset, columns=columns)
+        writer.count = self.progress.count
+        return writer
+
+    def checkpoint(self, writer, line: int):
+        """
+        Saves the progress of a report generated from an input file.
+
+        :param writer: the PokedexWriter of the report.
+        :param line: an int, the number of input lines done.
         :return: None
         """
-        self.get_pokemon_objects()
+        if self.progress is None:
+            return
+        self.progress.save(line, writer.checkpoint(), writer.count,
+                           self.failures)
+
+    @property
+    def failures(self) -> list:
+        """
+        The failures of the report, including those of the interrupted
+        runs it resumes.
+        :return: a list of strings
+        """
+        return self.previous_failures + [
+            str(failure) for failure in self.request.api.failures]
+
+    def finish(self, writer):
+        """
+        Prints the failures and the summary of a complete report, and
+        deletes its progress file.
+        :param writer: the PokedexWriter of the report.
+        :return: None
+        """
+        for failure in self.failures:
+            print("Error: " + failure)
+        if self.progress is not None:
+            self.progress.clear()
+        self.print_summary(writer)
+
+    @staticmethod
+    def print_summary(writer):
+        """
+        Prints where a report that is not echoed on the console was
+        written.
+        :param writer: the PokedexWriter of the report.
+        :return: None
+        """
+        if not writer.ECHOES:
+            print(f"Wrote {writer.count} records to {writer.path}")
+
+    @staticmethod
+    async def __write_window(factory, writer, window: list):
+        """
+        Loads what a window of streamed results expands into, then
+        builds and writes them.
+
+        :param factory: a PokedexObjectFactory
+        :param writer: a PokedexWriter
+        :param window: a list of responses
+        :return: None
+        """
+        if not window:
+            return
+        await factory.load(window)
+        for data in window:
+            writer.write(factory.build(data))
+
+    @property
+    def output_file(self) -> str:
+        """
+        The name of the report file.
+        :return: a string
+        """
         if self.request.output_file is None:
-            output_file = "output.txt"
-        else:
-            output_file = self.request.output_file
-        with open(file=output_file, mode="w+", encoding="UTF-8") as file:
-            for objects in self.container:
-                file.write(str(objects))
+            return "output" + self.writer.EXTENSION
+        return self.request.output_file
 
 
-def setup_cmd_line_interface():
+def setup_network_arguments() -> argparse.ArgumentParser:
     """
-    Sets up a command-line interface to accept the user's specification
-    about the program mode and optional program arguments.
+    Sets up the arguments shared by every command that talks to the API.
 
-    :return: the namespace containing the arguments to the program command.
+    :return: a parent ArgumentParser holding the network arguments.
     """
-    parser = argparse.ArgumentParser()
-    parser.add_argument("mode", type=str,
-                        choices=['pokemon', 'move', 'ability'],
-                        help="Choose one of the three values to perform"
-                             "query.")
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--cache-dir", type=str,
+                        help="Use this flag to choose the directory of the "
+                             "on-disk response cache. Defaults to "
+                             "~/.cache/pokedex.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Use this flag to always query the API instead "
+                             "of reusing cached responses.")
+    parser.add_argument("--cache-ttl", type=float,
+                        default=PokedexCache.DEFAULT_TTL,
+                        help="The number of seconds a cached response stays "
+                             "fresh. 0 keeps responses forever. Expired "
+                             "responses are revalidated with a conditional "
+                             "request.")
+    parser.add_argument("--cache-size", type=int,
+                        default=PokedexCache.DEFAULT_MAX_SIZE // (1024 * 1024),
+                        help="The size budget of the cache in megabytes. "
+                             "Least recently used responses are evicted "
+                             "first.")
+    parser.add_argument("--revalidate", action="store_true",
+                        help="Use this flag to check every cached response "
+                             "with a conditional request, even if it has "
+                             "not expired. Unchanged responses are answered "
+                             "with 304 Not Modified and reused, so a "
+                             "refresh downloads only what changed.")
+    parser.add_argument("--concurrency", type=int,
+                        default=RequestScheduler.DEFAULT_CONCURRENCY,
+                        help="The maximum number of HTTP requests in "
+                             "flight at once.")
+    parser.add_argument("--rps", type=float,
+                        help="The maximum number of HTTP requests started "
+                             "per second. Unlimited if not specified.")
+    parser.add_argument("--retries", type=int,
+                        default=RequestScheduler.DEFAULT_RETRIES,
+                        help="The number of times a request is retried "
+                             "after a timeout, 429 or 5xx response.")
+    parser.add_argument("--timeout", type=float,
+                        default=RequestScheduler.DEFAULT_TIMEOUT,
+                        help="The number of seconds a single HTTP request "
+                             "may take.")
+    parser.add_argument("--api-url", type=str, default=PokedexAPI.DEFAULT_URL,
+                        help="The root url of the API, for a self-hosted "
+                             "PokeAPI. Defaults to https://pokeapi.co/api/v2.")
+    return parser
+
+
+def expand_attributes(value: str) -> list:
+    """
+    Parses the value of --expand.
+    :param value: a string, a comma separated list of attributes.
+    :return: a list of strings
+    """
+    attributes = [attribute.strip().lower() for attribute in value.split(",")
+                  if attribute.strip()]
+    for attribute in attributes:
+        if attribute not in Pokemon.EXPANDABLE:
+            raise argparse.ArgumentTypeError(
+                f"'{attribute}' cannot be expanded. Choose from "
+                f"{', '.join(Pokemon.EXPANDABLE)}.")
+    return attributes
+
+
+def setup_query_arguments() -> argparse.ArgumentParser:
+    """
+    Sets up the arguments of the pokemon, move and ability queries.
+
+    :return: a parent ArgumentParser holding the query arguments.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--inputfile", type=str,
                        help="Use this flag when providing a file. The file "
@@ -154,15 +622,439 @@ def setup_cmd_line_interface():
                              "to get more information about particular "
                              "attributes. Only supported for mode type "
                              "'pokemon'.")
+    parser.add_argument("--expand", type=expand_attributes,
+                        help="Use this flag to only expand some attributes "
+                             "of a pokemon, as a comma separated list of "
+                             f"{', '.join(Pokemon.EXPANDABLE)}. Implies "
+                             "--expanded.")
     parser.add_argument("--output", type=str,
                         help="Use this flag if you want the query results "
                              "to be outputted into a new file. The file"
                              "must be an extension of type .txt. If not "
                              "specified, the results will be printed on the "
                              "console.")
+    parser.add_argument("--format", type=str, choices=list(WRITERS),
+                        default="text",
+                        help="The format of the output file: the text "
+                             "report, json lines, csv, or the columnar "
+                             "binary format. Only text is also printed "
+                             "on the console.")
+    parser.add_argument("--learners", action="store_true",
+                        help="Use this flag to list the pokemon that learn "
+                             "each move, from the reverse indexes of the "
+                             "snapshot, without any network request. Only "
+                             "supported for mode type 'move'. Uses "
+                             "~/.cache/pokedex/snapshot.pdx unless "
+                             "--snapshot is given.")
+    parser.add_argument("--workers", type=int,
+                        help="Use this flag to parse, build and render the "
+                             "results in this many worker processes while "
+                             "the next batch is fetched. Results are "
+                             "written in input order as batches complete.")
+    parser.add_argument("--chunk-size", type=int,
+                        default=PokedexInputFile.DEFAULT_CHUNK_SIZE,
+                        help="The number of lines of the input file read "
+                             "and processed at a time. The progress is "
+                             "saved after each chunk.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Use this flag to resume an interrupted "
+                             "report where its progress file says it "
+                             "stopped.")
+    parser.add_argument("--progress-file", type=str,
+                        help="The path of the progress file. Defaults to "
+                             "the output file with a .progress suffix.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Use this flag to print and write each result "
+                             "as soon as it is retrieved instead of waiting "
+                             "for the whole input.")
+    parser.add_argument("--ordered", action="store_true",
+                        help="Use with --stream to keep the results in the "
+                             "order of the input.")
+    parser.add_argument("--index-file", type=str,
+                        default=PokedexIndex.DEFAULT_PATH,
+                        help="The path of the name and id index built with "
+                             "'index build'. Defaults to "
+                             "~/.cache/pokedex/index.json.")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Use this flag to send identifiers as they are "
+                             "instead of checking them against the index.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Use this flag to time the fetch, decode, "
+                             "parse, build, render and write stages, count "
+                             "requests, cache hits, bytes received, "
+                             "retries and objects built, and print a "
+                             "summary at the end.")
+    parser.add_argument("--profile-file", type=str,
+                        help="The path to write the profile to. Implies "
+                             "--profile.")
+    parser.add_argument("--profile-format", type=str,
+                        choices=PokedexMetrics.FORMATS, default="json",
+                        help="The format of the profile file: json for the "
+                             "timers, counters and latency histograms, or "
+                             "chrome for a trace of every timed span that "
+                             "chrome://tracing and Perfetto open.")
+    parser.add_argument("--snapshot", type=str, nargs="?",
+                        const=PokedexSnapshot.DEFAULT_PATH,
+                        help="Use this flag to answer the query from a "
+                             "snapshot built with 'snapshot build' instead "
+                             "of the network. Defaults to "
+                             "~/.cache/pokedex/snapshot.pdx.")
+    return parser
+
+
+def setup_cmd_line_interface():
+    """
+    Sets up a command-line interface to accept the user's specification
+    about the program mode and optional program arguments.
+
+    :return: the namespace containing the arguments to the program command.
+    """
+    network_parser = setup_network_arguments()
+    query_parser = setup_query_arguments()
+    parser = argparse.ArgumentParser()
+    modes = parser.add_subparsers(dest="mode", required=True,
+                                  help="Choose one of the three values to "
+                                       "perform a query, 'snapshot' to "
+                                       "manage the offline snapshot, "
+                                       "'index' to manage the name and id "
+                                       "index, 'query' to filter a snapshot "
+                                       "by attributes, 'stats' to analyze "
+                                       "base stats, 'damage' to rank the "
+                                       "damage of moves, or 'serve' to "
+                                       "answer queries over HTTP.")
+    for mode in PokedexMode:
+        modes.add_parser(mode.value, parents=[query_parser, network_parser])
+    snapshot_parser = modes.add_parser("snapshot", parents=[network_parser])
+    snapshot_parser.add_argument("action", choices=["build"],
+                                 help="'build' downloads every pokemon, "
+                                      "move, ability and stat into a local "
+                                      "snapshot file.")
+    snapshot_parser.add_argument("--snapshot-file", type=str,
+                                 default=PokedexSnapshot.DEFAULT_PATH,
+                                 help="The path of the snapshot file. "
+                                      "Defaults to "
+                                      "~/.cache/pokedex/snapshot.pdx.")
+    index_parser = modes.add_parser("index", parents=[network_parser])
+    index_parser.add_argument("action", choices=["build"],
+                              help="'build' lists the name and id of every "
+                                   "pokemon, move, ability and stat into a "
+                                   "local index file.")
+    index_parser.add_argument("--index-file", type=str,
+                              default=PokedexIndex.DEFAULT_PATH,
+                              help="The path of the index file. Defaults to "
+                                   "~/.cache/pokedex/index.json.")
+    filter_parser = modes.add_parser("query")
+    filter_parser.add_argument("resource",
+                               choices=[mode.value for mode in PokedexMode],
+                               help="The type of the records to filter.")
+    filter_parser.add_argument("expression", nargs="?", default="",
+                               help="A filter expression of comparisons "
+                                    "joined by 'and', such as \"type = "
+                                    "fire and power >= 90 and accuracy = "
+                                    "100\". The operators are =, !=, <, "
+                                    "<=, > and >=. Every record matches "
+                                    "if not specified.")
+    filter_parser.add_argument("--sort", type=str,
+                               help="The attribute to order the results "
+                                    "by, such as speed. Results are in id "
+                                    "order if not specified.")
+    filter_parser.add_argument("--descending", action="store_true",
+                               help="Use with --sort to order the results "
+                                    "from the highest value.")
+    filter_parser.add_argument("--limit", type=int,
+                               help="The most results to return.")
+    filter_parser.add_argument("--explain", action="store_true",
+                               help="Use this flag to print which index "
+                                    "answers the query and how many "
+                                    "records every indexed comparison "
+                                    "selects.")
+    filter_parser.add_argument("--snapshot", type=str,
+                               default=PokedexSnapshot.DEFAULT_PATH,
+                               help="The path of the snapshot built with "
+                                    "'snapshot build' to query. Defaults "
+                                    "to ~/.cache/pokedex/snapshot.pdx.")
+    filter_parser.add_argument("--output", type=str,
+                               help="The path of the output file. If not "
+                                    "specified, the results are written "
+                                    "to output.txt and printed on the "
+                                    "console.")
+    filter_parser.add_argument("--format", type=str, choices=list(WRITERS),
+                               default="text",
+                               help="The format of the output file: the "
+                                    "text report, json lines, csv, or the "
+                                    "columnar binary format. Only text is "
+                                    "also printed on the console.")
+    stats_parser = modes.add_parser("stats")
+    stats_parser.add_argument("action",
+                              choices=["summary", "rank", "types",
+                                       "similar"],
+                              help="'summary' prints percentiles of every "
+                                   "base stat, 'rank' the pokemon with the "
+                                   "highest --stat, 'types' the mean stats "
+                                   "of every type and 'similar' the "
+                                   "pokemon whose stats are closest to "
+                                   "those of a pokemon. Requires numpy.")
+    stats_parser.add_argument("pokemon", nargs="?",
+                              help="The name or id of the pokemon to find "
+                                   "similar pokemon for.")
+    stats_parser.add_argument("--stat", type=str, default="total",
+                              help="The stat to rank by: hp, attack, "
+                                   "defense, special_attack, "
+                                   "special_defense, speed or total. "
+                                   "Defaults to total.")
+    stats_parser.add_argument("--type", type=str,
+                              help="Use this flag to only include the "
+                                   "pokemon of a type in the summary or "
+                                   "ranking.")
+    stats_parser.add_argument("--limit", type=int, default=10,
+                              help="The number of pokemon to rank or find.")
+    stats_parser.add_argument("--ascending", action="store_true",
+                              help="Use this flag to rank the lowest stats "
+                                   "first.")
+    stats_parser.add_argument("--metric", type=str,
+                              choices=["euclidean", "cosine"],
+                              default="euclidean",
+                              help="How similar pokemon are compared: the "
+                                   "euclidean distance between their "
+                                   "stats, or the cosine distance, which "
+                                   "compares the shape of the profiles "
+                                   "whatever their total.")
+    stats_parser.add_argument("--snapshot", type=str,
+                              default=PokedexSnapshot.DEFAULT_PATH,
+                              help="The path of the snapshot built with "
+                                   "'snapshot build' to analyze. Defaults "
+                                   "to ~/.cache/pokedex/snapshot.pdx.")
+    damage_parser = modes.add_parser("damage")
+    damage_parser.add_argument("attackers",
+                               help="The names or ids of the attacking "
+                                    "pokemon, separated by commas. "
+                                    "Requires numpy.")
+    damage_parser.add_argument("--moves", type=str,
+                               help="The moves every attacker uses, "
+                                    "separated by commas. Defaults to the "
+                                    "moves each attacker learns.")
+    damage_parser.add_argument("--defenders", type=str,
+                               help="The names or ids of the defending "
+                                    "pokemon, separated by commas. "
+                                    "Defaults to every pokemon.")
+    damage_parser.add_argument("--type", type=str,
+                               help="Use this flag to only include the "
+                                    "defending pokemon of a type.")
+    damage_parser.add_argument("--level", type=int, default=50,
+                               help="The level of every pokemon. Defaults "
+                                    "to 50.")
+    damage_parser.add_argument("--limit", type=int, default=10,
+                               help="The number of results to rank.")
+    damage_parser.add_argument("--best-move", action="store_true",
+                               help="Use this flag to only rank the best "
+                                    "move of every attacker against every "
+                                    "defender.")
+    damage_parser.add_argument("--snapshot", type=str,
+                               default=PokedexSnapshot.DEFAULT_PATH,
+                               help="The path of the snapshot built with "
+                                    "'snapshot build' to read. Defaults to "
+                                    "~/.cache/pokedex/snapshot.pdx.")
+    serve_parser = modes.add_parser("serve", parents=[network_parser])
+    serve_parser.add_argument("--host", type=str, default="127.0.0.1",
+                              help="The address to listen on.")
+    serve_parser.add_argument("--port", type=int, default=8080,
+                              help="The port to listen on.")
+    serve_parser.add_argument("--unix", type=str,
+                              help="The path of a Unix socket to listen on "
+                                   "instead of --host and --port.")
+    serve_parser.add_argument("--max-objects", type=int,
+                              default=PokedexService.DEFAULT_MAX_OBJECTS,
+                              help="The number of built pokemon, moves and "
+                                   "abilities kept in memory between "
+                                   "requests.")
+    serve_parser.add_argument("--index-file", type=str,
+                              default=PokedexIndex.DEFAULT_PATH,
+                              help="The path of the name and id index. "
+                                   "Defaults to "
+                                   "~/.cache/pokedex/index.json.")
+    serve_parser.add_argument("--no-index", action="store_true",
+                              help="Use this flag to send identifiers as "
+                                   "they are instead of checking them "
+                                   "against the index.")
+    serve_parser.add_argument("--snapshot", type=str, nargs="?",
+                              const=PokedexSnapshot.DEFAULT_PATH,
+                              help="Use this flag to answer queries from a "
+                                   "snapshot instead of the network.")
     return parser.parse_args()
 
 
+async def build_snapshot(args):
+    """
+    Crawls the API and writes every resource to a snapshot file.
+    :param args: the namespace of the 'snapshot' command.
+    :return: None
+    """
+    cache = PokedexCache(args.cache_dir, args.cache_ttl,
+                         args.cache_size * 1024 * 1024) \
+        if not args.no_cache else None
+    scheduler = RequestScheduler(args.concurrency, args.rps, args.retries,
+                                 args.timeout)
+    async with PokedexAPI(cache, scheduler,
+                          connection_limit=args.concurrency,
+                          base_url=args.api_url,
+                          revalidate=args.revalidate) as api:
+        snapshot = await PokedexSnapshot.build(api, args.snapshot_file)
+    for failure in api.failures:
+        print("Error: " + str(failure))
+    print(f"Saved {len(snapshot)} resources to {args.snapshot_file}")
+
+
+async def build_index(args):
+    """
+    Lists every resource of the API and writes their names and ids to an
+    index file.
+    :param args: the namespace of the 'index' command.
+    :return: None
+    """
+    scheduler = RequestScheduler(args.concurrency, args.rps, args.retries,
+                                 args.timeout)
+    async with PokedexAPI(scheduler=scheduler,
+                          connection_limit=args.concurrency,
+                          base_url=args.api_url) as api:
+        index = await PokedexIndex.build(api, args.index_file)
+    print(f"Saved {len(index)} names to {args.index_file}")
+
+
+async def serve(args):
+    """
+    Runs the pokedex service until the process is stopped. The API's
+    session, the caches and the index are opened once and shared by
+    every query.
+    :param args: the namespace of the 'serve' command.
+    :return: None
+    """
+    snapshot = PokedexSnapshot.load(args.snapshot) if args.snapshot \
+        else None
+    cache = PokedexCache(args.cache_dir, args.cache_ttl,
+                         args.cache_size * 1024 * 1024) \
+        if not args.no_cache and snapshot is None else None
+    scheduler = RequestScheduler(args.concurrency, args.rps, args.retries,
+                                 args.timeout)
+    index = PokedexIndex.load(args.index_file) if not args.no_index \
+        else None
+    async with PokedexAPI(cache, scheduler, snapshot,
+                          connection_limit=args.concurrency,
+                          base_url=args.api_url, index=index,
+                          revalidate=args.revalidate) as api:
+        service = PokedexService(api, args.max_objects)
+        runner, address = await service.start(args.host, args.port,
+                                               args.unix)
+        print(f"Serving on {address}", flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+
+def query_snapshot(args):
+    """
+    Filters the records of a snapshot with the query engine and writes
+    the matching ones as a report.
+    :param args: the namespace of the 'query' command.
+    :return: None
+    """
+    engine = PokedexQueryEngine(PokedexSnapshot.load(args.snapshot))
+    if args.explain:
+        print(engine.plan(args.resource, args.expression))
+    positions = engine.select(args.resource, args.expression, args.sort,
+                              args.descending, args.limit)
+    writer = WRITERS[args.format]
+    output_file = args.output if args.output is not None \
+        else "output" + writer.EXTENSION
+    columns = Pokedex.object_map[PokedexMode(args.resource)].RECORD_FIELDS
+    with writer(output_file, echo=sys.stdout, columns=columns) as writer:
+        for position in positions:
+            writer.write(engine.store.build_at(args.resource, position))
+    Pokedex.print_summary(writer)
+
+
+def print_stats(args):
+    """
+    Packs the base stats of a snapshot into a matrix and prints the
+    analysis of the 'stats' command.
+    :param args: the namespace of the 'stats' command.
+    :return: None
+    """
+    # Only imported here, so that other commands do not load numpy.
+    from pokemonretriever.pokedex_analytics import PokedexStats
+    stats = PokedexStats.from_store(PokedexSnapshot.load(args.snapshot))
+    if args.action == "summary":
+        print(stats.format_percentiles(type_name=args.type))
+    elif args.action == "rank":
+        print(stats.format_rows(stats.ranking(args.stat, args.limit,
+                                              not args.ascending,
+                                              args.type)))
+    elif args.action == "types":
+        print(stats.format_types())
+    else:
+        if args.pokemon is None:
+            raise ValueError("'stats similar' needs the name or id of a "
+                             "pokemon")
+        print(stats.format_similar(args.pokemon, args.limit, args.metric))
+
+
+def print_damage(args):
+    """
+    Computes the damage of every attacker, move and defender of the
+    'damage' command in vectorized batches and prints the highest.
+    :param args: the namespace of the 'damage' command.
+    :return: None
+    """
+    # Only imported here, so that other commands do not load numpy.
+    from pokemonretriever.pokedex_damage import PokedexDamage
+    calculator = PokedexDamage.from_store(
+        PokedexSnapshot.load(args.snapshot), args.level)
+    stats = calculator.stats
+    attackers = [stats.row(name) for name in args.attackers.split(",")
+                 if name.strip()]
+    moves = None
+    if args.moves:
+        moves = [calculator.moves.row(name)
+                 for name in args.moves.split(",") if name.strip()]
+    defenders = stats.select(args.type)
+    if args.defenders:
+        allowed = set(defenders.tolist())
+        defenders = [row for row in (stats.row(name) for name in
+                                     args.defenders.split(",")
+                                     if name.strip())
+                     if row in allowed]
+    results = calculator.rank(attackers, moves, defenders, args.limit,
+                              args.best_move)
+    print(calculator.format_results(results))
+
+
+async def run(request: Request):
+    """
+    Runs a request end to end. This is the single async entry point of
+    the program: it owns the API's HTTP session, which is shared by the
+    Pokedex, its factories and every sub-query.
+    :param request: a Request
+    :return: None
+    """
+    async with request.api:
+        pokedex = Pokedex(request)
+        with metrics.timer("report"):
+            await pokedex.generate_report()
+
+
+def print_profile(args):
+    """
+    Prints the timers, counters and latencies of the run, and writes
+    them to the profile file if there is one.
+    :param args: the namespace of a query command.
+    :return: None
+    """
+    print(metrics.summary())
+    if args.profile_file:
+        metrics.save(args.profile_file, args.profile_format)
+        print(f"Saved the profile to {args.profile_file}")
+
+
 def main():
     """
     Initializes a pokedex simulation.
@@ -170,10 +1062,49 @@ def main():
     """
     try:
         args = setup_cmd_line_interface()
-        request = Request(args.mode, args.expanded, args.inputdata, 
-                          args.inputfile, args.output)
-        pokedex = Pokedex(request)
-        pokedex.generate_report()
+        if args.mode == "snapshot":
+            asyncio.run(build_snapshot(args))
+            return
+        if args.mode == "index":
+            asyncio.run(build_index(args))
+            return
+        if args.mode == "query":
+            query_snapshot(args)
+            return
+        if args.mode == "stats":
+            print_stats(args)
+            return
+        if args.mode == "damage":
+            print_damage(args)
+            return
+        if args.mode == "serve":
+            try:
+                asyncio.run(serve(args))
+            except KeyboardInterrupt:
+                pass
+            return
+        request = Request(args.mode, args.expanded, args.inputdata,
+                          args.inputfile, args.output,
+                          use_cache=not args.no_cache,
+                          cache_dir=args.cache_dir,
+                          cache_ttl=args.cache_ttl,
+                          cache_size=args.cache_size * 1024 * 1024,
+                          concurrency=args.concurrency, rps=args.rps,
+                          retries=args.retries, timeout=args.timeout,
+                          stream=args.stream, ordered=args.ordered,
+                          snapshot_file=args.snapshot, expand=args.expand,
+                          api_url=args.api_url, output_format=args.format,
+                          index_file=None if args.no_index
+                          else args.index_file, workers=args.workers,
+                          chunk_size=args.chunk_size, resume=args.resume,
+                          progress_file=args.progress_file,
+                          revalidate=args.revalidate,
+                          learners=args.learners)
+        if args.profile or args.profile_file:
+            metrics.enable()
+        asyncio.run(run(request))
+        if metrics.enabled:
+            print_profile(args)
     except Exception as e:
         print("Error: " + str(e))
     except FileNotFoundError as fe:
@@ -0,0 +1,314 @@
+"""
+Contains the class definition for the stat analytics of a snapshot:
+percentiles, rankings, per type aggregates and similar pokemon, computed
+over a dense matrix of base stats. Requires numpy.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pokemonretriever.pokedex_postings import PokedexPostings
+from pokemonretriever.pokedex_store import PokedexStore
+
+
+class PokedexStats:
+    """
+    The base stats of every pokemon of a snapshot as an N x 6 matrix, in
+    id order, with the rows of every name and id, and a boolean N x T
+    matrix of their types. Every analysis is a vectorized numpy
+    operation over the whole matrix.
+    """
+    STATS = tuple(name.replace("-", "_") for name in PokedexStore.STAT_NAMES)
+    COLUMNS = STATS + ("total",)
+    LABELS = ("HP", "Atk", "Def", "SpA", "SpD", "Spe", "Total")
+    METRICS = ("euclidean", "cosine")
+    PERCENTILES = (10, 25, 50, 75, 90)
+    # The layout of PokedexStore.RECORDS["pokemon"]: id, name, height,
+    # weight, six base stats and the (offset, length) of four lists.
+    RECORD = [("id", "<u4"), ("name", "<u4"), ("height", "<u4"),
+              ("weight", "<u4"), ("stats", "<u2", (6,)),
+              ("lists", "<u4", (8,))]
+
+    def __init__(self, ids, names: list, stats, types: list, type_mask):
+        """
+        Initializes a PokedexStats.
+
+        :param ids: an int array of the id of every pokemon.
+        :param names: a list of the name of every pokemon.
+        :param stats: an N x 6 int array of their base stats, in the
+                      order of STATS.
+        :param types: a list of the type names.
+        :param type_mask: an N x T boolean array, True where a pokemon
+                          has a type.
+        :raises ImportError: if numpy is not installed.
+        """
+        if numpy is None:
+            raise ImportError("Stat analytics need numpy. Install it with "
+                              "'pip install numpy'.")
+        self.ids = ids
+        self.names = names
+        self.stats = numpy.ascontiguousarray(stats, dtype=numpy.int32)
+        self.totals = self.stats.sum(axis=1)
+        self.types = types
+        self.type_mask = type_mask
+        self.rows = {name: row for row, name in enumerate(names)}
+        self.rows.update((str(pokemon_id), row)
+                         for row, pokemon_id in enumerate(ids.tolist()))
+
+    @classmethod
+    def from_store(cls, store: PokedexStore, postings: PokedexPostings =
+                   None):
+        """
+        Packs the base stats and types of every pokemon of a snapshot.
+        The stats are read from the fixed-width records in one copy.
+
+        :param store: a PokedexStore
+        :param postings: a PokedexPostings of the store, for the types.
+                         Opened if not given.
+        :return: a PokedexStats
+        :raises ImportError: if numpy is not installed.
+        """
+        if numpy is None:
+            raise ImportError("Stat analytics need numpy. Install it with "
+                              "'pip install numpy'.")
+        dtype = numpy.dtype(cls.RECORD)
+        if dtype.itemsize != PokedexStore.RECORDS["pokemon"].size:
+            raise ValueError("The pokemon record layout has changed")
+        records = numpy.frombuffer(store.record_bytes("pokemon"),
+                                   dtype=dtype)
+        names = [store.string(name) for name in records["name"].tolist()]
+        postings = postings if postings is not None \
+            else PokedexPostings.open(store)
+        types = sorted(postings.keys["type"])
+        type_mask = numpy.zeros((len(records), len(types)), dtype=bool)
+        for column, type_name in enumerate(types):
+            rows = numpy.frombuffer(postings.postings("type", type_name),
+                                    dtype=numpy.uint32)
+            type_mask[rows, column] = True
+        return cls(records["id"].astype(numpy.int64), names,
+                   records["stats"], types, type_mask)
+
+    def __len__(self):
+        """
+        Returns the number of pokemon.
+        :return: an int
+        """
+        return len(self.names)
+
+    def row(self, identifier) -> int:
+        """
+        Finds the row of a pokemon.
+        :param identifier: a string or int, its name or id.
+        :return: an int
+        :raises ValueError: if the snapshot has no such pokemon.
+        """
+        key = str(identifier).strip().lower()
+        if key.isdigit():
+            key = str(int(key))
+        row = self.rows.get(key)
+        if row is None:
+            raise ValueError(f"No pokemon '{identifier}' in the snapshot")
+        return row
+
+    def column(self, stat: str):
+        """
+        Gets a stat of every pokemon.
+        :param stat: a string, one of COLUMNS.
+        :return: an int array
+        :raises ValueError: if the stat is unknown.
+        """
+        stat = stat.lower().replace("-", "_")
+        if stat == "total":
+            return self.totals
+        if stat not in self.STATS:
+            raise ValueError(f"Unknown stat '{stat}'. Choose from "
+                             f"{', '.join(self.COLUMNS)}.")
+        return self.stats[:, self.STATS.index(stat)]
+
+    def select(self, type_name: str = None):
+        """
+        Gets the rows of the pokemon of a type.
+        :param type_name: a string, or None for every pokemon.
+        :return: an int array of rows
+        :raises ValueError: if the type is unknown.
+        """
+        if type_name is None:
+            return numpy.arange(len(self))
+        type_name = type_name.strip().lower()
+        if type_name not in self.types:
+            raise ValueError(f"Unknown type '{type_name}'. Choose from "
+                             f"{', '.join(self.types)}.")
+        return numpy.flatnonzero(
+            self.type_mask[:, self.types.index(type_name)])
+
+    def matrix(self, rows=None):
+        """
+        Gets the stats and the total of pokemon as one matrix.
+        :param rows: an int array, or None for every pokemon.
+        :return: an N x 7 int array, in the order of COLUMNS.
+        """
+        matrix = numpy.column_stack((self.stats, self.totals))
+        return matrix if rows is None else matrix[rows]
+
+    def percentiles(self, quantiles: tuple = PERCENTILES,
+                    type_name: str = None):
+        """
+        Computes percentiles of every stat and the total.
+        :param quantiles: a tuple of numbers from 0 to 100.
+        :param type_name: a string, to only include a type.
+        :return: a Q x 7 float array, in the order of COLUMNS.
+        """
+        matrix = self.matrix(self.select(type_name))
+        if not len(matrix):
+            return numpy.full((len(quantiles), len(self.COLUMNS)),
+                              numpy.nan)
+        return numpy.percentile(matrix, quantiles, axis=0)
+
+    def ranking(self, stat: str = "total", limit: int = 10,
+                descending: bool = True, type_name: str = None):
+        """
+        Ranks pokemon by a stat. Only the top of the ranking is sorted,
+        and ties are in id order.
+
+        :param stat: a string, one of COLUMNS.
+        :param limit: an int, the length of the ranking.
+        :param descending: a boolean, False to rank the lowest first.
+        :param type_name: a string, to only rank a type.
+        :return: an int array of rows
+        """
+        rows = self.select(type_name)
+        if limit < 1:
+            return rows[:0]
+        values = self.column(stat)[rows].astype(numpy.int64)
+        keys = -values if descending else values
+        if limit < len(rows):
+            top = numpy.argpartition(keys, limit - 1)[:limit]
+            threshold = keys[top].max()
+            top = numpy.flatnonzero(keys <= threshold)
+        else:
+            top = numpy.arange(len(rows))
+        order = numpy.lexsort((self.ids[rows[top]], keys[top]))
+        return rows[top[order]][:limit]
+
+    def type_aggregates(self):
+        """
+        Aggregates the stats of every type with one matrix product. A
+        pokemon with two types counts towards both.
+        :return: a tuple of the count of every type, a T x 7 float array
+                 of the mean stats and total, and a T x 7 int array of
+                 their maximum.
+        """
+        matrix = self.matrix()
+        mask = self.type_mask.T
+        counts = mask.sum(axis=1)
+        sums = mask.astype(numpy.float64) @ matrix
+        means = sums / numpy.maximum(counts, 1)[:, None]
+        maxima = numpy.where(mask[:, :, None], matrix[None, :, :],
+                             0).max(axis=1)
+        return counts, means, maxima
+
+    def similar(self, identifier, limit: int = 5,
+                metric: str = "euclidean"):
+        """
+        Finds the pokemon with the closest stat profile.
+
+        :param identifier: a string or int, the name or id of a pokemon.
+        :param limit: an int, the number of neighbours.
+        :param metric: a string, "euclidean" for the distance between
+                       the stats, or "cosine" for the angle between them,
+                       which compares the shape of the profiles whatever
+                       their total.
+        :return: a tuple of the row of the pokemon, and an int array of
+                 the rows and a float array of the distances of its
+                 neighbours, closest first.
+        :raises ValueError: if the pokemon or metric is unknown.
+        """
+        row = self.row(identifier)
+        stats = self.stats.astype(numpy.float64)
+        if metric == "euclidean":
+            distances = numpy.sqrt(((stats - stats[row]) ** 2).sum(axis=1))
+        elif metric == "cosine":
+            norms = numpy.linalg.norm(stats, axis=1)
+            norms[norms == 0] = 1
+            distances = 1 - (stats @ stats[row]) / (norms * norms[row])
+        else:
+            raise ValueError(f"Unknown metric '{metric}'. Choose from "
+                             f"{', '.join(self.METRICS)}.")
+        distances[row] = numpy.inf
+        limit = min(limit, len(self) - 1)
+        if limit < 1:
+            return row, numpy.empty(0, dtype=numpy.intp), numpy.empty(0)
+        nearest = numpy.argpartition(distances, limit - 1)[:limit]
+        nearest = nearest[numpy.lexsort((self.ids[nearest],
+                                         distances[nearest]))]
+        return row, nearest, distances[nearest]
+
+    def format_rows(self, rows, title: str = "Pokemon",
+                    extra: tuple = None) -> str:
+        """
+        Formats the stats of pokemon as a table.
+        :param rows: an int array of rows
+        :param title: a string, the header of the name column.
+        :param extra: a tuple of a column header and a float array of
+                      its values, or None.
+        :return: a string
+        """
+        header = f"{title:<24}{'ID':>6}" + "".join(
+            f"{label:>7}" for label in self.LABELS)
+        if extra is not None:
+            header += f"{extra[0]:>10}"
+        lines = [header]
+        matrix = self.matrix(rows).tolist()
+        for index, (row, values) in enumerate(zip(rows.tolist(), matrix)):
+            line = f"{self.names[row]:<24}{self.ids[row]:>6}" + "".join(
+                f"{value:>7}" for value in values)
+            if extra is not None:
+                line += f"{extra[1][index]:>10.3f}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def format_percentiles(self, quantiles: tuple = PERCENTILES,
+                           type_name: str = None) -> str:
+        """
+        Formats percentiles of every stat as a table.
+        :param quantiles: a tuple of numbers from 0 to 100.
+        :param type_name: a string, to only include a type.
+        :return: a string
+        """
+        values = self.percentiles(quantiles, type_name)
+        lines = [f"{'Percentile':<12}" + "".join(
+            f"{label:>8}" for label in self.LABELS)]
+        for quantile, row in zip(quantiles, values.tolist()):
+            lines.append(f"{f'p{quantile:g}':<12}" + "".join(
+                f"{value:>8.1f}" for value in row))
+        return "\n".join(lines)
+
+    def format_types(self) -> str:
+        """
+        Formats the mean stats of every type as a table, with the highest
+        total of the type.
+        :return: a string
+        """
+        counts, means, maxima = self.type_aggregates()
+        lines = [f"{'Type':<12}{'Count':>6}" + "".join(
+            f"{label:>8}" for label in self.LABELS) + f"{'Best':>8}"]
+        for type_name, count, mean, best in zip(
+                self.types, counts.tolist(), means.tolist(),
+                maxima[:, -1].tolist()):
+            lines.append(f"{type_name:<12}{count:>6}" + "".join(
+                f"{value:>8.1f}" for value in mean) + f"{best:>8}")
+        return "\n".join(lines)
+
+    def format_similar(self, identifier, limit: int = 5,
+                       metric: str = "euclidean") -> str:
+        """
+        Formats a pokemon and its closest neighbours as a table, with
+        their distance to it. Takes the same arguments as similar().
+        :return: a string
+        """
+        row, rows, distances = self.similar(identifier, limit, metric)
+        return self.format_rows(
+            numpy.concatenate(([row], rows)),
+            extra=("Distance", numpy.concatenate(([0.0], distances))))
@@ -0,0 +1,271 @@
+"""
+Contains the class definition for the persistent response cache.
+"""
+
+import os
+import sqlite3
+import time
+
+from pokemonretriever.pokedex_json import codec
+
+
+class PokedexCache:
+    """
+    A persistent, SQLite-backed store of PokeAPI responses keyed by
+    (request type, request id). Entries expire after a time-to-live
+    and the least recently used entries are evicted once the cache
+    grows past its size budget.
+
+    Each entry also keeps the validators of its response, the ETag and
+    Last-Modified headers. Expired entries with validators are kept so
+    they can be revalidated with a conditional request and reused if
+    the resource has not changed.
+
+    Responses are stored projected onto the fields their parser reads,
+    so each entry records the version of that projection. An entry of
+    another version lacks fields the parser may now read, and is treated
+    as a miss.
+    """
+    DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pokedex")
+    DEFAULT_TTL = 7 * 24 * 60 * 60
+    DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+    FILE_NAME = "responses.sqlite3"
+    VALIDATORS = {"etag": "ETag", "last_modified": "Last-Modified"}
+
+    def __init__(self, cache_dir: str = None, ttl: float = DEFAULT_TTL,
+                 max_size: int = DEFAULT_MAX_SIZE):
+        """
+        Initializes a PokedexCache object.
+
+        :param cache_dir: a string, the directory holding the cache
+                          database. Defaults to ~/.cache/pokedex.
+        :param ttl: a number, the seconds an entry stays fresh. None or
+                    0 disables expiry.
+        :param max_size: an int, the budget in bytes for all stored
+                         responses.
+        """
+        self.cache_dir = cache_dir if cache_dir else self.DEFAULT_DIR
+        self.ttl = ttl
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.path = os.path.join(self.cache_dir, self.FILE_NAME)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "req_type TEXT NOT NULL, "
+                "req_id TEXT NOT NULL, "
+                "data TEXT NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "stored_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL, "
+                "etag TEXT, "
+                "last_modified TEXT, "
+                "projection TEXT, "
+                "PRIMARY KEY (req_type, req_id))")
+            columns = [row[1] for row in self.connection.execute(
+                "PRAGMA table_info(responses)")]
+            for column in tuple(self.VALIDATORS) + ("projection",):
+                if column not in columns:
+                    self.connection.execute(
+                        f"ALTER TABLE responses ADD COLUMN {column} TEXT")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at "
+                "ON responses (accessed_at)")
+        self.size = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(req_type: str, req_id) -> tuple:
+        """
+        Normalizes a request into the key it is stored under.
+
+        :param req_type: a string, the category type of the request.
+        :param req_id: a string or int, the id or name of the request.
+        :return: a tuple of two strings
+        """
+        return req_type, str(req_id).strip().lower()
+
+    def get(self, req_type: str, req_id, projection: str = None):
+        """
+        Looks up a cached response.
+
+        :param req_type: a string, the category type of the request.
+        :param req_id: a string or int, the id or name of the request.
+        :param projection: a string, the version of the projection the
+                           response must have been stored with, or None
+                           for unprojected responses.
+        :return: the decoded json response, or None on a miss or when
+                 the entry has expired. Expired entries are deleted
+                 unless they have validators, and entries of another
+                 projection are deleted.
+        """
+        key = self.make_key(req_type, req_id)
+        row = self.__select(key, projection,
+                            "data, stored_at, etag, last_modified")
+        if row is None:
+            return None
+        data, stored_at, etag, last_modified = row
+        now = time.time()
+        if self.ttl and now - stored_at > self.ttl:
+            if etag is None and last_modified is None:
+                self.__delete(key)
+            return None
+        with self.connection:
+            self.connection.execute(
+                "UPDATE responses SET accessed_at = ? "
+                "WHERE req_type = ? AND req_id = ?", (now,) + key)
+        return codec.loads(data)
+
+    def validators(self, req_type: str, req_id,
+                   projection: str = None) -> dict:
+        """
+        Gets the validators of a cached response, to revalidate it with.
+
+        :param req_type: a string, the category type of the request.
+        :param req_id: a string or int, the id or name of the request.
+        :param projection: a string, the version of the projection, or
+                           None.
+        :return: a dictionary of response header, "ETag" or
+                 "Last-Modified", to its value. Empty if the response is
+                 not cached with this projection or has no validators.
+        """
+        row = self.__select(self.make_key(req_type, req_id), projection,
+                            "etag, last_modified")
+        if row is None:
+            return {}
+        return {header: value for header, value
+                in zip(self.VALIDATORS.values(), row) if value is not None}
+
+    def revalidate(self, req_type: str, req_id, projection: str = None):
+        """
+        Marks a cached response as fresh again, after the API answered
+        its conditional request with 304 Not Modified.
+
+        :param req_type: a string, the category type of the request.
+        :param req_id: a string or int, the id or name of the request.
+        :param projection: a string, the version of the projection, or
+                           None.
+        :return: the decoded json response, or None if it is no longer
+                 cached with this projection.
+        """
+        key = self.make_key(req_type, req_id)
+        row = self.__select(key, projection, "data")
+        if row is None:
+            return None
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ? "
+                "WHERE req_type = ? AND req_id = ?", (now, now) + key)
+        return codec.loads(row[0])
+
+    def put(self, req_type: str, req_id, data, validators: dict = None,
+            projection: str = None):
+        """
+        Stores a response, evicting the least recently used entries if
+        the cache exceeds its size budget.
+
+        :param req_type: a string, the category type of the request.
+        :param req_id: a string or int, the id or name of the request.
+        :param data: the decoded json response.
+        :param validators: a dictionary of the response's ETag and
+                           Last-Modified headers, if it had any.
+        :param projection: a string, the version of the projection the
+                           response was stored with, or None.
+        :return: None
+        """
+        key = self.make_key(req_type, req_id)
+        payload = codec.dumps(data)
+        size = len(payload)
+        if size > self.max_size:
+            return
+        self.__delete(key)
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO responses (req_type, req_id, data, size, "
+                "stored_at, accessed_at, etag, last_modified, "
+                "projection) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                key + (payload, size, now, now) +
+                tuple((validators or {}).get(header)
+                      for header in self.VALIDATORS.values()) +
+                (projection,))
+        self.size += size
+        self.__evict()
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        :return: None
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM responses")
+        self.size = 0
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        :return: None
+        """
+        self.connection.close()
+
+    def __select(self, key: tuple, projection: str, columns: str):
+        """
+        Reads columns of an entry, deleting it if it was stored with
+        another projection.
+        :param key: a tuple, the (req_type, req_id) of the entry.
+        :param projection: a string, or None.
+        :param columns: a string, the columns to read.
+        :return: a tuple of the values of the columns, or None.
+        """
+        row = self.connection.execute(
+            f"SELECT projection, {columns} FROM responses "
+            f"WHERE req_type = ? AND req_id = ?", key).fetchone()
+        if row is None:
+            return None
+        if row[0] != projection:
+            self.__delete(key)
+            return None
+        return row[1:]
+
+    def __delete(self, key: tuple):
+        """
+        Removes a single entry and updates the tracked size.
+        :param key: a tuple, the (req_type, req_id) of the entry.
+        :return: None
+        """
+        row = self.connection.execute(
+            "SELECT size FROM responses WHERE req_type = ? AND req_id = ?",
+            key).fetchone()
+        if row is None:
+            return
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM responses WHERE req_type = ? AND req_id = ?",
+                key)
+        self.size -= row[0]
+
+    def __evict(self):
+        """
+        Deletes the least recently used entries until the cache fits
+        within its size budget.
+        :return: None
+        """
+        if self.size <= self.max_size:
+            return
+        rows = self.connection.execute(
+            "SELECT req_type, req_id, size FROM responses "
+            "ORDER BY accessed_at ASC").fetchall()
+        evicted = []
+        for req_type, req_id, size in rows:
+            if self.size <= self.max_size:
+                break
+            evicted.append((req_type, req_id))
+            self.size -= size
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM responses WHERE req_type = ? AND req_id = ?",
+                evicted)
@@ -0,0 +1,408 @@
+"""
+Contains the class definitions for the damage calculator, which
+evaluates attacker x move x defender combinations of a snapshot in
+vectorized batches over a precomputed 18 x 18 type chart. Requires
+numpy.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pokemonretriever.pokedex_analytics import PokedexStats
+from pokemonretriever.pokedex_store import PokedexStore
+
+
+class PokedexMoves:
+    """
+    The power, accuracy, type and damage class of every move of a
+    snapshot as arrays, in id order, with the row of every name.
+    """
+    # The layout of PokedexStore.RECORDS["move"]: id, name, accuracy, pp,
+    # power, type, damage class, generation, short effect.
+    RECORD = [("id", "<u4"), ("name", "<u4"), ("accuracy", "<i2"),
+              ("pp", "<i2"), ("power", "<i2"), ("type", "<u4"),
+              ("damage_class", "<u4"), ("generation", "<u4"),
+              ("effect_short", "<u4")]
+
+    def __init__(self, names: list, power, accuracy, types: list,
+                 type_codes, physical, damaging):
+        """
+        Initializes a PokedexMoves.
+
+        :param names: a list of the name of every move.
+        :param power: an int array, 0 for moves without power.
+        :param accuracy: an int array, 100 for moves that never miss.
+        :param types: a list of the type name of every move.
+        :param type_codes: an int array of the index of every move's
+                           type in PokedexDamage.TYPES, or NEUTRAL.
+        :param physical: a boolean array, True for physical moves.
+        :param damaging: a boolean array, False for status moves and
+                         moves without power.
+        """
+        self.names = names
+        self.power = power
+        self.accuracy = accuracy
+        self.types = types
+        self.type_codes = type_codes
+        self.physical = physical
+        self.damaging = damaging
+        self.rows = {name: row for row, name in enumerate(names)}
+
+    @classmethod
+    def from_store(cls, store: PokedexStore):
+        """
+        Reads every move of a snapshot from its fixed-width records in
+        one copy.
+        :param store: a PokedexStore
+        :return: a PokedexMoves
+        :raises ImportError: if numpy is not installed.
+        """
+        if numpy is None:
+            raise ImportError("The damage calculator needs numpy. Install "
+                              "it with 'pip install numpy'.")
+        dtype = numpy.dtype(cls.RECORD)
+        if dtype.itemsize != PokedexStore.RECORDS["move"].size:
+            raise ValueError("The move record layout has changed")
+        records = numpy.frombuffer(store.record_bytes("move"), dtype=dtype)
+        names = [store.string(name) for name in records["name"].tolist()]
+        type_ids, type_rows = numpy.unique(records["type"],
+                                           return_inverse=True)
+        type_names = [store.string(type_id) for type_id in type_ids.tolist()]
+        type_codes = numpy.array(
+            [PokedexDamage.code(type_name) for type_name in type_names],
+            dtype=numpy.intp)[type_rows]
+        class_ids, class_rows = numpy.unique(records["damage_class"],
+                                             return_inverse=True)
+        classes = numpy.array([store.string(class_id)
+                               for class_id in class_ids.tolist()],
+                              dtype=object)[class_rows]
+        power = records["power"].astype(numpy.int32)
+        accuracy = records["accuracy"].astype(numpy.int32)
+        damaging = (power > 0) & (classes != "status")
+        return cls(names, numpy.where(damaging, power, 0),
+                   numpy.where(accuracy < 0, 100, accuracy),
+                   [type_names[row] for row in type_rows.tolist()],
+                   type_codes, classes == "physical", damaging)
+
+    def __len__(self):
+        """
+        Returns the number of moves.
+        :return: an int
+        """
+        return len(self.names)
+
+    def row(self, name: str) -> int:
+        """
+        Finds the row of a move.
+        :param name: a string
+        :return: an int
+        :raises ValueError: if the snapshot has no such move.
+        """
+        row = self.rows.get(str(name).strip().lower())
+        if row is None:
+            raise ValueError(f"No move '{name}' in the snapshot")
+        return row
+
+
+class PokedexDamage:
+    """
+    Computes the damage of moves with the damage formula of the games
+    since generation V, at a level, with perfect IVs and no EVs:
+
+        damage = ((2 * level / 5 + 2) * power * A / D / 50 + 2)
+                 * STAB * type effectiveness
+
+    where A and D are the attack and defense, or the special attack and
+    special defense for special moves, STAB is 1.5 if the attacker has
+    the move's type, and the random roll is its highest. Status moves do
+    no damage. Intermediate results are not rounded as in the games, so
+    results can be a point above theirs.
+
+    A batch is an attackers x moves x defenders array computed with
+    broadcasting, a chunk of attackers at a time.
+    """
+    TYPES = ("normal", "fire", "water", "electric", "grass", "ice",
+             "fighting", "poison", "ground", "flying", "psychic", "bug",
+             "rock", "ghost", "dragon", "dark", "steel", "fairy")
+    # The index of the neutral type of unknown types and of the missing
+    # second type of single-typed pokemon.
+    NEUTRAL = len(TYPES)
+    # The effectiveness of every attacking type that is not 1.
+    CHART = {
+        "normal": {"rock": 0.5, "ghost": 0, "steel": 0.5},
+        "fire": {"fire": 0.5, "water": 0.5, "grass": 2, "ice": 2, "bug": 2,
+                 "rock": 0.5, "dragon": 0.5, "steel": 2},
+        "water": {"fire": 2, "water": 0.5, "grass": 0.5, "ground": 2,
+                  "rock": 2, "dragon": 0.5},
+        "electric": {"water": 2, "electric": 0.5, "grass": 0.5,
+                     "ground": 0, "flying": 2, "dragon": 0.5},
+        "grass": {"fire": 0.5, "water": 2, "grass": 0.5, "poison": 0.5,
+                  "ground": 2, "flying": 0.5, "bug": 0.5, "rock": 2,
+                  "dragon": 0.5, "steel": 0.5},
+        "ice": {"fire": 0.5, "water": 0.5, "grass": 2, "ice": 0.5,
+                "ground": 2, "flying": 2, "dragon": 2, "steel": 0.5},
+        "fighting": {"normal": 2, "ice": 2, "poison": 0.5, "flying": 0.5,
+                     "psychic": 0.5, "bug": 0.5, "rock": 2, "ghost": 0,
+                     "dark": 2, "steel": 2, "fairy": 0.5},
+        "poison": {"grass": 2, "poison": 0.5, "ground": 0.5, "rock": 0.5,
+                   "ghost": 0.5, "steel": 0, "fairy": 2},
+        "ground": {"fire": 2, "electric": 2, "grass": 0.5, "poison": 2,
+                   "flying": 0, "bug": 0.5, "rock": 2, "steel": 2},
+        "flying": {"electric": 0.5, "grass": 2, "fighting": 2, "bug": 2,
+                   "rock": 0.5, "steel": 0.5},
+        "psychic": {"fighting": 2, "poison": 2, "psychic": 0.5, "dark": 0,
+                    "steel": 0.5},
+        "bug": {"fire": 0.5, "grass": 2, "fighting": 0.5, "poison": 0.5,
+                "flying": 0.5, "psychic": 2, "ghost": 0.5, "dark": 2,
+                "steel": 0.5, "fairy": 0.5},
+        "rock": {"fire": 2, "ice": 2, "fighting": 0.5, "ground": 0.5,
+                 "flying": 2, "bug": 2, "steel": 0.5},
+        "ghost": {"normal": 0, "psychic": 2, "ghost": 2, "dark": 0.5},
+        "dragon": {"dragon": 2, "steel": 0.5, "fairy": 0},
+        "dark": {"fighting": 0.5, "psychic": 2, "ghost": 2, "dark": 0.5,
+                 "fairy": 0.5},
+        "steel": {"fire": 0.5, "water": 0.5, "electric": 0.5, "ice": 2,
+                  "rock": 2, "steel": 0.5, "fairy": 2},
+        "fairy": {"fire": 0.5, "fighting": 2, "poison": 0.5, "dragon": 2,
+                  "dark": 2, "steel": 0.5},
+    }
+    DEFAULT_LEVEL = 50
+    STAB = 1.5
+    # The most elements of a batch computed at once.
+    CHUNK_SIZE = 1 << 22
+
+    def __init__(self, stats: PokedexStats, moves: PokedexMoves,
+                 store: PokedexStore = None, level: int = DEFAULT_LEVEL):
+        """
+        Initializes a PokedexDamage.
+
+        :param stats: a PokedexStats, the pokemon that attack and defend.
+        :param moves: a PokedexMoves
+        :param store: a PokedexStore, the snapshot that holds the
+                      movepool of every pokemon, or None to only evaluate
+                      given moves.
+        :param level: an int, the level of every pokemon.
+        :raises ImportError: if numpy is not installed.
+        """
+        if numpy is None:
+            raise ImportError("The damage calculator needs numpy. Install "
+                              "it with 'pip install numpy'.")
+        self.stats = stats
+        self.moves = moves
+        self.store = store
+        self.level = level
+        self.chart = self.type_chart()
+        codes = numpy.array([self.code(type_name)
+                             for type_name in stats.types], dtype=numpy.intp)
+        # The types of every pokemon as chart indices: a flag per type,
+        # and the first and second type, NEUTRAL if it has no second one.
+        self.type_flags = numpy.zeros((len(stats), self.NEUTRAL + 1),
+                                      dtype=bool)
+        for column, code in enumerate(codes.tolist()):
+            self.type_flags[:, code] |= stats.type_mask[:, column]
+        self.type_flags[:, self.NEUTRAL] = False
+        order = numpy.argsort(~stats.type_mask, axis=1, kind="stable")
+        order = order[:, :2] if order.shape[1] >= 2 else \
+            numpy.zeros((len(stats), 2), dtype=numpy.intp)
+        present = numpy.take_along_axis(stats.type_mask, order, axis=1) \
+            if stats.type_mask.shape[1] else \
+            numpy.zeros((len(stats), 2), dtype=bool)
+        self.defender_types = numpy.where(
+            present, codes[order] if len(codes) else self.NEUTRAL,
+            self.NEUTRAL)
+        base = stats.stats.astype(numpy.float32)
+        self.battle_stats = numpy.floor((2 * base + 31) * level / 100) + 5
+        self.battle_stats[:, 0] += level + 5
+
+    @classmethod
+    def from_store(cls, store: PokedexStore, level: int = DEFAULT_LEVEL):
+        """
+        Reads the pokemon and moves of a snapshot.
+        :param store: a PokedexStore
+        :param level: an int, the level of every pokemon.
+        :return: a PokedexDamage
+        """
+        return cls(PokedexStats.from_store(store),
+                   PokedexMoves.from_store(store), store, level)
+
+    @classmethod
+    def code(cls, type_name: str) -> int:
+        """
+        Gets the index of a type in the chart.
+        :param type_name: a string
+        :return: an int, NEUTRAL for types that are not in TYPES.
+        """
+        return cls.TYPES.index(type_name) if type_name in cls.TYPES \
+            else cls.NEUTRAL
+
+    @classmethod
+    def type_chart(cls):
+        """
+        Builds the type chart, with a neutral row and column.
+        :return: a 19 x 19 float32 array of the effectiveness of an
+                 attacking type (row) on a defending type (column).
+        """
+        chart = numpy.ones((cls.NEUTRAL + 1, cls.NEUTRAL + 1),
+                           dtype=numpy.float32)
+        for attacking, multipliers in cls.CHART.items():
+            for defending, multiplier in multipliers.items():
+                chart[cls.TYPES.index(attacking),
+                      cls.TYPES.index(defending)] = multiplier
+        return chart
+
+    def movepool(self, attacker: int):
+        """
+        Gets the moves a pokemon learns.
+        :param attacker: an int, the row of the pokemon.
+        :return: an int array of move rows
+        """
+        if self.store is None:
+            raise ValueError("Movepools need the snapshot")
+        record = self.store.record("pokemon", attacker)
+        rows = [self.moves.rows.get(move["move"]["name"])
+                for move in record["moves"]]
+        return numpy.array(sorted({row for row in rows if row is not None}),
+                           dtype=numpy.intp)
+
+    def effectiveness(self, moves, defenders):
+        """
+        Looks up the type effectiveness of moves on defenders.
+        :param moves: an int array of move rows
+        :param defenders: an int array of pokemon rows
+        :return: a moves x defenders float32 array
+        """
+        move_types = self.moves.type_codes[moves][:, None]
+        types = self.defender_types[defenders]
+        return self.chart[move_types, types[None, :, 0]] * \
+            self.chart[move_types, types[None, :, 1]]
+
+    def damage(self, attackers, moves, defenders, learned=None):
+        """
+        Computes the damage of every attacker, move and defender.
+
+        :param attackers: an int array of pokemon rows
+        :param moves: an int array of move rows
+        :param defenders: an int array of pokemon rows
+        :param learned: an attackers x moves boolean array, False where
+                        an attacker does not learn a move, which then
+                        does no damage. Every attacker uses every move if
+                        None.
+        :return: an attackers x moves x defenders float32 array
+        """
+        physical = self.moves.physical[moves]
+        attack = self.battle_stats[attackers]
+        offense = numpy.where(physical[None, :], attack[:, 1, None],
+                              attack[:, 3, None])
+        stab = numpy.where(
+            self.type_flags[attackers][:, self.moves.type_codes[moves]],
+            numpy.float32(self.STAB), numpy.float32(1))
+        if learned is not None:
+            stab *= learned
+        factor = (numpy.float32(2 * self.level / 5 + 2) / 50 *
+                  self.moves.power[moves][None, :] * offense) \
+            .astype(numpy.float32)
+        defense = self.battle_stats[defenders]
+        inverse = 1 / numpy.where(physical[:, None], defense[None, :, 2],
+                                  defense[None, :, 4])
+        multiplier = self.effectiveness(moves, defenders) * \
+            self.moves.damaging[moves][:, None]
+        result = numpy.multiply(factor[:, :, None], inverse[None, :, :],
+                                dtype=numpy.float32)
+        result += 2
+        result *= stab[:, :, None]
+        result *= multiplier[None, :, :]
+        return numpy.floor(result, out=result)
+
+    def rank(self, attackers, moves=None, defenders=None, limit: int = 10,
+             best_move: bool = False) -> list:
+        """
+        Ranks attacker, move and defender combinations by the share of
+        the defender's HP the move takes. Batches are computed a chunk
+        of attackers at a time, and only the best results of each chunk
+        are kept.
+
+        :param attackers: an int array of pokemon rows
+        :param moves: an int array of move rows used by every attacker,
+                      or None for the movepool of each attacker.
+        :param defenders: an int array of pokemon rows, or None for
+                          every pokemon.
+        :param limit: an int, the number of results.
+        :param best_move: a boolean, True to only keep the best move of
+                          every attacker against every defender.
+        :return: a list of (attacker, move, defender, damage, percent)
+                 tuples, the highest percent first.
+        """
+        attackers = numpy.asarray(attackers, dtype=numpy.intp)
+        if defenders is None:
+            defenders = numpy.arange(len(self.stats))
+        defenders = numpy.asarray(defenders, dtype=numpy.intp)
+        learned = None
+        if moves is None:
+            pools = [self.movepool(attacker)
+                     for attacker in attackers.tolist()]
+            moves = numpy.unique(numpy.concatenate(pools)) if pools \
+                else numpy.empty(0, dtype=numpy.intp)
+            learned = numpy.zeros((len(attackers), len(moves)), dtype=bool)
+            for index, pool in enumerate(pools):
+                learned[index, numpy.searchsorted(moves, pool)] = True
+        moves = numpy.asarray(moves, dtype=numpy.intp)
+        if not (len(attackers) and len(moves) and len(defenders)) or \
+                limit < 1:
+            return []
+        hp = self.battle_stats[defenders, 0]
+        step = max(1, self.CHUNK_SIZE // (len(moves) * len(defenders)))
+        results = []
+        for start in range(0, len(attackers), step):
+            chunk = slice(start, start + step)
+            percent = self.damage(
+                attackers[chunk], moves, defenders,
+                learned[chunk] if learned is not None else None)
+            percent *= 100 / hp
+            if best_move:
+                move_index = percent.argmax(axis=1)
+                percent = numpy.take_along_axis(
+                    percent, move_index[:, None, :], axis=1)[:, 0, :]
+            flat = percent.ravel()
+            count = min(limit, len(flat))
+            top = numpy.argpartition(-flat, count - 1)[:count]
+            top = top[flat[top] > 0]
+            if best_move:
+                attacker_index, defender_index = numpy.unravel_index(
+                    top, percent.shape)
+                move_rows = moves[move_index[attacker_index,
+                                             defender_index]]
+            else:
+                attacker_index, move_index, defender_index = \
+                    numpy.unravel_index(top, percent.shape)
+                move_rows = moves[move_index]
+            results.extend(zip(
+                attackers[chunk][attacker_index].tolist(),
+                move_rows.tolist(), defenders[defender_index].tolist(),
+                (flat[top] * hp[defender_index] / 100).round().tolist(),
+                flat[top].tolist()))
+        results.sort(key=lambda result: (-result[4], result[0], result[1],
+                                         result[2]))
+        return results[:limit]
+
+    def format_results(self, results: list) -> str:
+        """
+        Formats ranked results as a table.
+        :param results: a list of tuples returned by rank().
+        :return: a string
+        """
+        lines = [f"{'Attacker':<20}{'Move':<20}{'Type':<10}"
+                 f"{'Defender':<20}{'Effect':>7}{'Damage':>8}{'% HP':>8}"
+                 f"{'Acc':>5}"]
+        for attacker, move, defender, damage, percent in results:
+            effect = float(self.effectiveness(numpy.array([move]),
+                                              numpy.array([defender]))[0, 0])
+            lines.append(f"{self.stats.names[attacker]:<20}"
+                         f"{self.moves.names[move]:<20}"
+                         f"{self.moves.types[move]:<10}"
+                         f"{self.stats.names[defender]:<20}"
+                         f"{'x' + format(effect, 'g'):>7}"
+                         f"{int(damage):>8}{percent:>8.1f}"
+                         f"{int(self.moves.accuracy[move]):>5}")
+        return "\n".join(lines)
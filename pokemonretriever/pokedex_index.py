@@ -0,0 +1,171 @@
+"""
+Contains the class definition for the local name and id index of the
+API's resources.
+"""
+
+import difflib
+import os
+
+from pokemonretriever.pokedex_cache import PokedexCache
+from pokemonretriever.pokedex_json import codec
+from pokemonretriever.pokedex_request import PokedexRequestError
+
+
+class PokedexIndex:
+    """
+    Maps the names of every pokemon, move, ability and stat to their ids.
+    It is built once from the API's paginated list endpoints and saved to
+    disk, so identifiers can be canonicalized, and unknown ones rejected
+    with suggestions, without any HTTP traffic.
+    """
+    DEFAULT_PATH = os.path.join(PokedexCache.DEFAULT_DIR, "index.json")
+    RESOURCE_TYPES = ("pokemon", "move", "ability", "stat")
+    VERSION = 1
+
+    def __init__(self, resources: dict = None):
+        """
+        Initializes a PokedexIndex.
+
+        :param resources: a dictionary of resource type to a list of
+                          (name, id) pairs.
+        """
+        self.names = {}
+        self.ids = {}
+        for req_type, references in (resources or {}).items():
+            for name, resource_id in references:
+                self.add(req_type, name, resource_id)
+
+    def add(self, req_type: str, name: str, resource_id: int):
+        """
+        Adds a resource to the index.
+        :param req_type: a string, the resource type.
+        :param name: a string, the name of the resource.
+        :param resource_id: an int, the id of the resource.
+        :return: None
+        """
+        self.names.setdefault(req_type, {})[name.lower()] = int(resource_id)
+        self.ids.setdefault(req_type, set()).add(int(resource_id))
+
+    def __len__(self):
+        """
+        Returns the number of resources in the index.
+        :return: an int
+        """
+        return sum(len(names) for names in self.names.values())
+
+    def knows(self, req_type: str) -> bool:
+        """
+        Checks if the index covers a resource type.
+        :param req_type: a string
+        :return: a boolean
+        """
+        return req_type in self.names
+
+    def canonical(self, req_type: str, req_id):
+        """
+        Maps a name or id to the id of its resource, as a string.
+
+        :param req_type: a string, the resource type.
+        :param req_id: a string or int, the id or name of the resource.
+        :return: a string, or None if the index covers the resource type
+                 and has no such resource. Identifiers of resource types
+                 the index does not cover are returned unchanged.
+        """
+        key = str(req_id).strip().lower()
+        if not self.knows(req_type):
+            return key
+        if key.isdigit():
+            return str(int(key)) if int(key) in self.ids[req_type] else None
+        resource_id = self.names[req_type].get(key)
+        return str(resource_id) if resource_id is not None else None
+
+    def suggest(self, req_type: str, req_id, count: int = 3) -> list:
+        """
+        Gets the names closest to an unknown identifier.
+
+        :param req_type: a string, the resource type.
+        :param req_id: a string, the unknown identifier.
+        :param count: an int, the most suggestions returned.
+        :return: a list of strings
+        """
+        return difflib.get_close_matches(str(req_id).strip().lower(),
+                                         self.names.get(req_type, {}),
+                                         n=count)
+
+    def check(self, req_type: str, identifiers: list) -> tuple:
+        """
+        Replaces every identifier with the id of its resource. Unknown
+        identifiers are dropped and reported as failures, with the
+        closest names as suggestions.
+
+        :param req_type: a string, the resource type.
+        :param identifiers: a list of strings, names or ids.
+        :return: a tuple of the list of ids and the list of
+                 PokedexRequestErrors of the unknown identifiers.
+                 Identifiers of resource types the index does not cover
+                 are returned unchanged.
+        """
+        if not self.knows(req_type):
+            return identifiers, []
+        known, failures = [], []
+        for req_id in identifiers:
+            key = self.canonical(req_type, req_id)
+            if key is not None:
+                known.append(key)
+                continue
+            suggestions = self.suggest(req_type, req_id)
+            reason = "Unknown name or id"
+            if suggestions:
+                reason += f". Did you mean {', '.join(suggestions)}?"
+            failures.append(PokedexRequestError(req_type, req_id,
+                                                reason=reason))
+        return known, failures
+
+    def save(self, path: str = DEFAULT_PATH):
+        """
+        Writes the index to a json file.
+        :param path: a string
+        :return: None
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, mode="wb") as file:
+            file.write(codec.dumps({
+                "version": self.VERSION,
+                "resources": {req_type: sorted(names.items(),
+                                               key=lambda item: item[1])
+                              for req_type, names in self.names.items()}}))
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PATH):
+        """
+        Reads an index written by save().
+        :param path: a string
+        :return: a PokedexIndex, or None if there is no index file.
+        :raises ValueError: if the file is not a PokedexIndex.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, mode="rb") as file:
+            data = codec.loads(file.read())
+        if not isinstance(data, dict) or data.get("version") != cls.VERSION:
+            raise ValueError(f"{path} is not a pokedex index")
+        return cls(data["resources"])
+
+    @classmethod
+    async def build(cls, api, path: str = DEFAULT_PATH):
+        """
+        Lists every resource type through the API and saves the result
+        as an index.
+
+        :param api: an open PokedexAPI
+        :param path: a string, where to write the index.
+        :return: a PokedexIndex
+        """
+        index = cls()
+        for req_type in cls.RESOURCE_TYPES:
+            for name, resource_id in await api.list_references(req_type):
+                index.add(req_type, name, resource_id)
+        index.save(path)
+        return index
@@ -0,0 +1,83 @@
+"""
+Contains the json decoding layer. The fastest installed backend is used:
+orjson, then ujson, then the standard library.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class PokedexJSON:
+    """
+    Decodes and encodes json with a pluggable backend. Every backend
+    accepts bytes, so response bodies are decoded without first being
+    copied into a string, and encodes to compact UTF-8 bytes.
+    """
+    BACKENDS = ("orjson", "ujson", "json")
+
+    def __init__(self, backend: str = None):
+        """
+        Initializes a PokedexJSON.
+
+        :param backend: a string, one of BACKENDS, or None for the
+                        fastest one installed.
+        :raises ValueError: if the backend is unknown or not installed.
+        """
+        available = self.available()
+        if backend is None:
+            backend = available[0]
+        if backend not in available:
+            raise ValueError(f"The json backend '{backend}' is not "
+                             f"available. Choose from "
+                             f"{', '.join(available)}.")
+        self.backend = backend
+        if backend == "orjson":
+            self.loads = orjson.loads
+            self.dumps = orjson.dumps
+        elif backend == "ujson":
+            self.loads = ujson.loads
+            self.dumps = self.__ujson_dumps
+        else:
+            self.loads = json.loads
+            self.dumps = self.__json_dumps
+
+    @staticmethod
+    def available() -> tuple:
+        """
+        Gets the installed backends, fastest first.
+        :return: a tuple of strings
+        """
+        modules = {"orjson": orjson, "ujson": ujson, "json": json}
+        return tuple(name for name in PokedexJSON.BACKENDS
+                     if modules[name] is not None)
+
+    @staticmethod
+    def __ujson_dumps(value) -> bytes:
+        """
+        Encodes a value with ujson.
+        :param value: a json serializable value
+        :return: bytes
+        """
+        return ujson.dumps(value, ensure_ascii=False).encode("UTF-8")
+
+    @staticmethod
+    def __json_dumps(value) -> bytes:
+        """
+        Encodes a value with the standard library.
+        :param value: a json serializable value
+        :return: bytes
+        """
+        return json.dumps(value, ensure_ascii=False,
+                          separators=(",", ":")).encode("UTF-8")
+
+
+codec = PokedexJSON()
@@ -0,0 +1,259 @@
+"""
+Contains the class definition for the timers, counters and latency
+histograms of a run. The stages of a run are fetch (HTTP round trips),
+decode (json decoding and projection), parse, build (object
+construction), render and write (report formatting and output).
+"""
+
+import asyncio
+import os
+import time
+import weakref
+from contextlib import contextmanager, nullcontext
+
+from pokemonretriever.pokedex_json import codec
+
+
+class PokedexMetrics:
+    """
+    Collects per-stage timers, counters and latency histograms, and the
+    spans of every timed stage as Chrome trace events.
+
+    Metrics are off until enable() is called. While they are off, the
+    recording methods are bound to no-ops, so instrumented code only
+    pays for a method call.
+    """
+    BUCKETS = tuple(0.001 * 2 ** exponent for exponent in range(15))
+    FORMATS = ("json", "chrome")
+    MAX_EVENTS = 200000
+
+    def __init__(self, enabled: bool = False):
+        """
+        Initializes a PokedexMetrics.
+        :param enabled: a boolean, True to start recording right away.
+        """
+        self.enabled = False
+        self.reset()
+        if enabled:
+            self.enable()
+        else:
+            self.disable()
+
+    def reset(self):
+        """
+        Discards everything recorded so far.
+        :return: None
+        """
+        self.origin = time.perf_counter()
+        self.timers = {}
+        self.counters = {}
+        self.histograms = {}
+        self.events = []
+        self.lanes = weakref.WeakKeyDictionary()
+
+    def enable(self):
+        """
+        Starts recording.
+        :return: None
+        """
+        self.enabled = True
+        self.timer = self.__timer
+        self.count = self.__count
+        self.observe = self.__observe
+
+    def disable(self):
+        """
+        Stops recording. Recorded metrics are kept.
+        :return: None
+        """
+        self.enabled = False
+        self.timer = self.__null_timer
+        self.count = self.__ignore
+        self.observe = self.__ignore
+
+    @staticmethod
+    def __ignore(*args):
+        """
+        Records nothing.
+        :return: None
+        """
+        pass
+
+    __NULL_CONTEXT = nullcontext()
+
+    @staticmethod
+    def __null_timer(stage: str):
+        """
+        Times nothing.
+        :param stage: a string, the name of the stage.
+        :return: a reusable context manager that does nothing.
+        """
+        return PokedexMetrics.__NULL_CONTEXT
+
+    @contextmanager
+    def __timer(self, stage: str):
+        """
+        Times the code run inside the context as a stage.
+        :param stage: a string, the name of the stage.
+        :return: a context manager
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started_at
+            timer = self.timers.get(stage)
+            if timer is None:
+                timer = self.timers[stage] = [0, 0.0]
+            timer[0] += 1
+            timer[1] += seconds
+            if len(self.events) < self.MAX_EVENTS:
+                self.events.append({
+                    "name": stage, "ph": "X", "pid": os.getpid(),
+                    "tid": self.__lane(),
+                    "ts": (started_at - self.origin) * 1e6,
+                    "dur": seconds * 1e6})
+            else:
+                self.__count("dropped_trace_events")
+
+    def __lane(self) -> int:
+        """
+        Gets the trace lane of the running code. Every asyncio task gets
+        its own lane, so the spans of concurrent requests do not overlap
+        in the trace; code outside of a task is on lane 0.
+        :return: an int
+        """
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            return 0
+        lane = self.lanes.get(task)
+        if lane is None:
+            lane = self.counters.get("traced_tasks", 0) + 1
+            self.lanes[task] = lane
+            self.__count("traced_tasks")
+        return lane
+
+    def __count(self, name: str, value: int = 1):
+        """
+        Adds to a counter.
+        :param name: a string, the name of the counter.
+        :param value: an int
+        :return: None
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def __observe(self, name: str, seconds: float):
+        """
+        Adds a latency to a histogram.
+        :param name: a string, the name of the histogram.
+        :param seconds: a number
+        :return: None
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = {
+                "buckets": [0] * (len(self.BUCKETS) + 1), "count": 0,
+                "seconds": 0.0, "max": 0.0}
+        index = 0
+        for index, bound in enumerate(self.BUCKETS):
+            if seconds <= bound:
+                break
+        else:
+            index = len(self.BUCKETS)
+        histogram["buckets"][index] += 1
+        histogram["count"] += 1
+        histogram["seconds"] += seconds
+        histogram["max"] = max(histogram["max"], seconds)
+
+    def percentile(self, name: str, fraction: float) -> float:
+        """
+        Estimates a percentile of a histogram as the upper bound of the
+        bucket it falls in.
+        :param name: a string, the name of the histogram.
+        :param fraction: a number between 0 and 1.
+        :return: a number of seconds
+        """
+        histogram = self.histograms[name]
+        rank = fraction * histogram["count"]
+        seen = 0
+        for bound, count in zip(self.BUCKETS, histogram["buckets"]):
+            seen += count
+            if seen >= rank:
+                return min(bound, histogram["max"])
+        return histogram["max"]
+
+    def to_dict(self) -> dict:
+        """
+        Gets everything recorded as plain values.
+        :return: a dictionary
+        """
+        histograms = {}
+        for name, histogram in self.histograms.items():
+            bounds = [bound * 1000 for bound in self.BUCKETS] + [None]
+            histograms[name] = {
+                "count": histogram["count"],
+                "mean_ms": histogram["seconds"] / histogram["count"] * 1000,
+                "p50_ms": self.percentile(name, 0.5) * 1000,
+                "p99_ms": self.percentile(name, 0.99) * 1000,
+                "max_ms": histogram["max"] * 1000,
+                "buckets": [[bound, count] for bound, count
+                            in zip(bounds, histogram["buckets"]) if count]}
+        return {"timers": {stage: {"calls": calls, "seconds": seconds}
+                           for stage, (calls, seconds)
+                           in self.timers.items()},
+                "counters": dict(self.counters),
+                "histograms": histograms}
+
+    def summary(self) -> str:
+        """
+        Formats everything recorded as tables.
+        :return: a string
+        """
+        lines = [f"{'Stage':<24}{'Calls':>10}{'Total (s)':>12}"
+                 f"{'Mean (ms)':>12}"]
+        for stage, (calls, seconds) in self.timers.items():
+            lines.append(f"{stage:<24}{calls:>10}{seconds:>12.3f}"
+                         f"{seconds / calls * 1000:>12.3f}")
+        lines.append("")
+        lines.append(f"{'Counter':<24}{'Value':>10}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<24}{value:>10}")
+        if self.histograms:
+            lines.append("")
+            lines.append(f"{'Latency':<24}{'Count':>10}{'p50 (ms)':>12}"
+                         f"{'p99 (ms)':>12}{'Max (ms)':>12}")
+            for name, histogram in self.to_dict()["histograms"].items():
+                lines.append(f"{name:<24}{histogram['count']:>10}"
+                             f"{histogram['p50_ms']:>12.1f}"
+                             f"{histogram['p99_ms']:>12.1f}"
+                             f"{histogram['max_ms']:>12.1f}")
+        return "\n".join(lines)
+
+    def save(self, path: str, file_format: str = "json"):
+        """
+        Writes everything recorded to a file.
+
+        :param path: a string
+        :param file_format: a string, "json" for the timers, counters and
+                            histograms, or "chrome" for a trace of every
+                            timed span that chrome://tracing and Perfetto
+                            open.
+        :return: None
+        :raises ValueError: if the format is unknown.
+        """
+        if file_format == "json":
+            data = self.to_dict()
+        elif file_format == "chrome":
+            data = {"traceEvents": self.events, "displayTimeUnit": "ms",
+                    "otherData": {"counters": self.counters}}
+        else:
+            raise ValueError(f"Unknown profile format '{file_format}'. "
+                             f"Choose from {', '.join(self.FORMATS)}.")
+        with open(path, mode="wb") as file:
+            file.write(codec.dumps(data))
+
+
+metrics = PokedexMetrics()
@@ -1,27 +1,143 @@
 """
 Contains the class definition for PokedexObjects and its child classes.
+
+PokedexObjects use __slots__ instead of an instance dictionary, and the
+names they hold are interned, so strings such as types, moves and
+abilities are shared between every object that refers to them.
 """
+import io
+import sys
 from abc import ABC
+from array import array
 
 
 class PokedexObject(ABC):
     """
-    Represents an item in the pokedex.
+    Represents an item in the pokedex. RECORD_FIELDS lists the keys of
+    the records returned by to_record(), in order.
     """
+    __slots__ = ("name", "id")
+    RECORD_FIELDS = ("name", "id")
+
     def __init__(self, name: str, id: int):
         """
         Instantiates a PokedexObject.
         :param name: a string
         :param id: an int
         """
-        self.name = name.title()
+        self.name = sys.intern(name.title())
         self.id = id
 
+    def to_record(self) -> dict:
+        """
+        Returns the attributes of the object as plain values, for the
+        machine-readable report formats.
+        :return: a dictionary
+        """
+        return {"name": self.name, "id": self.id}
+
+    def write_to(self, stream):
+        """
+        Writes the string representation of the object to a text
+        stream. Objects with a large representation override this to
+        write it in fragments instead of building it as one string.
+        :param stream: a writable text stream
+        :return: None
+        """
+        stream.write(str(self))
+
+
+class ExpandedAttribute:
+    """
+    A Pokemon attribute that only holds identifiers until the Pokemon is
+    expanded for it. The first access after that resolves the
+    identifiers into PokedexObjects through the Pokemon's resolver, and
+    later accesses reuse them. Until then the attribute returns its
+    default, unexpanded representation.
+    """
+
+    def __init__(self, req_type: str, identifiers, default):
+        """
+        Instantiates an ExpandedAttribute.
+        :param req_type: a string, the resource type of the objects the
+                         attribute expands into.
+        :param identifiers: a callable returning the names to resolve
+                            for a Pokemon.
+        :param default: a callable returning the unexpanded value for a
+                        Pokemon.
+        """
+        self.req_type = req_type
+        self.identifiers = identifiers
+        self.default = default
+        self.name = None
+        self.slot = None
+
+    def __set_name__(self, owner, name: str):
+        """
+        Binds the attribute to the slot holding its expanded value.
+        :param owner: the class the attribute belongs to.
+        :param name: a string, the name of the attribute.
+        :return: None
+        """
+        self.name = name
+        self.slot = "expanded_" + name
+
+    def __get__(self, instance, owner=None):
+        """
+        Gets the expanded objects, resolving them on first access, or
+        the default value if the Pokemon is not expanded for it.
+        :param instance: a Pokemon
+        :param owner: the class of the Pokemon
+        :return: a list
+        """
+        if instance is None:
+            return self
+        value = getattr(instance, self.slot)
+        if value is None:
+            if self.name not in instance.expanded_attributes:
+                return self.default(instance)
+            value = instance.resolver.resolve(self.req_type,
+                                              self.identifiers(instance))
+            setattr(instance, self.slot, value)
+        return value
+
+    def __set__(self, instance, value: list):
+        """
+        Sets the expanded objects of a Pokemon.
+        :param instance: a Pokemon
+        :param value: a list of PokedexObjects
+        :return: None
+        """
+        setattr(instance, self.slot, value)
+
 
 class Pokemon(PokedexObject):
     """
-    Represents a pokemon in the pokedex.
+    Represents a pokemon in the pokedex. Its moves are kept as two
+    parallel arrays of move names and the levels they are learned at.
+
+    The stats, moves and abilities attributes are ExpandedAttributes: they
+    hold names until expand() is called, and then resolve into Stat, Move
+    and Ability Objects the first time they are read.
     """
+    __slots__ = ("height", "weight", "type", "base_stats", "ability_names",
+                 "move_names", "move_levels", "resolver",
+                 "expanded_attributes", "expanded_stats", "expanded_moves",
+                 "expanded_abilities")
+    EXPANDABLE = ("stats", "moves", "abilities")
+    RECORD_FIELDS = PokedexObject.RECORD_FIELDS + (
+        "height", "weight", "types", "stats", "moves", "abilities")
+
+    stats = ExpandedAttribute(
+        "stat", lambda pokemon: [name for name, _ in pokemon.base_stats],
+        lambda pokemon: pokemon.base_stats)
+    moves = ExpandedAttribute(
+        "move", lambda pokemon: pokemon.move_names,
+        lambda pokemon: list(zip(pokemon.move_names, pokemon.move_levels)))
+    abilities = ExpandedAttribute(
+        "ability", lambda pokemon: pokemon.ability_names,
+        lambda pokemon: pokemon.ability_names)
+
     def __init__(self, height: int, weight: int,
                  types: [str], stats: list, abilities: [list],
                  moves: list, **kwargs):
@@ -39,9 +155,32 @@ class Pokemon(PokedexObject):
         self.height = height
         self.weight = weight
         self.type = self.__format_pokemon_type(types)
-        self.stats = self.__format_stats(stats)
-        self.abilities = self.__format_abilities(abilities)
-        self.moves = self.__format_moves(moves)
+        self.base_stats = self.__format_stats(stats)
+        self.ability_names = self.__format_abilities(abilities)
+        self.move_names, self.move_levels = self.__format_moves(moves)
+        self.resolver = None
+        self.expanded_attributes = frozenset()
+        self.expanded_stats = None
+        self.expanded_moves = None
+        self.expanded_abilities = None
+
+    def expand(self, resolver, attributes=EXPANDABLE):
+        """
+        Marks attributes of the pokemon to be expanded into PokedexObjects
+        on first access. The names they need are registered with the
+        resolver so they can be prefetched in a batch with those of
+        other Pokemon.
+        :param resolver: a PokedexResolver
+        :param attributes: an iterable of the names of the attributes to
+                           expand, from Pokemon.EXPANDABLE.
+        :return: None
+        """
+        self.resolver = resolver
+        self.expanded_attributes = frozenset(attributes)
+        for attribute in self.expanded_attributes:
+            expanded_attribute = getattr(type(self), attribute)
+            resolver.want(expanded_attribute.req_type,
+                          expanded_attribute.identifiers(self))
 
     @staticmethod
     def __format_pokemon_type(types: list):
@@ -56,7 +195,7 @@ class Pokemon(PokedexObject):
         """
         output = []
         for pokemon_type in types:
-            output.append(pokemon_type['type']['name'])
+            output.append(sys.intern(pokemon_type['type']['name']))
         return output
 
     @staticmethod
@@ -78,7 +217,7 @@ class Pokemon(PokedexObject):
                 if key == 'base_stat':
                     base_stat = value
                 if key == 'stat':
-                    name = value['name']
+                    name = sys.intern(value['name'])
             output.append((name, base_stat))
         return output
 
@@ -95,7 +234,7 @@ class Pokemon(PokedexObject):
         """
         output = []
         for ability in abilities:
-            output.append(ability['ability']['name'])
+            output.append(sys.intern(ability['ability']['name']))
         return output
 
     @staticmethod
@@ -106,60 +245,114 @@ class Pokemon(PokedexObject):
 
         :param moves: a list of dict that contains the API data about
                       the pokemon.
-        :return: a list of tuples that contain information about
-                 the pokemon's attack moves.
+        :return: a tuple of a list of move names and an array of the
+                 levels they are learned at, 0 for moves without
+                 version group details.
         """
-        output = []
+        names = []
+        levels = array('H')
         for move in moves:
-            name = ""
-            level_learned = ""
-            for key, value in move.items():
-                if key == 'move':
-                    name = value['name']
-                if key == 'version_group_details':
-                    level_learned = value[0]['level_learned_at']
-            output.append((name, level_learned))
-        return output
+            names.append(sys.intern(move['move']['name']))
+            details = move['version_group_details']
+            levels.append(details[0]['level_learned_at'] if details else 0)
+        return names, levels
 
-    def __str__(self):
+    def to_record(self) -> dict:
         """
-        Returns a string representation of a pokemon.
-        :return: a string
+        Returns the attributes of the pokemon as plain values. Expanded
+        attributes are lists of the records of their objects, with the
+        base stat and the level learned at kept alongside.
+        :return: a dictionary
+        """
+        record = super().to_record()
+        record["height"] = self.height
+        record["weight"] = self.weight
+        record["types"] = list(self.type)
+        base_stats = dict(self.base_stats)
+        if "stats" in self.expanded_attributes:
+            record["stats"] = [
+                dict(stat.to_record(),
+                     base_stat=base_stats.get(stat.name.lower()))
+                for stat in self.stats]
+        else:
+            record["stats"] = [{"name": name, "base_stat": base_stat}
+                               for name, base_stat in self.base_stats]
+        if "moves" in self.expanded_attributes:
+            levels = dict(zip(self.move_names, self.move_levels))
+            record["moves"] = [
+                dict(move.to_record(), level=levels.get(move.name.lower()))
+                for move in self.moves]
+        else:
+            record["moves"] = [{"name": name, "level": level}
+                               for name, level
+                               in zip(self.move_names, self.move_levels)]
+        if "abilities" in self.expanded_attributes:
+            record["abilities"] = [ability.to_record()
+                                   for ability in self.abilities]
+        else:
+            record["abilities"] = list(self.ability_names)
+        return record
+
+    def write_to(self, stream):
+        """
+        Writes the representation of the pokemon to a text stream one
+        fragment at a time. Expanded stats, moves and abilities are
+        written straight to the stream by each object.
+        :param stream: a writable text stream
+        :return: None
         """
-        formatted = "=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=\n"
-        formatted += f"Pokemon: {self.name}\n" \
-                     f"ID: {self.id}\n" \
-                     f"Weight: {self.weight}\n"\
-                     f"Type: {self.type}\n"
-        if isinstance(self.stats[0], PokemonStat):
-            formatted += "\n<Pokemon Stats>\n"
-            stats = [str(stat) for stat in self.stats]
-            formatted += ''.join(stats)
-            formatted += "</Pokemon Stats>\n"
+        write = stream.write
+        write("=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=\n")
+        write(f"Pokemon: {self.name}\n"
+              f"ID: {self.id}\n"
+              f"Weight: {self.weight}\n"
+              f"Type: {self.type}\n")
+        if self.stats and isinstance(self.stats[0], PokemonStat):
+            self.__write_objects(stream, "Stats", self.stats)
         else:
-            formatted += f"Stats: {self.stats}\n"
-        if isinstance(self.moves[0], PokemonMove):
-            formatted += "\n<Pokemon Moves>\n"
-            moves = [str(move) for move in self.moves]
-            formatted += ''.join(moves)
-            formatted += "</Pokemon Moves>\n"
+            write(f"Stats: {self.stats}\n")
+        if self.moves and isinstance(self.moves[0], PokemonMove):
+            self.__write_objects(stream, "Moves", self.moves)
         else:
-            formatted += f"Moves: {self.moves}\n"
-        if isinstance(self.abilities[0], PokemonAbility):
-            formatted += "\n<Pokemon Abilities>\n"
-            abilities = [str(ability) for ability in self.abilities]
-            formatted += ''.join(abilities)
-            formatted += "</Pokemon Abilities>\n"
+            write(f"Moves: {self.moves}\n")
+        if self.abilities and isinstance(self.abilities[0], PokemonAbility):
+            self.__write_objects(stream, "Abilities", self.abilities)
         else:
-            formatted += f"Abilities: {', '.join(self.abilities)}\n"
-        formatted += "=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=\n"
-        return formatted
+            write(f"Abilities: {', '.join(self.abilities)}\n")
+        write("=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=\n")
+
+    @staticmethod
+    def __write_objects(stream, title: str, pokedex_objects: list):
+        """
+        Writes a section of expanded objects to a text stream.
+        :param stream: a writable text stream
+        :param title: a string, the title of the section.
+        :param pokedex_objects: a list of PokedexObjects
+        :return: None
+        """
+        stream.write(f"\n<Pokemon {title}>\n")
+        for pokedex_object in pokedex_objects:
+            pokedex_object.write_to(stream)
+        stream.write(f"</Pokemon {title}>\n")
+
+    def __str__(self):
+        """
+        Returns a string representation of a pokemon.
+        :return: a string
+        """
+        formatted = io.StringIO()
+        self.write_to(formatted)
+        return formatted.getvalue()
 
 
 class PokemonAbility(PokedexObject):
     """
     Represents an ability in the pokedex.
     """
+    __slots__ = ("generation", "effect", "effect_short", "pokemon")
+    RECORD_FIELDS = PokedexObject.RECORD_FIELDS + (
+        "generation", "effect", "effect_short", "pokemon")
+
     def __init__(self, name: str, id: int, generation: str,
                  effect: str, effect_short: str, pokemon: list, **kwargs):
         """
@@ -173,7 +366,7 @@ class PokemonAbility(PokedexObject):
         :param kwargs: a dictionary of named arguments and values.
         """
         super().__init__(name, id, **kwargs)
-        self.generation = generation
+        self.generation = sys.intern(generation)
         # removes double space btwn lines
         self.effect = effect.replace('\n\n', '')
         self.effect_short = effect_short
@@ -188,7 +381,7 @@ class PokemonAbility(PokedexObject):
         """
         output = []
         for pokemon in pokemons:
-            output.append(pokemon["pokemon"]["name"])
+            output.append(sys.intern(pokemon["pokemon"]["name"]))
         return output
 
     @staticmethod
@@ -206,6 +399,18 @@ class PokemonAbility(PokedexObject):
                 formatted_output += line
         return formatted_output
 
+    def to_record(self) -> dict:
+        """
+        Returns the attributes of the ability as plain values.
+        :return: a dictionary
+        """
+        record = super().to_record()
+        record["generation"] = self.generation
+        record["effect"] = self.effect
+        record["effect_short"] = self.effect_short
+        record["pokemon"] = list(self.pokemon)
+        return record
+
     def __str__(self):
         """
         Returns a string representation of an Ability.
@@ -224,15 +429,29 @@ class PokemonStat(PokedexObject):
     """
     Represents a stat in the pokedex.
     """
-    def __init__(self, is_battle_only: bool, **kwargs):
+    __slots__ = ("is_battle_only",)
+    RECORD_FIELDS = PokedexObject.RECORD_FIELDS + ("is_battle_only",)
+
+    def __init__(self, name: str, id: int, is_battle_only: bool, **kwargs):
         """
         Instantiates a stat.
+        :param name: a string
+        :param id: an int
         :param is_battle_only: a boolean
         :param kwargs: a dictionary of named arguments and values.
         """
-        super().__init__(**kwargs)
+        super().__init__(name, id, **kwargs)
         self.is_battle_only = is_battle_only
 
+    def to_record(self) -> dict:
+        """
+        Returns the attributes of the stat as plain values.
+        :return: a dictionary
+        """
+        record = super().to_record()
+        record["is_battle_only"] = self.is_battle_only
+        return record
+
     def __str__(self):
         """
         Returns a string representation of a Stat.
@@ -248,9 +467,15 @@ class PokemonMove(PokedexObject):
     """
     Represents a move in the pokedex.
     """
+    __slots__ = ("generation", "accuracy", "effect_short", "pp", "power",
+                 "type", "damage_class", "learners")
+    RECORD_FIELDS = PokedexObject.RECORD_FIELDS + (
+        "generation", "accuracy", "pp", "power", "type", "damage_class",
+        "effect_short", "learners")
+
     def __init__(self, name: str, id: int, generation: str, accuracy: int,
                  pp: int, power: int, type: str, damage_class: str,
-                 effect_short: str, **kwargs):
+                 effect_short: str, learners: list = None, **kwargs):
         """
         Instantiates a move.
         :param name: a string
@@ -262,22 +487,44 @@ class PokemonMove(PokedexObject):
         :param type: a string
         :param damage_class: a string
         :param effect_short: a string
+        :param learners: a list of the names of the pokemon that learn
+                         the move, or None if they were not looked up.
         :param kwargs: a dictionary of named arguments and values.
         """
         super().__init__(name, id, **kwargs)
-        self.generation = generation
+        self.generation = sys.intern(generation)
         self.accuracy = accuracy
         self.effect_short = effect_short
         self.pp = pp
         self.power = power
-        self.type = type
-        self.damage_class = damage_class
+        self.type = sys.intern(type)
+        self.damage_class = sys.intern(damage_class)
+        self.learners = learners
+
+    def to_record(self) -> dict:
+        """
+        Returns the attributes of the move as plain values.
+        :return: a dictionary
+        """
+        record = super().to_record()
+        record["generation"] = self.generation
+        record["accuracy"] = self.accuracy
+        record["pp"] = self.pp
+        record["power"] = self.power
+        record["type"] = self.type
+        record["damage_class"] = self.damage_class
+        record["effect_short"] = self.effect_short
+        if self.learners is not None:
+            record["learners"] = list(self.learners)
+        return record
 
     def __str__(self):
         """
         Returns a string represntation of a move.
         :return: a string
         """
+        learners = f"Learned by: {self.learners}\n" \
+            if self.learners is not None else ""
         return f"-----------------------------------\n" \
                f"Move: : {self.name.title()}\n" \
                f"ID: {self.id}\n" \
@@ -287,4 +534,5 @@ class PokemonMove(PokedexObject):
                f"Power: {self.power}\n" \
                f"Type: {self.type}\n" \
                f"Damage class: {self.damage_class}\n" \
-               f"Effect: {self.effect_short}\n"
+               f"Effect: {self.effect_short}\n" \
+               f"{learners}"
@@ -4,7 +4,9 @@ its child class.
 """
 
 import asyncio
+import time
 from abc import ABC, abstractmethod
+from pokemonretriever.pokedex_metrics import metrics
 from pokemonretriever.pokedex_request import PokedexAPI
 from pokemonretriever.pokedex_object import Pokemon, PokemonStat, \
     PokemonMove, PokemonAbility
@@ -16,21 +18,73 @@ class PokedexObjectFactory(ABC):
     """
     Represents a factory class to instantiate PokemonObjects
     """
-    def __init__(self, data_set: list, is_expanded: bool = False):
+    def __init__(self, data_set: list, is_expanded: bool = False,
+                 api: PokedexAPI = None, expand: list = None):
         """
-        Instantiates a PokemonObjectFactory.
+        Instantiates a PokemonObjectFactory. Entries of the data set
+        that could not be retrieved (None) are skipped.
         :param data_set: a list
         :param is_expanded: a boolean
+        :param api: a PokedexAPI used for sub-queries
+        :param expand: a list of the attributes to expand. Factories of
+                       objects without expandable attributes ignore it.
         """
-        self.data_set = data_set
+        self.data_set = [data for data in data_set if data is not None]
         self.is_expanded = is_expanded
+        self.api = api if api is not None else PokedexAPI()
+        self.expand = expand
+
+    async def load(self, data_set: list = None):
+        """
+        Fetches any additional data the factory needs before create()
+        or build() is called. Factories that do not issue sub-queries
+        have nothing to load.
+        :param data_set: a list, the records to load data for. Defaults
+                         to the factory's data set.
+        :return: None
+        """
+        pass
 
-    @abstractmethod
     def create(self):
         """
-        Instantiates a PokemonObject.
+        Instantiates a PokemonObject for every record of the data set.
         :return:
         """
+        yield from self.build_many(self.data_set)
+
+    def build_many(self, data_set: list) -> list:
+        """
+        Instantiates a PokemonObject for every record of a batch.
+        Factories whose parser can parse a batch into columns override
+        this to build every object in one pass.
+        :param data_set: a list of dictionaries
+        :return: a list of PokedexObjects
+        """
+        return [self.build(data) for data in data_set]
+
+    @staticmethod
+    def build_columnar(parser, object_type, data_set: list) -> list:
+        """
+        Parses a batch into a PokedexTable and instantiates its records.
+        :param parser: a PokedexDataParser class
+        :param object_type: a PokedexObject class
+        :param data_set: a list of dictionaries
+        :return: a list of PokedexObjects
+        """
+        with metrics.timer("parse"):
+            table = parser.parse_many(data_set)
+        with metrics.timer("build"):
+            objects = table.build(object_type)
+        metrics.count("objects_built", len(objects))
+        return objects
+
+    @abstractmethod
+    def build(self, data: dict):
+        """
+        Instantiates a single PokemonObject.
+        :param data: a dictionary
+        :return: a PokedexObject
+        """
         pass
 
 
@@ -38,80 +92,302 @@ class PokemonStatFactory(PokedexObjectFactory):
     """
     Represents a Factory to instantiate Stat Objects.
     """
-    def __init__(self, data: list, is_expanded: bool):
+    def __init__(self, data: list, is_expanded: bool,
+                 api: PokedexAPI = None, expand: list = None):
         """
         Instantiates a PokemonStatFactory.
         :param data: a list
         :param is_expanded: a boolean
+        :param api: a PokedexAPI
+        :param expand: a list of attributes to expand
         """
-        super().__init__(data, is_expanded)
+        super().__init__(data, is_expanded, api, expand)
 
-    def create(self):
+    def build(self, data: dict):
         """
-        Instantiates Stat Objects.
-        :return:
+        Instantiates a Stat Object.
+        :param data: a dictionary
+        :return: a PokemonStat
         """
-        for data in self.data_set:
-            stat_praser = PokedexStatParser().parse(data)
-            yield PokemonStat(**stat_praser)
+        stat_praser = PokedexStatParser().parse(data)
+        return PokemonStat(**stat_praser)
+
+    def build_many(self, data_set: list) -> list:
+        """
+        Instantiates Stat Objects from a batch parsed into columns.
+        :param data_set: a list of dictionaries
+        :return: a list of PokemonStats
+        """
+        return self.build_columnar(PokedexStatParser, PokemonStat, data_set)
 
 
 class PokemonMoveFactory(PokedexObjectFactory):
     """
     Represents a Factory that instantiates Move Objects.
     """
-    def __init__(self, data: list, is_expanded: bool):
+    def __init__(self, data: list, is_expanded: bool,
+                 api: PokedexAPI = None, expand: list = None):
         """
-        Instantiates a PokemonMoveFactory.
+        Instantiates a PokemonMoveFactory. Set learners to a
+        PokedexPostings to list the pokemon that learn every move.
         :param data: a list
         :param is_expanded: a boolean
+        :param api: a PokedexAPI
+        :param expand: a list of attributes to expand
         """
-        super().__init__(data, is_expanded)
+        super().__init__(data, is_expanded, api, expand)
+        self.learners = None
 
-    def create(self):
+    def build(self, data: dict):
         """
-        Instantiates Move Objects.
-        :return:
+        Instantiates a Move Object.
+        :param data: a dictionary
+        :return: a PokemonMove
         """
-        for data in self.data_set:
-            move_parser = PokedexMoveParser().parse(data)
-            yield PokemonMove(**move_parser)
+        move_parser = PokedexMoveParser().parse(data)
+        move = PokemonMove(**move_parser)
+        if self.learners is not None:
+            move.learners = self.learners.pokemon("move", move.name)
+        return move
+
+    def build_many(self, data_set: list) -> list:
+        """
+        Instantiates Move Objects from a batch parsed into columns.
+        :param data_set: a list of dictionaries
+        :return: a list of PokemonMoves
+        """
+        moves = self.build_columnar(PokedexMoveParser, PokemonMove, data_set)
+        if self.learners is not None:
+            for move in moves:
+                move.learners = self.learners.pokemon("move", move.name)
+        return moves
 
 
 class PokemonAbilityFactory(PokedexObjectFactory):
     """
     Represents a Factory that instantiates Ability Objects.
     """
-    def __init__(self, data: list, is_expanded: bool):
+    def __init__(self, data: list, is_expanded: bool,
+                 api: PokedexAPI = None, expand: list = None):
         """
         Instantiates a PokemonAbilityFactory
         :param data: a list
         :param is_expanded: a boolean
+        :param api: a PokedexAPI
+        :param expand: a list of attributes to expand
         """
-        super().__init__(data, is_expanded)
+        super().__init__(data, is_expanded, api, expand)
 
-    def create(self):
+    def build(self, data: dict):
         """
-        Instantiates Ability Objects
-        :return:
+        Instantiates a Ability Object.
+        :param data: a dictionary
+        :return: a PokemonAbility
         """
-        for data in self.data_set:
-            ability_parser = PokedexAbilityParser().parse(data)
-            yield PokemonAbility(**ability_parser)
+        ability_parser = PokedexAbilityParser().parse(data)
+        return PokemonAbility(**ability_parser)
+
+    def build_many(self, data_set: list) -> list:
+        """
+        Instantiates Ability Objects from a batch parsed into columns.
+        :param data_set: a list of dictionaries
+        :return: a list of PokemonAbilitys
+        """
+        return self.build_columnar(PokedexAbilityParser, PokemonAbility,
+                                   data_set)
+
+
+class PokedexResolver:
+    """
+    Resolves stat, move and ability names into PokedexObjects for the
+    expanded attributes of Pokemon. Every name is fetched once and its
+    object is shared between Pokemon. Names registered with want() are
+    fetched together, so expanding many Pokemon costs one batch of
+    requests per resource type rather than one per Pokemon.
+
+    Names that could not be retrieved are not requested again until
+    retry_after seconds have passed, so a transient failure does not
+    drop a name for the lifetime of the resolver.
+    """
+    FACTORIES = {"stat": PokemonStatFactory,
+                 "move": PokemonMoveFactory,
+                 "ability": PokemonAbilityFactory}
+    DEFAULT_RETRY_AFTER = 30
+
+    def __init__(self, api: PokedexAPI,
+                 retry_after: float = DEFAULT_RETRY_AFTER):
+        """
+        Instantiates a PokedexResolver.
+        :param api: a PokedexAPI
+        :param retry_after: a number, the seconds before a name that
+                            could not be retrieved is requested again.
+        """
+        self.api = api
+        self.retry_after = retry_after
+        self.objects = {req_type: {} for req_type in self.FACTORIES}
+        self.wanted = {req_type: {} for req_type in self.FACTORIES}
+        self.failed = {req_type: {} for req_type in self.FACTORIES}
+
+    def want(self, req_type: str, names: list):
+        """
+        Registers names that will need to be resolved.
+        :param req_type: a string, the resource type.
+        :param names: a list of strings
+        :return: None
+        """
+        self.wanted[req_type].update(dict.fromkeys(names))
+
+    def missing(self, req_type: str) -> list:
+        """
+        Gets the wanted names that have not been fetched yet, and those
+        that failed more than retry_after seconds ago.
+        :param req_type: a string, the resource type.
+        :return: a list of strings
+        """
+        objects, failed = self.objects[req_type], self.failed[req_type]
+        retried_before = time.monotonic() - self.retry_after
+        return [name for name in self.wanted[req_type]
+                if name not in objects
+                and failed.get(name, retried_before) <= retried_before]
+
+    def unresolved(self, related: dict) -> list:
+        """
+        Gets the names that have no object, because they could not be
+        retrieved or were never fetched.
+        :param related: a dictionary of resource type to a list of names.
+        :return: a list of (resource type, name) tuples
+        """
+        return [(req_type, name) for req_type, names in related.items()
+                for name in names if name not in self.objects[req_type]]
+
+    async def fetch(self, req_type: str, names: list):
+        """
+        Fetches and instantiates the objects of a list of names.
+        :param req_type: a string, the resource type.
+        :param names: a list of strings
+        :return: None
+        """
+        if not names:
+            return
+        self.add(req_type, names,
+                 await self.api.process_requests(req_type, names))
+
+    def add(self, req_type: str, names: list, data_set: list):
+        """
+        Instantiates the objects of a list of names from their responses.
+        :param req_type: a string, the resource type.
+        :param names: a list of strings
+        :param data_set: a list of the responses of the names, None for
+                         the names that could not be retrieved.
+        :return: None
+        """
+        factory = self.FACTORIES[req_type]([], True, self.api)
+        found = [name for name, data in zip(names, data_set)
+                 if data is not None]
+        failed = self.failed[req_type]
+        failed_at = time.monotonic()
+        for name, data in zip(names, data_set):
+            if data is None:
+                failed[name] = failed_at
+            else:
+                failed.pop(name, None)
+        self.objects[req_type].update(zip(found, factory.build_many(
+            [data for data in data_set if data is not None])))
+
+    async def prefetch(self, req_types: list = None):
+        """
+        Fetches every wanted name that has not been fetched yet, one
+        batch per resource type.
+        :param req_types: a list of resource types. Defaults to all.
+        :return: None
+        """
+        req_types = req_types if req_types else list(self.FACTORIES)
+        await asyncio.gather(*[self.fetch(req_type, self.missing(req_type))
+                               for req_type in req_types])
+
+    def resolve(self, req_type: str, names: list) -> list:
+        """
+        Gets the objects of a list of names. Names that were not
+        prefetched are fetched now, together with every other wanted
+        name of the same type; this is only possible outside of a
+        running event loop.
+        :param req_type: a string, the resource type.
+        :param names: a list of strings
+        :return: a list of PokedexObjects, without the names that could
+                 not be retrieved.
+        """
+        objects = self.objects[req_type]
+        if any(name not in objects and name not in self.failed[req_type]
+               for name in names):
+            self.want(req_type, names)
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                asyncio.run(self.fetch(req_type, self.missing(req_type)))
+            else:
+                raise RuntimeError(f"{req_type} objects must be prefetched "
+                                   f"inside a running event loop")
+        return [objects[name] for name in names if name in objects]
 
 
 class PokemonFactory(PokedexObjectFactory):
     """
     Represents a Factory that instantiates Pokemon Objects.
     """
-    def __init__(self, data: list, is_expanded: bool):
+    REQUEST_TYPES = {"stats": "stat", "moves": "move",
+                     "abilities": "ability"}
+
+    def __init__(self, data: list, is_expanded: bool,
+                 api: PokedexAPI = None, expand: list = None):
         """
         Instantiates a PokemonFactory
         :param data: a list
-        :param is_expanded: a bool
+        :param is_expanded: a bool, True to expand every attribute in
+                            Pokemon.EXPANDABLE.
+        :param api: a PokedexAPI
+        :param expand: a list of the attributes to expand, from
+                       Pokemon.EXPANDABLE. Overrides is_expanded.
+        """
+        if expand is None:
+            expand = Pokemon.EXPANDABLE if is_expanded else ()
+        super().__init__(data, bool(expand), api, tuple(expand))
+        self.resolver = PokedexResolver(self.api)
+
+    async def load(self, data_set: list = None):
+        """
+        Prefetches the stats, moves and abilities to expand for every
+        Pokemon in the data set. Every distinct stat, move and ability
+        is requested once, over the API's shared session, and is reused
+        by later calls.
+        :param data_set: a list, the records to load data for. Defaults
+                         to the factory's data set.
+        :return: None
+        """
+        if not self.is_expanded:
+            return
+        related = self.related_names(
+            data_set if data_set is not None else self.data_set)
+        for req_type, names in related.items():
+            self.resolver.want(req_type, names)
+        await self.resolver.prefetch(list(related))
+
+    def related_names(self, data_set: list) -> dict:
+        """
+        Gets the names of the stats, moves and abilities to expand for
+        every Pokemon of a data set.
+        :param data_set: a list of dictionaries
+        :return: a dictionary of resource type to a list of distinct
+                 names.
         """
-        super().__init__(data, is_expanded)
-        self.api = PokedexAPI()
+        names = {"stats": self.__stat_names, "moves": self.__move_names,
+                 "abilities": self.__ability_names}
+        related = {}
+        for attribute in self.expand:
+            wanted = related.setdefault(self.REQUEST_TYPES[attribute], {})
+            for data in data_set:
+                if data is not None:
+                    wanted.update(dict.fromkeys(names[attribute](data)))
+        return {req_type: list(wanted) for req_type, wanted in related.items()}
 
     def create(self):
         """
@@ -130,76 +406,76 @@ class PokemonFactory(PokedexObjectFactory):
         :return:
         """
         for data in self.data_set:
-            pokemon_parcer = PokedexPokemonParser.parse(data)
-            yield Pokemon(**pokemon_parcer)
+            yield self.build_normal(data)
 
     def create_mode_expanded(self):
         """
-        Instantiates Pokemon, Ability, Move, and Stat Objects if --expanded
-        is used in the terminal command
+        Instantiates Pokemon Objects whose expanded attributes resolve
+        into Ability, Move, and Stat Objects on first access, if
+        --expanded or --expand is used in the terminal command.
         :return:
         """
         for data in self.data_set:
+            yield self.build_expanded(data)
+
+    def build(self, data: dict):
+        """
+        Instantiates a Pokemon Object in the factory's mode.
+        :param data: a dictionary
+        :return: a Pokemon
+        """
+        if self.is_expanded:
+            return self.build_expanded(data)
+        return self.build_normal(data)
+
+    @staticmethod
+    def build_normal(data: dict):
+        """
+        Instantiates a Pokemon Object without sub-queries.
+        :param data: a dictionary
+        :return: a Pokemon
+        """
+        with metrics.timer("parse"):
             pokemon_parcer = PokedexPokemonParser.parse(data)
+        with metrics.timer("build"):
             pokemon = Pokemon(**pokemon_parcer)
-            ability_name = []
-            move_name = []
-            stats_name = []
-            for i in range(0, len(data["abilities"])):
-                ability_name.append(data["abilities"][i]["ability"]['name'])
-            for i in range(0, len(data["moves"])):
-                move_name.append(data["moves"][i]['move']['name'])
-            for i in range(0, len(data["stats"])):
-                stats_name.append(data["stats"][i]["stat"]["url"][-2])
-            pokemon.stats = self.__add_expanded_stats(stats_name)
-            pokemon.moves = self.__add_expanded_moves(move_name)
-            pokemon.abilities = self.__add_expanded_abilities(ability_name)
-            yield pokemon
-
-    def __add_expanded_stats(self, number):
-        """
-        Instantiates Stat Objects for Pokemon created by the PokemonFactory.
-        :param number: a list
+        metrics.count("objects_built")
+        return pokemon
+
+    def build_expanded(self, data: dict):
+        """
+        Instantiates a Pokemon Object whose expanded attributes resolve
+        through the factory's resolver.
+        :param data: a dictionary
+        :return: a Pokemon
+        """
+        pokemon = self.build_normal(data)
+        pokemon.expand(self.resolver, self.expand)
+        return pokemon
+
+    @staticmethod
+    def __stat_names(data: dict) -> list:
+        """
+        Gets the names of the stats of a Pokemon.
+        :param data: a dictionary
         :return: a list
         """
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        stats = loop.run_until_complete(self.api.process_requests(
-            "stat", number))
-        stat_list = []
-        factory = PokemonStatFactory(stats, True)
-        for stat in factory.create():
-            stat_list.append(stat)
-        return stat_list
+        return [stat["stat"]["name"] for stat in data["stats"]]
 
-    def __add_expanded_abilities(self, name):
+    @staticmethod
+    def __move_names(data: dict) -> list:
         """
-        Instantiates Ability Objects for Pokemon created by the PokemonFactory.
-        :param name: a list
+        Gets the names of the moves of a Pokemon.
+        :param data: a dictionary
         :return: a list
         """
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        abilities = loop.run_until_complete(self.api.process_requests(
-            "ability", name))
-        ability_list = []
-        factory = PokemonAbilityFactory(abilities, True)
-        for ability in factory.create():
-            ability_list.append(ability)
-        return ability_list
+        return [move["move"]["name"] for move in data["moves"]]
 
-    def __add_expanded_moves(self, name):
+    @staticmethod
+    def __ability_names(data: dict) -> list:
         """
-        Instantiates Move Objects for Pokemon created by the PokemonFactory.
-        :param name: a list
+        Gets the names of the abilities of a Pokemon.
+        :param data: a dictionary
         :return: a list
         """
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        moves = loop.run_until_complete(self.api.process_requests(
-            "move", name))
-        move_list = []
-        factory = PokemonMoveFactory(moves, True)
-        for move in factory.create():
-            move_list.append(move)
-        return move_list
+        return [ability["ability"]["name"] for ability in data["abilities"]]
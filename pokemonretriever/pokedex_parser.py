@@ -2,13 +2,25 @@
 Contains the class definitions for parsers to clean up the data from
 the API calls.
 """
+import hashlib
+import json
 from abc import ABC, abstractmethod
+from array import array
 
 
 class PokedexDataParser(ABC):
     """
     Represents the parent parser class.
+
+    Each parser declares the fields of a response it reads as a field
+    spec, which maps each kept key to True (keep the value as is) or to
+    a nested spec. A nested spec is applied to every element of a list,
+    and a spec wrapped in a list keeps only the first element.
     """
+    RESOURCE_TYPE = None
+    FIELDS = {}
+    COLUMNS = ()
+
     def __init__(self):
         """
         Instantiates a PokedexDataParser
@@ -25,11 +37,148 @@ class PokedexDataParser(ABC):
         """
         pass
 
+    @classmethod
+    def project(cls, json):
+        """
+        Drops every field of a response that the parser does not read.
+        :param json: a dictionary
+        :return: a dictionary
+        """
+        return project(json, cls.FIELDS)
+
+    @classmethod
+    def projection(cls) -> str:
+        """
+        Identifies the field spec, so that responses projected onto
+        another version of it can be told apart.
+        :return: a string, a short hash of FIELDS.
+        """
+        version = cls.__dict__.get("_projection")
+        if version is None:
+            spec = json.dumps(cls.FIELDS, sort_keys=True)
+            version = hashlib.sha1(spec.encode()).hexdigest()[:16]
+            cls._projection = version
+        return version
+
+    @classmethod
+    def parse_many(cls, json_list: list):
+        """
+        Parses a batch of responses into a PokedexTable with a column
+        for every name in COLUMNS. Parsers that can build their columns
+        directly from the responses override this.
+        :param json_list: a list of dictionaries
+        :return: a PokedexTable
+        """
+        rows = [cls.parse(json) for json in json_list]
+        return PokedexTable({column: [row[column] for row in rows]
+                             for column in cls.COLUMNS})
+
+
+class PokedexTable:
+    """
+    A batch of parsed records kept as columns. Numeric columns are
+    arrays, and nullable ones store None as NONE. Columns with few
+    distinct values, such as types, are stored as arrays of small type
+    codes into a list of categories.
+    """
+    NONE = -1
+
+    def __init__(self, columns: dict, categories: dict = None,
+                 nullable: tuple = ()):
+        """
+        Instantiates a PokedexTable.
+
+        :param columns: a dictionary of column name to a sequence. The
+                        columns are in the order of the parameters of the
+                        PokedexObject the records become.
+        :param categories: a dictionary of coded column name to the list
+                           of the values of its codes.
+        :param nullable: a tuple of the names of the columns that store
+                         None as NONE.
+        """
+        self.columns = columns
+        self.categories = categories if categories else {}
+        self.nullable = nullable
+
+    def __len__(self):
+        """
+        Returns the number of records.
+        :return: an int
+        """
+        return len(next(iter(self.columns.values()), ()))
+
+    @staticmethod
+    def encode(codes: dict, value) -> int:
+        """
+        Gets the code of a categorical value, adding it if it is new.
+        :param codes: a dictionary of value to code.
+        :param value: a string
+        :return: an int
+        """
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+        return code
+
+    def column(self, name: str) -> list:
+        """
+        Gets the decoded values of a column.
+        :param name: a string
+        :return: a list
+        """
+        values = self.columns[name]
+        if name in self.categories:
+            categories = self.categories[name]
+            return [categories[code] for code in values]
+        if name in self.nullable:
+            none = self.NONE
+            return [None if value == none else value for value in values]
+        return list(values)
+
+    def build(self, object_type) -> list:
+        """
+        Instantiates an object for every record, passing the columns as
+        positional arguments.
+        :param object_type: a PokedexObject class
+        :return: a list of PokedexObjects
+        """
+        columns = [self.column(name) for name in self.columns]
+        return [object_type(*row) for row in zip(*columns)]
+
+
+def project(value, spec):
+    """
+    Drops every field of a decoded json value that is not in a field
+    spec.
+
+    :param value: the decoded json value, or a part of it.
+    :param spec: True, a dictionary, or a one-element list.
+    :return: the projected value
+    """
+    if spec is True or value is None:
+        return value
+    if isinstance(spec, list):
+        return [project(value[0], spec[0])] if value else []
+    if isinstance(value, list):
+        return [project(item, spec) for item in value]
+    return {key: project(value[key], sub_spec)
+            for key, sub_spec in spec.items() if key in value}
+
 
 class PokedexPokemonParser(PokedexDataParser):
     """
     Pareses data for Pokemon Object parameters.
     """
+    RESOURCE_TYPE = "pokemon"
+    FIELDS = {
+        "name": True, "id": True, "height": True, "weight": True,
+        "types": {"type": {"name": True}},
+        "stats": {"base_stat": True, "stat": {"name": True}},
+        "abilities": {"ability": {"name": True}},
+        "moves": {"move": {"name": True},
+                  "version_group_details": [{"level_learned_at": True}]}
+    }
+
     def __init__(self):
         """
         Instantiates the PokedexPokemonParser.
@@ -61,6 +210,15 @@ class PokedexAbilityParser(PokedexDataParser):
     """
     Pareses data for Ability Object parameters.
     """
+    RESOURCE_TYPE = "ability"
+    FIELDS = {
+        "name": True, "id": True, "generation": {"name": True},
+        "effect_entries": [{"effect": True, "short_effect": True}],
+        "pokemon": {"pokemon": {"name": True}}
+    }
+    COLUMNS = ("name", "id", "generation", "effect", "effect_short",
+               "pokemon")
+
     def __init__(self):
         """
         Instantiates a PokedexAbilityParser Object.
@@ -85,11 +243,43 @@ class PokedexAbilityParser(PokedexDataParser):
                 'effect': effect, 'effect_short': effect_short,
                 'pokemon': pokemon}
 
+    @classmethod
+    def parse_many(cls, json_list: list):
+        """
+        Parses a batch of ability responses into columns in one pass.
+        :param json_list: a list of dictionaries
+        :return: a PokedexTable
+        """
+        names, effects, effects_short, pokemon = [], [], [], []
+        ids = array("I")
+        generations = array("B")
+        generation_codes = {}
+        encode = PokedexTable.encode
+        for ability in json_list:
+            entry = ability["effect_entries"][0]
+            names.append(ability["name"])
+            ids.append(int(ability["id"]))
+            generations.append(encode(generation_codes,
+                                      ability["generation"]["name"]))
+            effects.append(entry["effect"])
+            effects_short.append(entry["short_effect"])
+            pokemon.append(ability["pokemon"])
+        return PokedexTable(
+            dict(zip(cls.COLUMNS, (names, ids, generations, effects,
+                                   effects_short, pokemon))),
+            {"generation": list(generation_codes)})
+
 
 class PokedexStatParser(PokedexDataParser):
     """
     Pareses data for Stat Object parameters.
     """
+    RESOURCE_TYPE = "stat"
+    FIELDS = {
+        "name": True, "id": True, "is_battle_only": True
+    }
+    COLUMNS = ("name", "id", "is_battle_only")
+
     def __init__(self):
         """
         Instantiates a PokedexStatParser Object.
@@ -109,11 +299,37 @@ class PokedexStatParser(PokedexDataParser):
         is_battle_only = stat["is_battle_only"]
         return {'name': name, 'id': id, "is_battle_only": is_battle_only}
 
+    @classmethod
+    def parse_many(cls, json_list: list):
+        """
+        Parses a batch of stat responses into columns in one pass.
+        :param json_list: a list of dictionaries
+        :return: a PokedexTable
+        """
+        names, battle_only = [], []
+        ids = array("I")
+        for stat in json_list:
+            names.append(stat["name"])
+            ids.append(int(stat["id"]))
+            battle_only.append(stat["is_battle_only"])
+        return PokedexTable(dict(zip(cls.COLUMNS,
+                                     (names, ids, battle_only))))
+
 
 class PokedexMoveParser(PokedexDataParser):
     """
     Pareses data for Move Object parameters.
     """
+    RESOURCE_TYPE = "move"
+    FIELDS = {
+        "name": True, "id": True, "accuracy": True, "pp": True,
+        "power": True, "generation": {"name": True},
+        "type": {"name": True}, "damage_class": {"name": True},
+        "effect_entries": [{"short_effect": True}]
+    }
+    COLUMNS = ("name", "id", "generation", "accuracy", "pp", "power",
+               "type", "damage_class", "effect_short")
+
     def __init__(self):
         """
         Instantiates a PokedexMoveParser Object.
@@ -141,3 +357,47 @@ class PokedexMoveParser(PokedexDataParser):
                 "accuracy": accuracy[0], "pp": pp[0], "power": power[0],
                 "type": move_type[0], "damage_class": dmg_class[0],
                 'effect_short': effect_short}
+
+    @classmethod
+    def parse_many(cls, json_list: list):
+        """
+        Parses a batch of move responses into columns in one pass. The
+        generation, type and damage class are stored as type codes.
+        :param json_list: a list of dictionaries
+        :return: a PokedexTable
+        """
+        names, effects_short = [], []
+        ids = array("I")
+        accuracies, pps, powers = array("h"), array("h"), array("h")
+        generations, types, damage_classes = \
+            array("B"), array("B"), array("B")
+        generation_codes, type_codes, damage_class_codes = {}, {}, {}
+        encode = PokedexTable.encode
+        none = PokedexTable.NONE
+        for move in json_list:
+            accuracy = move["accuracy"]
+            power = move["power"]
+            names.append(move["name"])
+            ids.append(int(move["id"]))
+            generations.append(encode(generation_codes,
+                                      move["generation"]["name"]))
+            accuracies.append(none if accuracy is None else accuracy)
+            pps.append(int(move["pp"]))
+            powers.append(none if power is None else power)
+            types.append(encode(type_codes, move["type"]["name"]))
+            damage_classes.append(encode(damage_class_codes,
+                                         move["damage_class"]["name"]))
+            effects_short.append(move["effect_entries"][0]["short_effect"])
+        return PokedexTable(
+            dict(zip(cls.COLUMNS, (names, ids, generations, accuracies, pps,
+                                   powers, types, damage_classes,
+                                   effects_short))),
+            {"generation": list(generation_codes),
+             "type": list(type_codes),
+             "damage_class": list(damage_class_codes)},
+            nullable=("accuracy", "power"))
+
+
+PARSERS = {parser.RESOURCE_TYPE: parser for parser in
+           (PokedexPokemonParser, PokedexMoveParser, PokedexAbilityParser,
+            PokedexStatParser)}
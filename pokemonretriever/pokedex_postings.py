@@ -0,0 +1,250 @@
+"""
+Contains the class definition for the reverse indexes of a snapshot,
+which list the pokemon of every type, ability and move.
+"""
+
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+from pokemonretriever.pokedex_store import PokedexStore
+
+
+def intersect(postings: list) -> list:
+    """
+    Intersects sorted posting lists. The smallest list is walked and
+    every other list is searched with binary search from the last match
+    on, so the cost grows with the smallest list rather than the
+    largest.
+
+    :param postings: a list of sorted sequences of ints.
+    :return: a sorted list of the ints in every sequence.
+    """
+    if not postings:
+        return []
+    postings = sorted(postings, key=len)
+    result = list(postings[0])
+    for other in postings[1:]:
+        matched = []
+        low, size = 0, len(other)
+        for position in result:
+            low = bisect_left(other, position, low)
+            if low == size:
+                break
+            if other[low] == position:
+                matched.append(position)
+        result = matched
+        if not result:
+            break
+    return result
+
+
+class PokedexPostings:
+    """
+    The reverse indexes of a snapshot: for every type, ability and move,
+    the sorted positions of the pokemon that have it. Keys are the ids
+    of their names in the snapshot's string table, and positions are
+    those of the pokemon section, so every list is a compact array of
+    ints.
+
+    The indexes are built once from a snapshot and saved next to it in
+    a postings file, which later runs load as long as the snapshot is
+    unchanged.
+
+    File layout (little-endian):
+        header:    magic, version, snapshot size and modification time,
+                   relation count
+        relations: key count, posting count, then u32 keys[count],
+                   u32 offsets[count + 1] and u32 postings
+    """
+    MAGIC = b"PDXP"
+    VERSION = 1
+    SUFFIX = ".postings"
+    HEADER = struct.Struct("<4sIQQI")
+    RELATION = struct.Struct("<II")
+    RELATIONS = ("type", "ability", "move")
+
+    def __init__(self, store: PokedexStore, relations: dict):
+        """
+        Initializes a PokedexPostings.
+
+        :param store: a PokedexStore, the snapshot the indexes are of.
+        :param relations: a dictionary of relation to a tuple of the
+                          keys, offsets and postings arrays.
+        """
+        self.store = store
+        self.relations = relations
+        self.keys = {relation: {store.string(key): index
+                                for index, key in enumerate(keys)}
+                     for relation, (keys, _, _) in relations.items()}
+
+    def postings(self, relation: str, name: str):
+        """
+        Gets the positions of the pokemon that have a type, ability or
+        move.
+
+        :param relation: a string, type, ability or move.
+        :param name: a string, the name of the type, ability or move.
+        :return: a sorted array of ints, empty if no pokemon has it.
+        """
+        index = self.keys[relation].get(name.strip().lower())
+        _, offsets, postings = self.relations[relation]
+        if index is None:
+            return postings[:0]
+        return postings[offsets[index]:offsets[index + 1]]
+
+    def count(self, relation: str, name: str) -> int:
+        """
+        Counts the pokemon that have a type, ability or move.
+        :param relation: a string, type, ability or move.
+        :param name: a string
+        :return: an int
+        """
+        index = self.keys[relation].get(name.strip().lower())
+        if index is None:
+            return 0
+        offsets = self.relations[relation][1]
+        return offsets[index + 1] - offsets[index]
+
+    def pokemon(self, relation: str, name: str) -> list:
+        """
+        Gets the names of the pokemon that have a type, ability or move.
+        :param relation: a string, type, ability or move.
+        :param name: a string
+        :return: a list of strings, in id order.
+        """
+        return [self.store.name("pokemon", position)
+                for position in self.postings(relation, name)]
+
+    def __len__(self):
+        """
+        Returns the number of postings in every index.
+        :return: an int
+        """
+        return sum(len(postings)
+                   for _, _, postings in self.relations.values())
+
+    @classmethod
+    def build(cls, store: PokedexStore):
+        """
+        Builds the reverse indexes of a snapshot.
+        :param store: a PokedexStore
+        :return: a PokedexPostings
+        """
+        lists = {relation: {} for relation in cls.RELATIONS}
+        for position, references in enumerate(store.relations()):
+            for relation, keys in zip(cls.RELATIONS, references):
+                postings = lists[relation]
+                for key in keys:
+                    posting = postings.get(key)
+                    if posting is None:
+                        posting = postings[key] = array("I")
+                    posting.append(position)
+        relations = {}
+        for relation, postings in lists.items():
+            keys = array("I", sorted(postings))
+            offsets = array("I", [0])
+            flat = array("I")
+            for key in keys:
+                flat.extend(postings[key])
+                offsets.append(len(flat))
+            relations[relation] = (keys, offsets, flat)
+        return cls(store, relations)
+
+    @staticmethod
+    def signature(path: str) -> tuple:
+        """
+        Identifies a version of a snapshot file.
+        :param path: a string
+        :return: a tuple of its size and modification time.
+        """
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def save(self, path: str = None):
+        """
+        Writes the indexes to a postings file.
+        :param path: a string. Defaults to the path of the snapshot with
+                     a .postings suffix.
+        :return: None
+        """
+        path = path or self.store.path + self.SUFFIX
+        chunks = [self.HEADER.pack(self.MAGIC, self.VERSION,
+                                   *self.signature(self.store.path),
+                                   len(self.relations))]
+        for relation in self.RELATIONS:
+            keys, offsets, postings = self.relations[relation]
+            chunks.append(self.RELATION.pack(len(keys), len(postings)))
+            for values in (keys, offsets, postings):
+                if sys.byteorder == "big":
+                    values = array("I", values)
+                    values.byteswap()
+                chunks.append(values.tobytes())
+        temporary = path + ".tmp"
+        with open(temporary, mode="wb") as file:
+            file.write(b"".join(chunks))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, store: PokedexStore, path: str = None):
+        """
+        Reads the indexes of a snapshot from its postings file.
+
+        :param store: a PokedexStore
+        :param path: a string. Defaults to the path of the snapshot with
+                     a .postings suffix.
+        :return: a PokedexPostings
+        :raises FileNotFoundError: if there is no postings file.
+        :raises ValueError: if the file is not a postings file of this
+                            version of the snapshot.
+        """
+        path = path or store.path + cls.SUFFIX
+        with open(path, mode="rb") as file:
+            data = file.read()
+        if len(data) < cls.HEADER.size:
+            raise ValueError(f"{path} is not a postings file")
+        magic, version, size, modified, count = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION or \
+                count != len(cls.RELATIONS):
+            raise ValueError(f"{path} is not a version {cls.VERSION} "
+                             f"postings file")
+        if (size, modified) != cls.signature(store.path):
+            raise ValueError(f"{path} is of another version of the "
+                             f"snapshot")
+        relations = {}
+        position = cls.HEADER.size
+        for relation in cls.RELATIONS:
+            key_count, posting_count = cls.RELATION.unpack_from(data,
+                                                                position)
+            position += cls.RELATION.size
+            arrays = []
+            for length in (key_count, key_count + 1, posting_count):
+                values = array("I")
+                values.frombytes(data[position:position + 4 * length])
+                if sys.byteorder == "big":
+                    values.byteswap()
+                arrays.append(values)
+                position += 4 * length
+            relations[relation] = tuple(arrays)
+        return cls(store, relations)
+
+    @classmethod
+    def open(cls, store: PokedexStore):
+        """
+        Loads the indexes of a snapshot, building and saving them first
+        if its postings file is missing or out of date.
+        :param store: a PokedexStore
+        :return: a PokedexPostings
+        """
+        try:
+            return cls.load(store)
+        except (OSError, ValueError):
+            pass
+        postings = cls.build(store)
+        try:
+            postings.save()
+        except OSError:
+            pass
+        return postings
@@ -0,0 +1,140 @@
+"""
+Contains the class definitions for reading an input file in chunks and
+for the progress file that lets an interrupted report be resumed.
+"""
+
+import os
+from itertools import islice
+
+from pokemonretriever.pokedex_json import codec
+
+
+class PokedexInputFile:
+    """
+    Reads the identifiers of an input file lazily, a chunk of lines at a
+    time, so only one chunk is ever held in memory.
+    """
+    DEFAULT_CHUNK_SIZE = 1000
+
+    def __init__(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Initializes a PokedexInputFile.
+
+        :param path: a string, the path of the input file.
+        :param chunk_size: an int, the number of lines per chunk.
+        :raises FileNotFoundError: if the file does not exist.
+        """
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No such file: '{path}'")
+        if chunk_size < 1:
+            raise ValueError("The chunk size must be at least 1")
+        self.path = path
+        self.chunk_size = chunk_size
+
+    def chunks(self, start: int = 0):
+        """
+        Reads the lines of the file in chunks.
+
+        :param start: an int, the number of lines to skip.
+        :return: a generator of (line, chunk) tuples, where line is the
+                 number of lines read up to the end of the chunk and
+                 chunk is a list of the lowercase identifiers.
+        """
+        with open(file=self.path, mode='r', encoding='UTF-8') as f:
+            line = start
+            lines = islice(f, start, None)
+            while True:
+                chunk = [entry.rstrip('\n').lower()
+                         for entry in islice(lines, self.chunk_size)]
+                if not chunk:
+                    return
+                line += len(chunk)
+                yield line, chunk
+
+
+class PokedexProgress:
+    """
+    The checkpoint of a report generated from an input file. After each
+    chunk, it records how many input lines are done, the size of the
+    report at that point and the failures so far. A resumed run skips
+    the lines that are done and truncates the report to its size at the
+    checkpoint, so no entry is lost or written twice.
+    """
+    SUFFIX = ".progress"
+    VERSION = 1
+
+    def __init__(self, path: str, key: dict):
+        """
+        Initializes a PokedexProgress at the start of the input.
+
+        :param path: a string, the path of the progress file.
+        :param key: a dictionary that identifies the report, such as its
+                    input file, mode and format. A progress file is only
+                    resumed by a report with the same key.
+        """
+        self.path = path
+        self.key = key
+        self.line = 0
+        self.offset = None
+        self.count = 0
+        self.failures = []
+
+    @property
+    def started(self) -> bool:
+        """
+        Whether a checkpoint was loaded, so the report is resumed.
+        :return: a boolean
+        """
+        return self.offset is not None
+
+    def save(self, line: int, offset: int, count: int, failures: list):
+        """
+        Writes a checkpoint. The file is replaced atomically, so an
+        interruption leaves either the old or the new checkpoint.
+
+        :param line: an int, the number of input lines done.
+        :param offset: an int, the size of the report.
+        :param count: an int, the number of entries in the report.
+        :param failures: a list of strings, the failures so far.
+        :return: None
+        """
+        self.line, self.offset, self.count = line, offset, count
+        self.failures = failures
+        temporary = self.path + ".tmp"
+        with open(temporary, mode="wb") as file:
+            file.write(codec.dumps({
+                "version": self.VERSION, "key": self.key, "line": line,
+                "offset": offset, "count": count, "failures": failures}))
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        """
+        Deletes the progress file once the report is complete.
+        :return: None
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @classmethod
+    def load(cls, path: str, key: dict):
+        """
+        Reads the checkpoint of an interrupted report.
+
+        :param path: a string, the path of the progress file.
+        :param key: a dictionary, the key of the report to resume.
+        :return: a PokedexProgress, at the start of the input if there
+                 is no progress file.
+        :raises ValueError: if the progress file is of another report.
+        """
+        progress = cls(path, key)
+        if not os.path.exists(path):
+            return progress
+        with open(path, mode="rb") as file:
+            data = codec.loads(file.read())
+        if not isinstance(data, dict) or data.get("version") != cls.VERSION:
+            raise ValueError(f"{path} is not a progress file")
+        if data["key"] != key:
+            raise ValueError(f"{path} is the progress of another report")
+        progress.line, progress.offset = data["line"], data["offset"]
+        progress.count, progress.failures = data["count"], data["failures"]
+        return progress
@@ -0,0 +1,607 @@
+"""
+Contains the class definitions for the query engine, which filters the
+pokemon, moves and abilities of a snapshot by their attributes through
+secondary indexes.
+
+A query is a filter expression of comparisons joined by 'and', such as:
+    type = fire and power >= 90 and accuracy = 100
+    speed > 110
+    type = water and move = ice-beam and ability = swift-swim
+The operators are =, !=, <, <=, > and >=. Values with spaces can be
+quoted.
+"""
+
+import operator
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+from pokemonretriever.pokedex_postings import PokedexPostings, intersect
+from pokemonretriever.pokedex_store import PokedexStore
+
+
+class PokedexQueryError(Exception):
+    """
+    Raised when a filter expression is malformed.
+    """
+    pass
+
+
+class SortedIndex:
+    """
+    A secondary index of a numeric attribute: the positions of the
+    records sorted by their value, searched with binary search. Records
+    without a value are left out, so they match no comparison.
+    """
+    KIND = "sorted"
+    OPERATORS = ("=", "!=", "<", "<=", ">", ">=")
+    POSTINGS = False
+
+    def __init__(self, values: list):
+        """
+        Builds a SortedIndex.
+        :param values: a list of ints or None, the value of every record
+                       by position.
+        """
+        entries = sorted((value, position) for position, value
+                         in enumerate(values) if value is not None)
+        self.keys = array("q", [value for value, _ in entries])
+        self.positions = array("I", [position for _, position in entries])
+
+    def ranges(self, comparison: str, value: int) -> list:
+        """
+        Finds the ranges of the index whose records match a comparison.
+        :param comparison: a string, one of OPERATORS.
+        :param value: an int
+        :return: a list of (start, end) tuples
+        """
+        size = len(self.keys)
+        if comparison == "=":
+            return [(bisect_left(self.keys, value),
+                     bisect_right(self.keys, value))]
+        if comparison == "!=":
+            return [(0, bisect_left(self.keys, value)),
+                    (bisect_right(self.keys, value), size)]
+        if comparison == "<":
+            return [(0, bisect_left(self.keys, value))]
+        if comparison == "<=":
+            return [(0, bisect_right(self.keys, value))]
+        if comparison == ">":
+            return [(bisect_right(self.keys, value), size)]
+        return [(bisect_left(self.keys, value), size)]
+
+    def estimate(self, comparison: str, value: int) -> int:
+        """
+        Counts the records that match a comparison.
+        :param comparison: a string, one of OPERATORS.
+        :param value: an int
+        :return: an int
+        """
+        return sum(end - start for start, end
+                   in self.ranges(comparison, value))
+
+    def lookup(self, comparison: str, value: int) -> list:
+        """
+        Gets the positions of the records that match a comparison.
+        :param comparison: a string, one of OPERATORS.
+        :param value: an int
+        :return: a sorted list of ints
+        """
+        positions = []
+        for start, end in self.ranges(comparison, value):
+            positions.extend(self.positions[start:end])
+        positions.sort()
+        return positions
+
+
+class HashIndex:
+    """
+    A secondary index of a categorical attribute: the sorted positions
+    of the records of every value.
+    """
+    KIND = "hash"
+    OPERATORS = ("=",)
+    POSTINGS = True
+
+    def __init__(self, values: list):
+        """
+        Builds a HashIndex.
+        :param values: a list of strings, the value of every record by
+                       position.
+        """
+        self.postings = {}
+        for position, value in enumerate(values):
+            if value is not None:
+                self.postings.setdefault(value, array("I")).append(position)
+
+    def estimate(self, comparison: str, value: str) -> int:
+        """
+        Counts the records that have a value.
+        :param comparison: a string, "=".
+        :param value: a string
+        :return: an int
+        """
+        return len(self.postings.get(value, ()))
+
+    def lookup(self, comparison: str, value: str) -> list:
+        """
+        Gets the positions of the records that have a value.
+        :param comparison: a string, "=".
+        :param value: a string
+        :return: a sorted list of ints
+        """
+        return list(self.postings.get(value, ()))
+
+
+class PostingIndex:
+    """
+    A secondary index of the types, abilities or moves of pokemon,
+    answered by the reverse indexes of the snapshot. A pokemon is listed
+    under each of its types, abilities and moves.
+    """
+    KIND = "reverse"
+    OPERATORS = ("=",)
+    POSTINGS = True
+
+    def __init__(self, postings: PokedexPostings, relation: str):
+        """
+        Initializes a PostingIndex.
+        :param postings: a PokedexPostings
+        :param relation: a string, type, ability or move.
+        """
+        self.postings = postings
+        self.relation = relation
+
+    def estimate(self, comparison: str, value: str) -> int:
+        """
+        Counts the pokemon that have a type, ability or move.
+        :param comparison: a string, "=".
+        :param value: a string
+        :return: an int
+        """
+        return self.postings.count(self.relation, value)
+
+    def lookup(self, comparison: str, value: str):
+        """
+        Gets the positions of the pokemon that have a type, ability or
+        move.
+        :param comparison: a string, "=".
+        :param value: a string
+        :return: a sorted array of ints
+        """
+        return self.postings.postings(self.relation, value)
+
+
+class PokedexPredicate:
+    """
+    A comparison of an attribute with a value, such as power >= 90.
+    """
+    COMPARISONS = {"=": operator.eq, "!=": operator.ne, "<": operator.lt,
+                   "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+    def __init__(self, field: str, comparison: str, value):
+        """
+        Initializes a PokedexPredicate.
+        :param field: a string, the name of the attribute.
+        :param comparison: a string, one of COMPARISONS.
+        :param value: an int or a string
+        """
+        self.field = field
+        self.comparison = comparison
+        self.value = value
+        self.compare = self.COMPARISONS[comparison]
+
+    def matches(self, attribute) -> bool:
+        """
+        Checks the value of a record's attribute. A record without a
+        value matches no comparison.
+        :param attribute: an int, a string or None.
+        :return: a boolean
+        """
+        if attribute is None:
+            return False
+        return self.compare(attribute, self.value)
+
+    def __str__(self):
+        """
+        Returns the predicate as it is written in an expression.
+        :return: a string
+        """
+        return f"{self.field} {self.comparison} {self.value}"
+
+
+class PokedexQuery:
+    """
+    A parsed filter expression: the resource type it queries and the
+    predicates a record must all match.
+    """
+    # The attributes of every resource type and their kind: numeric
+    # attributes get a SortedIndex and categorical ones a HashIndex. The
+    # types, abilities and moves of pokemon are looked up in the reverse
+    # indexes.
+    FIELDS = {
+        "pokemon": {"id": SortedIndex, "name": HashIndex,
+                    "height": SortedIndex, "weight": SortedIndex,
+                    "hp": SortedIndex, "attack": SortedIndex,
+                    "defense": SortedIndex, "special_attack": SortedIndex,
+                    "special_defense": SortedIndex, "speed": SortedIndex,
+                    "total": SortedIndex, "type": PostingIndex,
+                    "ability": PostingIndex, "move": PostingIndex},
+        "move": {"id": SortedIndex, "name": HashIndex,
+                 "accuracy": SortedIndex, "pp": SortedIndex,
+                 "power": SortedIndex, "type": HashIndex,
+                 "damage_class": HashIndex, "generation": HashIndex},
+        "ability": {"id": SortedIndex, "name": HashIndex,
+                    "generation": HashIndex},
+    }
+    GENERATIONS = ("i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix")
+    TOKEN = re.compile(r"\s*(?:(<=|>=|!=|==|=|<|>)|\"([^\"]*)\"|'([^']*)'"
+                       r"|([\w.\-]+))")
+
+    def __init__(self, req_type: str, predicates: list):
+        """
+        Initializes a PokedexQuery.
+        :param req_type: a string, pokemon, move or ability.
+        :param predicates: a list of PokedexPredicates
+        """
+        self.req_type = req_type
+        self.predicates = predicates
+
+    @classmethod
+    def parse(cls, req_type: str, expression: str):
+        """
+        Parses a filter expression.
+
+        :param req_type: a string, pokemon, move or ability.
+        :param expression: a string, comparisons joined by 'and'. An
+                           empty expression matches every record.
+        :return: a PokedexQuery
+        :raises PokedexQueryError: if the expression is malformed.
+        """
+        tokens = cls.tokenize(expression)
+        predicates = []
+        position = 0
+        while position < len(tokens):
+            if predicates:
+                if tokens[position] != ("word", "and"):
+                    raise PokedexQueryError(
+                        f"Expected 'and' before '{tokens[position][1]}'")
+                position += 1
+            if len(tokens) < position + 3:
+                raise PokedexQueryError(
+                    "Expected a comparison such as 'power >= 90' at the "
+                    "end of the expression")
+            (field_kind, field), (comparison_kind, comparison), \
+                (value_kind, value) = tokens[position:position + 3]
+            if field_kind != "word" or comparison_kind != "operator" or \
+                    value_kind == "operator":
+                raise PokedexQueryError(
+                    f"Expected a comparison such as 'power >= 90', not "
+                    f"'{field} {comparison} {value}'")
+            predicates.append(cls.predicate(req_type, field, comparison,
+                                            value))
+            position += 3
+        return cls(req_type, predicates)
+
+    @classmethod
+    def tokenize(cls, expression: str) -> list:
+        """
+        Splits a filter expression into operators and words.
+        :param expression: a string
+        :return: a list of (kind, text) tuples, where kind is
+                 "operator", "word" or "string".
+        :raises PokedexQueryError: if a character is not understood.
+        """
+        tokens = []
+        position = 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = cls.TOKEN.match(expression, position)
+            if match is None:
+                raise PokedexQueryError(
+                    f"Unexpected '{expression[position:].strip()}'")
+            comparison, double, single, word = match.groups()
+            if comparison is not None:
+                tokens.append(("operator",
+                               "=" if comparison == "==" else comparison))
+            elif word is not None:
+                tokens.append(("word", word.lower()))
+            else:
+                tokens.append(("string",
+                               double if double is not None else single))
+            position = match.end()
+        return tokens
+
+    @classmethod
+    def predicate(cls, req_type: str, field: str, comparison: str,
+                  value: str) -> PokedexPredicate:
+        """
+        Checks a comparison against the attributes of a resource type and
+        converts its value.
+
+        :param req_type: a string, pokemon, move or ability.
+        :param field: a string, the name of the attribute.
+        :param comparison: a string, the operator.
+        :param value: a string
+        :return: a PokedexPredicate
+        :raises PokedexQueryError: if the attribute or value is invalid.
+        """
+        fields = cls.FIELDS[req_type]
+        field = field.replace("-", "_")
+        kind = fields.get(field)
+        if kind is None:
+            raise PokedexQueryError(
+                f"Unknown {req_type} attribute '{field}'. Choose from "
+                f"{', '.join(fields)}.")
+        if kind is SortedIndex:
+            try:
+                value = int(value)
+            except ValueError:
+                raise PokedexQueryError(
+                    f"{field} is compared with a number, not '{value}'")
+        elif comparison not in ("=", "!="):
+            raise PokedexQueryError(
+                f"{field} can only be compared with = and !=")
+        else:
+            value = value.strip().lower()
+            if field == "generation":
+                value = cls.generation(value)
+        return PokedexPredicate(field, comparison, value)
+
+    @classmethod
+    def generation(cls, value: str) -> str:
+        """
+        Converts a generation written as 4, iv or generation-iv into the
+        name the API uses.
+        :param value: a string
+        :return: a string
+        """
+        if value.isdigit() and 0 < int(value) <= len(cls.GENERATIONS):
+            return "generation-" + cls.GENERATIONS[int(value) - 1]
+        if value in cls.GENERATIONS:
+            return "generation-" + value
+        return value
+
+    def __str__(self):
+        """
+        Returns the query as a filter expression.
+        :return: a string
+        """
+        return " and ".join(str(predicate) for predicate in self.predicates)
+
+
+class PokedexQueryTable:
+    """
+    The queryable attributes of every record of a resource type, held as
+    columns by position, and a secondary index on each of them. The
+    types, abilities and moves of pokemon have no column; they are only
+    in the reverse indexes.
+    """
+
+    def __init__(self, req_type: str, store: PokedexStore,
+                 postings: PokedexPostings = None):
+        """
+        Reads the attributes of a resource type and indexes them.
+        :param req_type: a string, pokemon, move or ability.
+        :param store: a PokedexStore, the snapshot to query.
+        :param postings: a PokedexPostings, the reverse indexes of the
+                         snapshot. Required for pokemon.
+        """
+        self.req_type = req_type
+        fields = PokedexQuery.FIELDS[req_type]
+        self.columns = {field: [] for field, index_type in fields.items()
+                        if index_type is not PostingIndex}
+        for attributes in store.attributes(req_type):
+            if req_type == "pokemon":
+                stats = [attributes.pop(name)
+                         for name in PokedexStore.STAT_NAMES]
+                attributes.update(zip(
+                    ("hp", "attack", "defense", "special_attack",
+                     "special_defense", "speed"), stats))
+                attributes["total"] = sum(stats)
+            for field, column in self.columns.items():
+                column.append(attributes[field])
+        self.indexes = {field: PostingIndex(postings, field)
+                        if index_type is PostingIndex
+                        else index_type(self.columns[field])
+                        for field, index_type in fields.items()}
+
+    def __len__(self):
+        """
+        Returns the number of records in the table.
+        :return: an int
+        """
+        return len(self.columns["id"])
+
+    def matcher(self, predicate: PokedexPredicate):
+        """
+        Gets a function that checks a predicate on the record at a
+        position, from the attribute's column or, for attributes without
+        one, from its index.
+        :param predicate: a PokedexPredicate
+        :return: a function of an int that returns a boolean
+        """
+        column = self.columns.get(predicate.field)
+        if column is not None:
+            return lambda position: predicate.matches(column[position])
+        members = set(self.indexes[predicate.field].lookup(
+            "=", predicate.value))
+        if predicate.comparison == "=":
+            return members.__contains__
+        return lambda position: position not in members
+
+
+class PokedexQueryPlan:
+    """
+    How a query is answered: the indexes whose sorted positions are
+    intersected into the candidate records, or a scan of the whole
+    table if no index narrows it down, and the predicates left to check
+    on each candidate.
+
+    Equality on a hash or reverse index yields a ready posting list, so
+    all of them are intersected, smallest first. A range of a sorted
+    index has to be sorted by position first, so only the most selective
+    one is used, and only if it selects fewer records than every posting
+    list.
+    """
+
+    def __init__(self, table: PokedexQueryTable, query: PokedexQuery):
+        """
+        Plans a query by estimating how many records every indexed
+        predicate selects.
+        :param table: a PokedexQueryTable
+        :param query: a PokedexQuery
+        """
+        self.table = table
+        self.query = query
+        self.estimates = {}
+        postings, ranges = [], []
+        for predicate in query.predicates:
+            index = table.indexes[predicate.field]
+            if predicate.comparison not in index.OPERATORS:
+                continue
+            estimate = index.estimate(predicate.comparison, predicate.value)
+            self.estimates[predicate] = estimate
+            (postings if index.POSTINGS else ranges).append(predicate)
+        postings.sort(key=self.estimates.get)
+        best_range = min(ranges, key=self.estimates.get, default=None)
+        if best_range is not None and (
+                not postings or self.estimates[best_range] <
+                self.estimates[postings[0]]):
+            postings.insert(0, best_range)
+        self.access = [predicate for predicate in postings
+                       if self.estimates[predicate] < len(table)]
+        self.estimate = self.estimates[self.access[0]] if self.access \
+            else len(table)
+        self.filters = [predicate for predicate in query.predicates
+                        if predicate not in self.access]
+
+    def execute(self) -> list:
+        """
+        Runs the plan.
+        :return: a sorted list of the positions of the matching records.
+        """
+        if not self.access:
+            candidates = range(len(self.table))
+        elif self.estimate == 0:
+            return []
+        else:
+            candidates = intersect([
+                self.table.indexes[predicate.field].lookup(
+                    predicate.comparison, predicate.value)
+                for predicate in self.access])
+        filters = [self.table.matcher(predicate)
+                   for predicate in self.filters]
+        return [position for position in candidates
+                if all(matches(position) for matches in filters)]
+
+    def __str__(self):
+        """
+        Describes the plan.
+        :return: a string
+        """
+        lines = [f"Query: {self.table.req_type} "
+                 f"{str(self.query) or '(every record)'}"]
+        for predicate, estimate in self.estimates.items():
+            index = self.table.indexes[predicate.field]
+            lines.append(f"  {index.KIND} index on {predicate.field}: "
+                         f"{predicate} selects {estimate} of "
+                         f"{len(self.table)}")
+        if not self.access:
+            lines.append(f"Plan: scan {len(self.table)} records")
+        elif len(self.access) == 1:
+            lines.append(f"Plan: look up {self.access[0]} in the "
+                         f"{self.access[0].field} index, {self.estimate} "
+                         f"candidates")
+        else:
+            lines.append("Plan: intersect " + ", ".join(
+                str(predicate) for predicate in self.access) +
+                f", at most {self.estimate} candidates")
+        if self.filters:
+            lines.append("  then filter on " + " and ".join(
+                str(predicate) for predicate in self.filters))
+        return "\n".join(lines)
+
+
+class PokedexQueryEngine:
+    """
+    Answers filter queries over a snapshot. The columns and indexes of a
+    resource type are built the first time it is queried and reused by
+    every later query.
+    """
+    RESOURCE_TYPES = tuple(PokedexQuery.FIELDS)
+
+    def __init__(self, store: PokedexStore):
+        """
+        Initializes a PokedexQueryEngine.
+        :param store: a PokedexStore, the snapshot to query.
+        """
+        self.store = store
+        self.tables = {}
+        self.postings = None
+
+    def table(self, req_type: str) -> PokedexQueryTable:
+        """
+        Gets the indexed table of a resource type.
+        :param req_type: a string, pokemon, move or ability.
+        :return: a PokedexQueryTable
+        """
+        table = self.tables.get(req_type)
+        if table is None:
+            if req_type == "pokemon" and self.postings is None:
+                self.postings = PokedexPostings.open(self.store)
+            table = self.tables[req_type] = PokedexQueryTable(
+                req_type, self.store, self.postings)
+        return table
+
+    def plan(self, req_type: str, expression: str) -> PokedexQueryPlan:
+        """
+        Parses and plans a filter expression.
+        :param req_type: a string, pokemon, move or ability.
+        :param expression: a string
+        :return: a PokedexQueryPlan
+        :raises PokedexQueryError: if the expression is malformed.
+        """
+        return PokedexQueryPlan(self.table(req_type),
+                                PokedexQuery.parse(req_type, expression))
+
+    def select(self, req_type: str, expression: str, sort: str = None,
+               descending: bool = False, limit: int = None) -> list:
+        """
+        Finds the records that match a filter expression.
+
+        :param req_type: a string, pokemon, move or ability.
+        :param expression: a string
+        :param sort: a string, the attribute to order the results by.
+                     Results are in id order if not specified. Records
+                     without a value come last.
+        :param descending: a boolean, True to sort from the highest
+                           value.
+        :param limit: an int, the most results to return.
+        :return: a list of the positions of the records.
+        :raises PokedexQueryError: if the expression or sort is invalid.
+        """
+        positions = self.plan(req_type, expression).execute()
+        if sort:
+            field = sort.lower().replace("-", "_")
+            column = self.table(req_type).columns.get(field)
+            if column is None:
+                raise PokedexQueryError(
+                    f"Unknown {req_type} attribute '{field}' to sort by")
+            present = [position for position in positions
+                       if column[position] is not None]
+            present.sort(key=column.__getitem__, reverse=descending)
+            positions = present + [position for position in positions
+                                   if column[position] is None]
+        return positions[:limit] if limit is not None else positions
+
+    def query(self, req_type: str, expression: str, sort: str = None,
+              descending: bool = False, limit: int = None) -> list:
+        """
+        Finds and builds the objects that match a filter expression.
+        Takes the same arguments as select().
+        :return: a list of PokedexObjects
+        """
+        return [self.store.build_at(req_type, position) for position
+                in self.select(req_type, expression, sort, descending,
+                               limit)]
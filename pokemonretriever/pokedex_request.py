@@ -5,72 +5,471 @@ Contains class definitions for the API.
 import aiohttp
 import asyncio
 import ssl
+import time
 
-from pokemonretriever.pokedex_object import Pokemon, PokemonAbility, \
-    PokemonStat, PokemonMove
+from pokemonretriever.pokedex_cache import PokedexCache
+from pokemonretriever.pokedex_json import codec
+from pokemonretriever.pokedex_metrics import metrics
+from pokemonretriever.pokedex_parser import PARSERS, project
+from pokemonretriever.pokedex_scheduler import RequestScheduler
+from pokemonretriever.pokedex_store import PokedexStore
+
+
+class PokedexRequestError(Exception):
+    """
+    Raised when a single API request fails.
+    """
+
+    def __init__(self, req_type: str, req_id: str, status: int = None,
+                 reason: str = None, retryable: bool = False,
+                 retry_after: float = None):
+        """
+        Initializes a PokedexRequestError.
+
+        :param req_type: a string, the category type of the request.
+        :param req_id: a string, the id or name of the request.
+        :param status: an int, the HTTP status, or None if no response
+                       was received.
+        :param reason: a string, a description of the failure.
+        :param retryable: a boolean, True if the failure is transient.
+        :param retry_after: a number, the seconds the server asked the
+                            client to wait, if any.
+        """
+        self.req_type = req_type
+        self.req_id = req_id
+        self.status = status
+        self.reason = reason
+        self.retryable = retryable
+        self.retry_after = retry_after
+        details = f"{status} {reason}" if status else reason
+        super().__init__(f"Could not retrieve {req_type} '{req_id}': "
+                         f"{details}")
 
 
 class PokedexAPI:
     """
     A class for making HTTP GET request to retrieve data about
-    pokemon objects.
+    pokemon objects. A PokedexAPI is an async context manager that owns
+    one long-lived aiohttp session, so every request made inside the
+    context shares the same keep-alive connection pool.
     """
+    DEFAULT_URL = "https://pokeapi.co/api/v2"
+    CONDITIONAL_HEADERS = {"ETag": "If-None-Match",
+                           "Last-Modified": "If-Modified-Since"}
 
-    def __init__(self):
+    def __init__(self, cache: PokedexCache = None,
+                 scheduler: RequestScheduler = None,
+                 snapshot: PokedexStore = None,
+                 connection_limit: int = 100,
+                 keepalive_timeout: float = 30,
+                 base_url: str = DEFAULT_URL, request_hook=None,
+                 index=None, revalidate: bool = False,
+                 failure_hook=None):
         """
         Initializes a PokedexAPI object.
 
         attributes:
             url: a string, the url to make api request with parameters.
-            session: an aiohttp Client HTTP session.
+            session: an aiohttp Client HTTP session, open while the API
+                     is used as an async context manager.
+            cache: a PokedexCache consulted before any request is sent,
+                   or None to always go to the network.
+            scheduler: a RequestScheduler bounding concurrency, rate
+                       and retries of the requests sent.
+            snapshot: a PokedexStore that answers every request
+                      locally, or None to use the network.
+            failures: a list of the PokedexRequestErrors of requests
+                      that could not be completed.
+            failure_hook: a callable, or None, that the
+                          PokedexRequestError of every request that
+                          could not be completed is passed to as it is
+                          recorded, instead of being kept in failures.
+            request_hook: a callable, or None, called after every HTTP
+                          attempt with the request type, the id, the
+                          response status (None if no response was
+                          received) and the seconds the attempt took.
+            aliases: a dictionary of (request type, identifier) to the
+                     canonical identifier of the resource, its id.
+            index: a PokedexIndex mapping every name to its id, or None.
+            in_flight: a dictionary of (request type, canonical
+                       identifier) to the task retrieving it and its
+                       number of waiters. The task is shared by every
+                       duplicate request made while it runs, and is
+                       cancelled once all of them are.
+            revalidate: a boolean, True to revalidate every cached
+                        response with a conditional request, even if it
+                        has not expired.
+
+        :param cache: a PokedexCache, or None to disable caching.
+        :param scheduler: a RequestScheduler, or None for the defaults.
+        :param snapshot: a PokedexStore, or None to use the network.
+        :param connection_limit: an int, the size of the connection pool.
+        :param keepalive_timeout: a number, the seconds an idle
+                                  connection is kept open for reuse.
+        :param base_url: a string, the root of the API, such as a
+                         self-hosted PokeAPI or a local stand-in.
+        :param request_hook: a callable, or None.
+        :param index: a PokedexIndex, or None.
+        :param revalidate: a boolean
+        :param failure_hook: a callable, or None.
         """
-        self.url = "https://pokeapi.co/api/v2/{}/{}"
-        self.session = aiohttp.ClientSession
+        self.url = base_url.rstrip("/") + "/{}/{}"
+        self.session = None
+        self.cache = cache
+        self.scheduler = scheduler if scheduler is not None \
+            else RequestScheduler()
+        self.snapshot = snapshot
+        self.failures = []
+        self.connection_limit = connection_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.request_hook = request_hook
+        self.failure_hook = failure_hook
+        self.aliases = {}
+        self.index = index
+        self.in_flight = {}
+        self.revalidate = revalidate
+        self.ssl_context = ssl.create_default_context()
+
+    async def __aenter__(self):
+        """
+        Opens the shared HTTP session.
+        :return: the PokedexAPI
+        """
+        connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            keepalive_timeout=self.keepalive_timeout,
+            ssl=self.ssl_context)
+        self.session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """
+        Closes the shared HTTP session and its connection pool.
+        :return: None
+        """
+        await self.session.close()
+        self.session = None
 
     @staticmethod
-    async def __get_pokedex_data(url: str, session: aiohttp.ClientSession):
+    def normalize(req_id) -> str:
         """
-        Retrieves pokemon data through the execution of GET http
-        requests.
+        Normalizes an identifier: names are stripped and lowercased, and
+        ids lose any leading zeros.
+        :param req_id: a string or int, the id or name of a resource.
+        :return: a string
+        """
+        key = str(req_id).strip().lower()
+        return str(int(key)) if key.isdigit() else key
 
-        :param url: a string, the url to make api request with parameters.
-        :param session: an aiohttp Client HTTP session.
-        :return: a list, json representation of GET http response.
+    def canonical(self, req_type: str, req_id) -> str:
+        """
+        Maps an identifier to the key its resource is requested under.
+        Names whose id is known, from the index, an earlier response or
+        a registered alias, map to the id.
+        :param req_type: a string, the category type of the request.
+        :param req_id: a string or int, the id or name of a resource.
+        :return: a string
+        """
+        key = self.normalize(req_id)
+        if self.index is not None:
+            key = self.index.canonical(req_type, key) or key
+        return self.aliases.get((req_type, key), key)
+
+    def add_alias(self, req_type: str, name: str, resource_id):
+        """
+        Registers the id of a named resource, so requests by name and by
+        id are coalesced.
+        :param req_type: a string, the category type of the resource.
+        :param name: a string, the name of the resource.
+        :param resource_id: a string or int, the id of the resource.
+        :return: None
+        """
+        self.aliases[(req_type, self.normalize(name))] = \
+            self.normalize(resource_id)
+
+    async def __get_coalesced(self, req_type: str, req_id: str):
+        """
+        Retrieves pokemon data, sharing one retrieval between every
+        request for the same resource made while it is in flight.
+
+        :param req_type: a string, the category type to request.
+        :param req_id: a string, the id or name of pokemon.
+        :return: a list, json representation of GET http response, or
+                 None if the request failed.
+        """
+        key = (req_type, self.canonical(req_type, req_id))
+        entry = self.in_flight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(
+                self.__get_pokedex_data(req_type, key[1]))
+            entry = self.in_flight[key] = [task, 0]
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        task = entry[0]
+        entry[1] += 1
+        try:
+            response = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            entry[1] -= 1
+            if not entry[1]:
+                task.cancel()
+            raise
+        if isinstance(response, dict) and "id" in response \
+                and "name" in response:
+            self.add_alias(req_type, response["name"], response["id"])
+        return response
+
+    def __fail(self, failure: PokedexRequestError):
+        """
+        Records the failure of a request, in self.failures or through
+        the failure hook.
+        :param failure: a PokedexRequestError
+        :return: None
         """
-        response = await session.request(method="GET", url=url,
-                                         ssl=ssl.SSLContext())
-        json_response = await response.json()
+        if self.failure_hook is not None:
+            self.failure_hook(failure)
+        else:
+            self.failures.append(failure)
+
+    async def __get_pokedex_data(self, req_type: str, req_id: str):
+        """
+        Retrieves pokemon data from the snapshot if there is one.
+        Otherwise it comes from the cache, or through the execution of
+        scheduled GET http requests on a cache miss. A cached response
+        that expired is revalidated with a conditional request, and
+        reused if the API answers 304 Not Modified.
+
+        :param req_type: a string, the category type to request.
+        :param req_id: a string, the id or name of pokemon.
+        :return: a list, json representation of GET http response, or
+                 None if the request failed. The failure is recorded in
+                 self.failures, or passed to the failure hook.
+        """
+        if self.snapshot is not None:
+            record = self.snapshot.get(req_type, req_id)
+            metrics.count("snapshot_lookups")
+            if record is None:
+                self.__fail(PokedexRequestError(
+                    req_type, req_id, reason="Not found in snapshot"))
+            return record
+        parser = PARSERS.get(req_type)
+        fields = parser.FIELDS if parser is not None else None
+        projection = parser.projection() if parser is not None else None
+        validators = None
+        if self.cache is not None:
+            cached = None if self.revalidate \
+                else self.cache.get(req_type, req_id, projection)
+            if cached is not None:
+                metrics.count("cache_hits")
+                return cached
+            metrics.count("cache_misses")
+            validators = self.cache.validators(req_type, req_id, projection)
+        try:
+            json_response, validators = await self.scheduler.run(
+                lambda: self.__fetch(req_type, req_id, fields=fields,
+                                     validators=validators))
+            if json_response is None:
+                json_response = self.cache.revalidate(req_type, req_id,
+                                                      projection)
+                if json_response is not None:
+                    metrics.count("not_modified")
+                    return json_response
+                json_response, validators = await self.scheduler.run(
+                    lambda: self.__fetch(req_type, req_id, fields=fields))
+        except PokedexRequestError as e:
+            metrics.count("failures")
+            self.__fail(e)
+            return None
+        except asyncio.TimeoutError:
+            metrics.count("failures")
+            self.__fail(PokedexRequestError(
+                req_type, req_id, reason="Timed out"))
+            return None
+        if self.cache is not None:
+            self.cache.put(req_type, req_id, json_response, validators,
+                           projection)
         return json_response
 
-    async def __process_single_request(self, req_type: str, req_id: str):
+    async def __fetch(self, req_type: str, req_id: str, url: str = None,
+                      fields: dict = None, validators: dict = None):
         """
-        Executes a single HTTP GET request to retrieve pokemon data.
+        Executes a single GET http request. The body is decoded with the
+        fastest json backend available and, if a field spec is given,
+        projected right away so only the fields the parsers read are
+        kept alive.
 
         :param req_type: a string, the category type to request.
         :param req_id: a string, the id or name of pokemon.
-        :return: a list, json representation of GET http response.
+        :param url: a string, the url to request. Defaults to the
+                    resource url of req_type and req_id.
+        :param fields: a dictionary, the field spec of the response, or
+                       None to keep every field.
+        :param validators: a dictionary of the ETag and Last-Modified of
+                           a cached copy, to make the request conditional
+                           on the resource having changed since.
+        :return: a tuple of the json representation of the response, or
+                 None if the resource was not modified, and the
+                 validators of the response.
+        :raises PokedexRequestError: if the response is not successful.
+        """
+        url = url if url else self.url.format(req_type, req_id)
+        headers = {self.CONDITIONAL_HEADERS[header]: value
+                   for header, value in (validators or {}).items()}
+        status = None
+        started_at = time.perf_counter()
+        try:
+            with metrics.timer("fetch"):
+                async with self.session.get(url, headers=headers) \
+                        as response:
+                    status = response.status
+                    if status == 304 and headers:
+                        return None, validators
+                    if status != 200:
+                        raise self.__response_error(req_type, req_id,
+                                                    response)
+                    body = await response.read()
+                    validators = {header: response.headers[header]
+                                  for header in self.CONDITIONAL_HEADERS
+                                  if header in response.headers}
+            metrics.count("bytes_received", len(body))
+            with metrics.timer("decode"):
+                data = codec.loads(body)
+                if fields:
+                    data = project(data, fields)
+            return data, validators
+        except aiohttp.ClientError as e:
+            raise PokedexRequestError(req_type, req_id, reason=str(e),
+                                      retryable=True) from e
+        finally:
+            seconds = time.perf_counter() - started_at
+            metrics.count("requests")
+            metrics.observe("latency " + req_type, seconds)
+            if self.request_hook is not None:
+                self.request_hook(req_type, req_id, status, seconds)
+
+    @staticmethod
+    def __response_error(req_type: str, req_id: str,
+                         response: aiohttp.ClientResponse):
+        """
+        Builds the error for an unsuccessful response. Rate limiting
+        (429) and server errors (5xx) are marked as retryable.
+
+        :param req_type: a string, the category type of the request.
+        :param req_id: a string, the id or name of the request.
+        :param response: an aiohttp ClientResponse.
+        :return: a PokedexRequestError
+        """
+        retry_after = response.headers.get("Retry-After", "")
+        return PokedexRequestError(
+            req_type, req_id, response.status, response.reason,
+            retryable=response.status == 429 or response.status >= 500,
+            retry_after=float(retry_after) if retry_after.isdigit()
+            else None)
+
+    async def list_resources(self, req_type: str, page_size: int = 1000):
+        """
+        Gets the name of every resource of a category type by following
+        the API's paginated list endpoint.
+
+        :param req_type: a string, the category type to list.
+        :param page_size: an int, the number of names per page.
+        :return: a list of strings
+        :raises PokedexRequestError: if a page cannot be retrieved.
+        """
+        return [name for name, _ in
+                await self.list_references(req_type, page_size)]
+
+    async def list_references(self, req_type: str, page_size: int = 1000):
+        """
+        Gets the name and id of every resource of a category type by
+        following the API's paginated list endpoint. Ids are read from
+        the resource urls.
+
+        :param req_type: a string, the category type to list.
+        :param page_size: an int, the number of resources per page.
+        :return: a list of (name, id) tuples
+        :raises PokedexRequestError: if a page cannot be retrieved.
         """
-        request_url = self.url.format(req_type, req_id)
-        async with self.session() as session:
-            response = await self.__get_pokedex_data(request_url, session)
-            return response
+        if self.session is None:
+            async with self:
+                return await self.list_references(req_type, page_size)
+        references = []
+        url = self.url.format(req_type, "") + f"?limit={page_size}"
+        while url:
+            page, _ = await self.scheduler.run(
+                lambda: self.__fetch(req_type, "", url))
+            references.extend(
+                (result["name"], int(result["url"].rstrip("/")
+                                     .rsplit("/", 1)[1]))
+                for result in page["results"])
+            url = page["next"]
+        return references
 
     async def process_requests(self, req_type: str, requests: list):
         """
         Executes multiple HTTP GET requests to retrieve pokemon data.
+        If the API is not already open, a session is opened for the
+        duration of this call. Failed requests do not fail the batch:
+        their entries are None and the errors are kept in self.failures,
+        or passed to the failure hook. Duplicate identifiers share one
+        request, and the responses are returned in the order of the
+        requests.
 
         :param req_type: a string, the category type to request.
         :param requests: a list of strings, a list of pokemon id or
                          names.
         :return: a list, json representation of GET http response.
         """
+        if self.session is None:
+            async with self:
+                return await self.process_requests(req_type, requests)
         if isinstance(requests, str):
-            return await self.__process_single_request(req_type, requests[0])
-        else:
-            async with self.session() as session:
-                list_urls = [self.url.format(req_type, req_id) for
-                             req_id in requests]
-                coroutines = [self.__get_pokedex_data(url, session) for url in
-                              list_urls]
-                responses = await asyncio.gather(*coroutines)
-                return responses
+            return await self.__get_coalesced(req_type, requests)
+        coroutines = [self.__get_coalesced(req_type, req_id)
+                      for req_id in requests]
+        return await asyncio.gather(*coroutines)
+
+    async def stream_requests(self, req_type: str, requests, window=None):
+        """
+        Executes HTTP GET requests and yields each response as soon as
+        it resolves, in completion order. At most `window` requests are
+        pending at a time, so responses do not accumulate in memory.
+        The API must already be open.
+
+        :param req_type: a string, the category type to request.
+        :param requests: an iterable of strings, pokemon ids or names.
+        :param window: an int, the maximum number of pending requests.
+                       Defaults to twice the scheduler's concurrency.
+        :return: an async generator of (index, response) tuples, where
+                 index is the position of the request in `requests` and
+                 response is None if the request failed.
+        """
+        window = window if window else 2 * self.scheduler.concurrency
+        requests = iter(enumerate(requests))
+        pending = set()
+        try:
+            while True:
+                for index, req_id in requests:
+                    pending.add(asyncio.ensure_future(
+                        self.__get_indexed(req_type, index, req_id)))
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def __get_indexed(self, req_type: str, index: int, req_id: str):
+        """
+        Retrieves pokemon data and tags it with its input position.
+
+        :param req_type: a string, the category type to request.
+        :param index: an int, the position of the request.
+        :param req_id: a string, the id or name of pokemon.
+        :return: a tuple of the index and the json response.
+        """
+        return index, await self.__get_coalesced(req_type, req_id)
@@ -0,0 +1,156 @@
+"""
+Contains the class definitions for scheduling API requests with bounded
+concurrency, rate limiting and retries.
+"""
+
+import asyncio
+import random
+
+from pokemonretriever.pokedex_metrics import metrics
+
+
+class TokenBucket:
+    """
+    A token-bucket rate limiter. Tokens refill continuously at a fixed
+    rate up to the bucket's capacity, and each request takes one token.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Initializes a TokenBucket.
+
+        :param rate: a number, the tokens added per second.
+        :param capacity: a number, the largest burst allowed. Defaults
+                         to one second worth of tokens.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = None
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Waits until a token is available and takes it.
+        :return: None
+        """
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated_at is not None:
+                    self.tokens = min(
+                        self.capacity,
+                        self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RequestScheduler:
+    """
+    Runs request coroutines with a maximum number in flight, an optional
+    requests-per-second limit, a timeout per attempt, and exponential
+    backoff retries for transient failures.
+
+    An error is retried when it is a timeout or when it has a truthy
+    `retryable` attribute. A `retry_after` attribute, when set, is the
+    minimum number of seconds to wait before the next attempt.
+    """
+    DEFAULT_CONCURRENCY = 20
+    DEFAULT_RETRIES = 3
+    DEFAULT_TIMEOUT = 10
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY,
+                 rps: float = None, retries: int = DEFAULT_RETRIES,
+                 timeout: float = DEFAULT_TIMEOUT, backoff: float = 0.5,
+                 max_backoff: float = 30):
+        """
+        Initializes a RequestScheduler.
+
+        :param concurrency: an int, the maximum number of requests in
+                            flight.
+        :param rps: a number, the maximum requests started per second,
+                    or None for no limit.
+        :param retries: an int, the number of retries after the first
+                        attempt fails.
+        :param timeout: a number, the seconds each attempt may take, or
+                        None for no timeout.
+        :param backoff: a number, the delay before the first retry. It
+                        doubles on every further retry.
+        :param max_backoff: a number, the longest delay between retries.
+        """
+        self.concurrency = concurrency
+        self.rps = rps
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.__loop = None
+        self.__semaphore = None
+        self.__bucket = None
+
+    def __bind(self):
+        """
+        Creates the semaphore and rate limiter for the running event
+        loop.
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        if self.__loop is not loop:
+            self.__loop = loop
+            self.__semaphore = asyncio.Semaphore(self.concurrency)
+            self.__bucket = TokenBucket(self.rps) if self.rps else None
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """
+        Checks if a failed attempt should be tried again.
+        :param error: an Exception
+        :return: a boolean
+        """
+        return isinstance(error, asyncio.TimeoutError) or \
+            getattr(error, "retryable", False)
+
+    def delay(self, attempt: int, error: Exception) -> float:
+        """
+        Computes the jittered backoff delay before the next attempt.
+        :param attempt: an int, the number of the attempt that failed.
+        :param error: an Exception, the failure of that attempt.
+        :return: a float, the number of seconds to wait.
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        delay = random.uniform(delay / 2, delay)
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            delay = max(delay, min(self.max_backoff, retry_after))
+        return delay
+
+    async def run(self, request):
+        """
+        Runs a request under the scheduler's limits, retrying it on
+        transient failures.
+
+        :param request: a callable returning a new coroutine for each
+                        attempt.
+        :return: the result of the first successful attempt.
+        :raises: the error of the last attempt once the retries are
+                 exhausted, or the first error that is not retryable.
+        """
+        self.__bind()
+        attempt = 0
+        while True:
+            async with self.__semaphore:
+                if self.__bucket is not None:
+                    await self.__bucket.acquire()
+                try:
+                    return await asyncio.wait_for(request(), self.timeout)
+                except Exception as e:
+                    if attempt >= self.retries or not self.is_retryable(e):
+                        raise
+                    error = e
+            metrics.count("retries")
+            await asyncio.sleep(self.delay(attempt, error))
+            attempt += 1
@@ -0,0 +1,344 @@
+"""
+Contains the class definition for the long-running pokedex service, an
+HTTP API answering lookups from warm in-process caches.
+
+Endpoints:
+    GET  /{mode}?inputdata=pikachu,25&expanded=true&format=json
+    POST /{mode} with a json body such as
+         {"inputdata": ["pikachu", 25], "expand": ["moves"],
+          "format": "text"}
+    GET  /health
+
+The mode is pokemon, ability or move. Json responses hold the records
+of the results and the errors; text responses are the report the CLI
+prints.
+"""
+
+from collections import OrderedDict
+
+from aiohttp import web
+
+from pokemonretriever.pokedex_json import codec
+from pokemonretriever.pokedex_metrics import metrics
+from pokemonretriever.pokedex_object import Pokemon
+from pokemonretriever.pokedex_object_factory import PokemonFactory, \
+    PokemonMoveFactory, PokemonAbilityFactory, PokedexResolver
+from pokemonretriever.pokedex_request import PokedexAPI, \
+    PokedexRequestError
+
+
+class PokedexServiceError(Exception):
+    """
+    Raised when a lookup is malformed.
+    """
+    pass
+
+
+class PokedexService:
+    """
+    Answers lookups over HTTP with one long-lived PokedexAPI, so the
+    connection pool, the response cache and the index stay warm between
+    requests. Built PokedexObjects are kept in a bounded LRU cache, and
+    the stats, moves and abilities of expanded Pokemon are resolved once
+    and shared by every later lookup.
+
+    An expanded Pokemon whose stats, moves or abilities could not all be
+    retrieved is returned with the failures, but is not cached, so a
+    later lookup retries them once the resolver's backoff has passed.
+    """
+    FACTORIES = {"pokemon": PokemonFactory,
+                 "ability": PokemonAbilityFactory,
+                 "move": PokemonMoveFactory}
+    FORMATS = ("json", "text")
+    DEFAULT_MAX_OBJECTS = 10000
+    MAX_FAILURES = 1024
+
+    def __init__(self, api: PokedexAPI,
+                 max_objects: int = DEFAULT_MAX_OBJECTS):
+        """
+        Initializes a PokedexService.
+
+        :param api: an open PokedexAPI, kept open while the service runs.
+                    Its failures are recorded by the service from then
+                    on.
+        :param max_objects: an int, the most PokedexObjects kept built.
+        """
+        self.api = api
+        self.api.failure_hook = self.record_failure
+        self.max_objects = max_objects
+        self.objects = OrderedDict()
+        self.failures = OrderedDict()
+        self.resolver = PokedexResolver(api)
+        self.factories = {}
+
+    def factory(self, mode: str, expand: tuple):
+        """
+        Gets the factory of a mode and set of expanded attributes. Every
+        Pokemon factory shares the service's resolver.
+
+        :param mode: a string, pokemon, ability or move.
+        :param expand: a tuple of the attributes to expand.
+        :return: a PokedexObjectFactory
+        """
+        key = (mode, expand)
+        factory = self.factories.get(key)
+        if factory is None:
+            factory = self.FACTORIES[mode]([], bool(expand), self.api,
+                                           expand=list(expand))
+            if isinstance(factory, PokemonFactory):
+                factory.resolver = self.resolver
+            self.factories[key] = factory
+        return factory
+
+    def remember(self, key: tuple, pokedex_object):
+        """
+        Keeps a built object, evicting the least recently used ones.
+        :param key: a tuple of the mode, identifier and expand tuple.
+        :param pokedex_object: a PokedexObject
+        :return: None
+        """
+        self.objects[key] = pokedex_object
+        self.objects.move_to_end(key)
+        while len(self.objects) > self.max_objects:
+            self.objects.popitem(last=False)
+
+    def record_failure(self, failure: PokedexRequestError):
+        """
+        Keeps the failure of a request the API could not complete in the
+        table of recent failures, keyed by resource type and identifier.
+        It is recorded as the request fails, before any lookup waiting
+        on it resumes, so each lookup finds the failures of its own
+        requests.
+        :param failure: a PokedexRequestError
+        :return: None
+        """
+        key = (failure.req_type, failure.req_id)
+        self.failures[key] = failure
+        self.failures.move_to_end(key)
+        while len(self.failures) > self.MAX_FAILURES:
+            self.failures.popitem(last=False)
+
+    async def lookup(self, mode: str, identifiers: list,
+                     expand: tuple = ()) -> tuple:
+        """
+        Gets the objects of a list of identifiers, building only those
+        that are not cached.
+
+        :param mode: a string, pokemon, ability or move.
+        :param identifiers: a list of strings, names or ids.
+        :param expand: a tuple of the Pokemon attributes to expand.
+        :return: a tuple of the list of PokedexObjects, in the order of
+                 the identifiers, and the list of PokedexRequestErrors of
+                 those that could not be retrieved, and of the expanded
+                 attributes that could not be.
+        """
+        failures = []
+        if self.api.index is not None:
+            identifiers, failures = self.api.index.check(mode, identifiers)
+        keys = [(mode, self.api.canonical(mode, req_id), expand)
+                for req_id in identifiers]
+        missing = list(dict.fromkeys(key for key in keys
+                                     if key not in self.objects))
+        metrics.count("service_object_hits", len(keys) - len(missing))
+        built = {}
+        partial = set()
+        unresolved = {}
+        if missing:
+            factory = self.factory(mode, expand)
+            data_set = await self.api.process_requests(
+                mode, [key[1] for key in missing])
+            await factory.load(data_set)
+            for key, data in zip(missing, data_set):
+                if data is not None:
+                    built[key] = factory.build(data)
+                    names = self.resolver.unresolved(
+                        factory.related_names([data])) if expand else []
+                    if names:
+                        partial.add(key)
+                        unresolved.update(dict.fromkeys(names))
+        results = []
+        for key in keys:
+            pokedex_object = built.get(key)
+            if pokedex_object is None:
+                pokedex_object = self.objects.get(key)
+            if pokedex_object is None:
+                failures.append(self.failure(mode, key[1]))
+                continue
+            if key not in partial:
+                self.remember(key, pokedex_object)
+                self.remember((mode, str(pokedex_object.id), expand),
+                              pokedex_object)
+            results.append(pokedex_object)
+        failures.extend(self.failure(req_type, name)
+                        for req_type, name in unresolved)
+        return results, failures
+
+    def failure(self, req_type: str, req_id: str) -> PokedexRequestError:
+        """
+        Gets the failure recorded for a resource that could not be
+        retrieved.
+        :param req_type: a string, the resource type.
+        :param req_id: a string, the identifier requested.
+        :return: a PokedexRequestError
+        """
+        failure = self.failures.get(
+            (req_type, self.api.canonical(req_type, req_id)))
+        return failure if failure is not None else \
+            PokedexRequestError(req_type, req_id, reason="Not retrieved")
+
+    @staticmethod
+    def parse_query(mode: str, query: dict) -> tuple:
+        """
+        Validates the parameters of a lookup.
+
+        :param mode: a string, pokemon, ability or move.
+        :param query: a dictionary of the query string or json body.
+                      inputdata is a list or a comma separated string of
+                      identifiers; expand is a list or a comma separated
+                      string of attributes; expanded is a boolean or
+                      "true"; format is json or text.
+        :return: a tuple of the identifiers, the expand tuple and the
+                 format.
+        :raises PokedexServiceError: if a parameter is invalid.
+        """
+        split = PokedexService.split
+        identifiers = split(query.get("inputdata"))
+        if not identifiers:
+            raise PokedexServiceError("inputdata is required")
+        expand = [attribute.lower() for attribute in
+                  split(query.get("expand"))]
+        for attribute in expand:
+            if attribute not in Pokemon.EXPANDABLE:
+                raise PokedexServiceError(
+                    f"'{attribute}' cannot be expanded. Choose from "
+                    f"{', '.join(Pokemon.EXPANDABLE)}.")
+        expanded = query.get("expanded", False)
+        if isinstance(expanded, str):
+            expanded = expanded.lower() in ("1", "true", "yes")
+        if mode != "pokemon":
+            expand = []
+        elif expanded and not expand:
+            expand = list(Pokemon.EXPANDABLE)
+        response_format = str(query.get("format", "json")).lower()
+        if response_format not in PokedexService.FORMATS:
+            raise PokedexServiceError(
+                f"Unknown format '{response_format}'. Choose from "
+                f"{', '.join(PokedexService.FORMATS)}.")
+        return identifiers, tuple(sorted(expand)), response_format
+
+    @staticmethod
+    def split(value) -> list:
+        """
+        Reads a parameter that is a list or a comma separated string.
+        :param value: a list, a string or None.
+        :return: a list of strings
+        """
+        if value is None:
+            return []
+        if not isinstance(value, (list, tuple)):
+            value = str(value).split(",")
+        return [str(item).strip() for item in value if str(item).strip()]
+
+    @staticmethod
+    def render(results: list, failures: list,
+               response_format: str) -> web.Response:
+        """
+        Builds the response of a lookup.
+
+        :param results: a list of PokedexObjects
+        :param failures: a list of PokedexRequestErrors
+        :param response_format: a string, json or text.
+        :return: a web.Response, 404 if nothing was found.
+        """
+        status = 200 if results or not failures else 404
+        if response_format == "text":
+            text = "".join(str(result) + "\n" for result in results)
+            text += "".join(f"Error: {failure}\n" for failure in failures)
+            return web.Response(text=text, status=status)
+        body = codec.dumps({"results": [result.to_record()
+                                        for result in results],
+                            "errors": [str(failure)
+                                       for failure in failures]})
+        return web.Response(body=body, status=status,
+                            content_type="application/json")
+
+    async def handle_lookup(self, request: web.Request) -> web.Response:
+        """
+        Answers GET and POST lookups.
+        :param request: a web.Request
+        :return: a web.Response
+        """
+        mode = request.match_info["mode"]
+        if mode not in self.FACTORIES:
+            return self.error(404, f"Unknown mode '{mode}'. Choose from "
+                                   f"{', '.join(self.FACTORIES)}.")
+        query = dict(request.query)
+        if request.method == "POST" and request.can_read_body:
+            try:
+                body = codec.loads(await request.read())
+            except ValueError:
+                return self.error(400, "The body is not valid json")
+            if not isinstance(body, dict):
+                return self.error(400, "The body must be a json object")
+            query.update(body)
+        try:
+            identifiers, expand, response_format = self.parse_query(
+                mode, query)
+        except PokedexServiceError as e:
+            return self.error(400, str(e))
+        with metrics.timer("service"):
+            results, failures = await self.lookup(mode, identifiers,
+                                                  expand)
+            return self.render(results, failures, response_format)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """
+        Reports that the service is up and the size of its caches.
+        :param request: a web.Request
+        :return: a web.Response
+        """
+        return web.Response(body=codec.dumps({
+            "status": "ok", "objects": len(self.objects),
+            "in_flight": len(self.api.in_flight)}),
+            content_type="application/json")
+
+    @staticmethod
+    def error(status: int, message: str) -> web.Response:
+        """
+        Builds an error response.
+        :param status: an int, the HTTP status.
+        :param message: a string
+        :return: a web.Response
+        """
+        return web.Response(body=codec.dumps({"error": message}),
+                            status=status, content_type="application/json")
+
+    def application(self) -> web.Application:
+        """
+        Builds the aiohttp application.
+        :return: a web.Application
+        """
+        app = web.Application()
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/{mode}", self.handle_lookup)
+        app.router.add_post("/{mode}", self.handle_lookup)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080,
+                    path: str = None) -> tuple:
+        """
+        Starts serving in the running event loop.
+
+        :param host: a string
+        :param port: an int, 0 to pick a free port.
+        :param path: a string, the path of a Unix socket to serve on
+                     instead of host and port.
+        :return: a tuple of the web.AppRunner and the address served on.
+        """
+        runner = web.AppRunner(self.application(), access_log=None)
+        await runner.setup()
+        if path:
+            await web.UnixSite(runner, path).start()
+            return runner, f"unix:{path}"
+        await web.TCPSite(runner, host, port).start()
+        return runner, f"http://{host}:{runner.addresses[0][1]}"
@@ -0,0 +1,121 @@
+"""
+Contains the class definition for offline snapshots of the PokeAPI
+dataset.
+"""
+
+import os
+
+from pokemonretriever.pokedex_cache import PokedexCache
+from pokemonretriever.pokedex_parser import PARSERS
+from pokemonretriever.pokedex_postings import PokedexPostings
+from pokemonretriever.pokedex_store import PokedexStore
+
+
+class PokedexSnapshot:
+    """
+    A local copy of every resource PokedexAPI can request. Only the
+    fields the parsers declare are kept, and the snapshot is saved as a
+    memory-mapped PokedexStore, so lookups by id or name are served
+    locally without any network I/O or loading the whole file.
+    """
+    DEFAULT_PATH = os.path.join(PokedexCache.DEFAULT_DIR,
+                                "snapshot.pdx")
+    FIELDS = {req_type: parser.FIELDS for req_type, parser in PARSERS.items()}
+    RESOURCE_TYPES = tuple(FIELDS)
+
+    def __init__(self, resources: dict = None):
+        """
+        Initializes a PokedexSnapshot.
+
+        :param resources: a dictionary of resource type to a list of
+                          projected records.
+        """
+        self.resources = {req_type: {} for req_type in self.RESOURCE_TYPES}
+        self.names = {req_type: {} for req_type in self.RESOURCE_TYPES}
+        for req_type, records in (resources or {}).items():
+            for record in records:
+                self.add(req_type, record, projected=True)
+
+    def add(self, req_type: str, record: dict, projected: bool = False):
+        """
+        Adds a resource to the snapshot.
+
+        :param req_type: a string, the resource type.
+        :param record: a dictionary, the json response of the resource.
+        :param projected: a boolean, True if the record already only
+                          holds the snapshot's fields.
+        :return: None
+        """
+        if not projected:
+            record = PARSERS[req_type].project(record)
+        key = str(record["id"])
+        self.resources[req_type][key] = record
+        self.names[req_type][record["name"]] = key
+
+    def get(self, req_type: str, req_id):
+        """
+        Looks up a resource by id or name.
+
+        :param req_type: a string, the resource type.
+        :param req_id: a string or int, the id or name of the resource.
+        :return: a dictionary, or None if the snapshot does not have it.
+        """
+        key = str(req_id).strip().lower()
+        key = self.names[req_type].get(key, key)
+        return self.resources[req_type].get(key)
+
+    def __len__(self):
+        """
+        Returns the number of resources in the snapshot.
+        :return: an int
+        """
+        return sum(len(records) for records in self.resources.values())
+
+    def save(self, path: str):
+        """
+        Writes the snapshot to a PokedexStore file, and the reverse
+        indexes of its pokemon to a PokedexPostings file next to it.
+        :param path: a string
+        :return: None
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        PokedexStore.write(path, {req_type: list(records.values())
+                                  for req_type, records
+                                  in self.resources.items()})
+        store = PokedexStore(path)
+        try:
+            PokedexPostings.build(store).save()
+        finally:
+            store.close()
+
+    @staticmethod
+    def load(path: str) -> PokedexStore:
+        """
+        Opens a snapshot written by save(). The file is memory-mapped
+        and records are only decoded when they are looked up.
+        :param path: a string
+        :return: a PokedexStore
+        """
+        return PokedexStore(path)
+
+    @classmethod
+    async def build(cls, api, path: str = DEFAULT_PATH):
+        """
+        Crawls every resource type through the API and saves the result
+        as a snapshot. Responses are projected as they arrive, so full
+        payloads are never held all at once.
+
+        :param api: an open PokedexAPI
+        :param path: a string, where to write the snapshot.
+        :return: a PokedexSnapshot
+        """
+        snapshot = cls()
+        for req_type in cls.RESOURCE_TYPES:
+            names = await api.list_resources(req_type)
+            async for index, data in api.stream_requests(req_type, names):
+                if data is not None:
+                    snapshot.add(req_type, data)
+        snapshot.save(path)
+        return snapshot
@@ -0,0 +1,596 @@
+"""
+Contains the class definition for the memory-mapped binary store of the
+local Pokedex dataset.
+"""
+
+import mmap
+import struct
+import sys
+
+from pokemonretriever.pokedex_object import Pokemon, PokemonAbility, \
+    PokemonMove, PokemonStat
+from pokemonretriever.pokedex_parser import PokedexPokemonParser, \
+    PokedexAbilityParser, PokedexMoveParser, PokedexStatParser
+
+
+class PokedexStore:
+    """
+    A read-only, memory-mapped store of Pokedex records.
+
+    The file starts with a header and a section table. Every resource
+    type has a section of fixed-width records, an id index and a name
+    index (both sorted, searched in place with binary search) and a pool
+    of u32 values that holds the variable-length lists of its records.
+    Every string is interned once in a shared string table. Opening a
+    store only reads its header; records are decoded on lookup.
+
+    File layout (little-endian):
+        header:   magic, version, section count, string count,
+                  string table offset
+        sections: resource type, record count, record size and the
+                  offsets of the records, id index, name index and pool
+        strings:  u32 offsets[count + 1], then the utf-8 bytes
+    """
+    MAGIC = b"PDXS"
+    VERSION = 1
+    NONE = 0xFFFFFFFF
+    NONE_SHORT = -1
+    HEADER = struct.Struct("<4sIIIQ")
+    SECTION = struct.Struct("<IIIQQQQ")
+    INDEX_ENTRY = struct.Struct("<II")
+    STAT_NAMES = ("hp", "attack", "defense", "special-attack",
+                  "special-defense", "speed")
+    RECORDS = {
+        # id, name, height, weight, six base stats, then (offset, length)
+        # of the types, stats, abilities and moves lists in the pool.
+        "pokemon": struct.Struct("<IIII6HIIIIIIII"),
+        # id, name, accuracy, pp, power, type, damage class, generation,
+        # short effect.
+        "move": struct.Struct("<IIhhhIIII"),
+        # id, name, generation, effect, short effect, then (offset,
+        # length) of the pokemon list in the pool.
+        "ability": struct.Struct("<IIIIIII"),
+        # id, name, is battle only.
+        "stat": struct.Struct("<IIB"),
+    }
+    PARSERS = {
+        "pokemon": (PokedexPokemonParser, Pokemon),
+        "move": (PokedexMoveParser, PokemonMove),
+        "ability": (PokedexAbilityParser, PokemonAbility),
+        "stat": (PokedexStatParser, PokemonStat),
+    }
+
+    def __init__(self, path: str):
+        """
+        Opens a store written by PokedexStore.write().
+
+        :param path: a string, the path of the store file.
+        """
+        try:
+            with open(path, mode="rb") as file:
+                self.buffer = mmap.mmap(file.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise FileNotFoundError(e)
+        self.path = path
+        magic, version, section_count, self.string_count, \
+            self.string_offset = self.HEADER.unpack_from(self.buffer, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is not a version {self.VERSION} "
+                             f"Pokedex store")
+        self.strings_start = self.string_offset + \
+            4 * (self.string_count + 1)
+        self.strings = {}
+        self.sections = {}
+        self.decoders = {"pokemon": self.__decode_pokemon,
+                         "move": self.__decode_move,
+                         "ability": self.__decode_ability,
+                         "stat": self.__decode_stat}
+        position = self.HEADER.size
+        for _ in range(section_count):
+            section = self.SECTION.unpack_from(self.buffer, position)
+            self.sections[self.string(section[0])] = section[1:]
+            position += self.SECTION.size
+
+    def close(self):
+        """
+        Unmaps the store file.
+        :return: None
+        """
+        self.buffer.close()
+
+    def __len__(self):
+        """
+        Returns the number of records in the store.
+        :return: an int
+        """
+        return sum(section[0] for section in self.sections.values())
+
+    def count(self, req_type: str) -> int:
+        """
+        Returns the number of records of a resource type.
+        :param req_type: a string
+        :return: an int
+        """
+        return self.sections[req_type][0] if req_type in self.sections \
+            else 0
+
+    def string(self, string_id: int):
+        """
+        Reads an interned string from the string table.
+        :param string_id: an int
+        :return: a string, or None for the NONE id.
+        """
+        if string_id == self.NONE:
+            return None
+        value = self.strings.get(string_id)
+        if value is None:
+            start, end = struct.unpack_from(
+                "<II", self.buffer, self.string_offset + 4 * string_id)
+            value = sys.intern(self.buffer[self.strings_start + start:
+                                           self.strings_start + end]
+                               .decode("UTF-8"))
+            self.strings[string_id] = value
+        return value
+
+    def find(self, req_type: str, req_id):
+        """
+        Finds the position of a record by id or name.
+
+        :param req_type: a string, the resource type.
+        :param req_id: a string or int, the id or name of the resource.
+        :return: an int, or None if the store does not have it.
+        """
+        if req_type not in self.sections:
+            return None
+        count, _, _, id_index, name_index, _ = self.sections[req_type]
+        key = str(req_id).strip().lower()
+        if key.isdigit():
+            return self.__search(id_index, count, int(key), lambda v: v)
+        return self.__search(name_index, count, key, self.string)
+
+    def __search(self, index: int, count: int, key, read_key):
+        """
+        Binary searches a sorted index of (key, position) entries.
+
+        :param index: an int, the offset of the index.
+        :param count: an int, the number of entries.
+        :param key: the key to find.
+        :param read_key: a callable turning a stored key into a
+                         comparable value.
+        :return: an int, the record position, or None.
+        """
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            stored, position = self.INDEX_ENTRY.unpack_from(
+                self.buffer, index + middle * self.INDEX_ENTRY.size)
+            value = read_key(stored)
+            if value == key:
+                return position
+            if value < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def get(self, req_type: str, req_id):
+        """
+        Looks up a record by id or name and decodes it into the shape of
+        a projected API response, ready for the parsers.
+
+        :param req_type: a string, the resource type.
+        :param req_id: a string or int, the id or name of the resource.
+        :return: a dictionary, or None if the store does not have it.
+        """
+        position = self.find(req_type, req_id)
+        if position is None:
+            return None
+        return self.record(req_type, position)
+
+    def build(self, req_type: str, req_id):
+        """
+        Materializes a single PokedexObject from its record.
+
+        :param req_type: a string, the resource type.
+        :param req_id: a string or int, the id or name of the resource.
+        :return: a PokedexObject, or None if the store does not have it.
+        """
+        position = self.find(req_type, req_id)
+        if position is None:
+            return None
+        return self.build_at(req_type, position)
+
+    def build_at(self, req_type: str, position: int):
+        """
+        Materializes the PokedexObject of the record at a position of a
+        section.
+        :param req_type: a string
+        :param position: an int
+        :return: a PokedexObject
+        """
+        parser, object_type = self.PARSERS[req_type]
+        return object_type(**parser.parse(self.record(req_type, position)))
+
+    def records(self, req_type: str):
+        """
+        Decodes every record of a resource type, in id order.
+        :param req_type: a string
+        :return: a generator of dictionaries
+        """
+        for position in range(self.count(req_type)):
+            yield self.record(req_type, position)
+
+    def record(self, req_type: str, position: int) -> dict:
+        """
+        Decodes the record at a position of a section.
+        :param req_type: a string
+        :param position: an int
+        :return: a dictionary
+        """
+        _, record_size, records, _, _, pool = self.sections[req_type]
+        values = self.RECORDS[req_type].unpack_from(
+            self.buffer, records + position * record_size)
+        return self.decoders[req_type](values, pool)
+
+    def attributes(self, req_type: str):
+        """
+        Reads the scalar attributes of every record of a resource type,
+        in id order, without decoding their lists. Pokemon get one
+        attribute per base stat.
+
+        :param req_type: a string, pokemon, move or ability.
+        :return: a generator of dictionaries
+        """
+        _, record_size, records, _, _, pool = self.sections[req_type]
+        unpack_from = self.RECORDS[req_type].unpack_from
+        string, short = self.string, self.__short
+        for position in range(self.count(req_type)):
+            values = unpack_from(self.buffer, records + position * record_size)
+            attributes = {"id": values[0], "name": string(values[1])}
+            if req_type == "pokemon":
+                attributes["height"] = values[2]
+                attributes["weight"] = values[3]
+                attributes.update(zip(self.STAT_NAMES, values[4:10]))
+            elif req_type == "move":
+                attributes["accuracy"] = short(values[2])
+                attributes["pp"] = short(values[3])
+                attributes["power"] = short(values[4])
+                attributes["type"] = string(values[5])
+                attributes["damage_class"] = string(values[6])
+                attributes["generation"] = string(values[7])
+            elif req_type == "ability":
+                attributes["generation"] = string(values[2])
+            yield attributes
+
+    def record_bytes(self, req_type: str) -> bytes:
+        """
+        Copies the fixed-width records of a section, in id order, for
+        readers that decode them in bulk. Each record is laid out as in
+        RECORDS.
+        :param req_type: a string
+        :return: bytes
+        """
+        count, record_size, records, _, _, _ = self.sections[req_type]
+        return self.buffer[records:records + count * record_size]
+
+    def relations(self):
+        """
+        Reads the string ids of the types, abilities and moves of every
+        pokemon, in id order, without decoding them.
+        :return: a generator of (types, abilities, moves) tuples of
+                 tuples of ints.
+        """
+        _, record_size, records, _, _, pool = self.sections["pokemon"]
+        unpack_from = self.RECORDS["pokemon"].unpack_from
+        for position in range(self.count("pokemon")):
+            values = unpack_from(self.buffer, records + position * record_size)
+            yield (self.__pool(pool, values[10], values[11]),
+                   self.__pool(pool, values[14], values[15]),
+                   self.__pool(pool, values[16], values[17])[::2])
+
+    def name(self, req_type: str, position: int) -> str:
+        """
+        Reads the name of the record at a position of a section.
+        :param req_type: a string
+        :param position: an int
+        :return: a string
+        """
+        _, record_size, records, _, _, _ = self.sections[req_type]
+        string_id, = struct.unpack_from(
+            "<I", self.buffer, records + position * record_size + 4)
+        return self.string(string_id)
+
+    def __pool(self, pool: int, offset: int, length: int) -> tuple:
+        """
+        Reads a list of u32 values from a section's pool.
+        :param pool: an int, the offset of the pool.
+        :param offset: an int, the index of the first value.
+        :param length: an int, the number of values.
+        :return: a tuple of ints
+        """
+        return struct.unpack_from(f"<{length}I", self.buffer,
+                                  pool + 4 * offset)
+
+    def __decode_pokemon(self, values: tuple, pool: int) -> dict:
+        """
+        Decodes a pokemon record.
+        :param values: a tuple, the unpacked record.
+        :param pool: an int, the offset of the section's pool.
+        :return: a dictionary
+        """
+        types = self.__pool(pool, values[10], values[11])
+        stats = self.__pool(pool, values[12], values[13])
+        abilities = self.__pool(pool, values[14], values[15])
+        moves = self.__pool(pool, values[16], values[17])
+        return {
+            "name": self.string(values[1]), "id": values[0],
+            "height": values[2], "weight": values[3],
+            "types": [{"type": {"name": self.string(type_id)}}
+                      for type_id in types],
+            "stats": [{"base_stat": stats[i + 1],
+                       "stat": {"name": self.string(stats[i])}}
+                      for i in range(0, len(stats), 2)],
+            "abilities": [{"ability": {"name": self.string(ability_id)}}
+                          for ability_id in abilities],
+            "moves": [{"move": {"name": self.string(moves[i])},
+                       "version_group_details":
+                           [] if moves[i + 1] == self.NONE
+                           else [{"level_learned_at": moves[i + 1]}]}
+                      for i in range(0, len(moves), 2)]
+        }
+
+    def __decode_move(self, values: tuple, pool: int) -> dict:
+        """
+        Decodes a move record.
+        :param values: a tuple, the unpacked record.
+        :param pool: an int, the offset of the section's pool.
+        :return: a dictionary
+        """
+        effect_short = self.string(values[8])
+        return {
+            "name": self.string(values[1]), "id": values[0],
+            "accuracy": self.__short(values[2]),
+            "pp": self.__short(values[3]),
+            "power": self.__short(values[4]),
+            "type": {"name": self.string(values[5])},
+            "damage_class": {"name": self.string(values[6])},
+            "generation": {"name": self.string(values[7])},
+            "effect_entries": [] if effect_short is None
+            else [{"short_effect": effect_short}]
+        }
+
+    def __decode_ability(self, values: tuple, pool: int) -> dict:
+        """
+        Decodes an ability record.
+        :param values: a tuple, the unpacked record.
+        :param pool: an int, the offset of the section's pool.
+        :return: a dictionary
+        """
+        effect = self.string(values[3])
+        effect_short = self.string(values[4])
+        return {
+            "name": self.string(values[1]), "id": values[0],
+            "generation": {"name": self.string(values[2])},
+            "effect_entries": [] if effect is None and effect_short is None
+            else [{"effect": effect, "short_effect": effect_short}],
+            "pokemon": [{"pokemon": {"name": self.string(pokemon_id)}}
+                        for pokemon_id in
+                        self.__pool(pool, values[5], values[6])]
+        }
+
+    def __decode_stat(self, values: tuple, pool: int) -> dict:
+        """
+        Decodes a stat record.
+        :param values: a tuple, the unpacked record.
+        :param pool: an int, the offset of the section's pool.
+        :return: a dictionary
+        """
+        return {"name": self.string(values[1]), "id": values[0],
+                "is_battle_only": bool(values[2])}
+
+    @classmethod
+    def __short(cls, value: int):
+        """
+        Decodes a signed 16-bit column where -1 stands for None.
+        :param value: an int
+        :return: an int, or None
+        """
+        return None if value == cls.NONE_SHORT else value
+
+    @classmethod
+    def write(cls, path: str, resources: dict):
+        """
+        Writes projected records to a new store file.
+
+        :param path: a string, the path of the store file.
+        :param resources: a dictionary of resource type to a list of
+                          projected records, as kept by a
+                          PokedexSnapshot.
+        :return: None
+        """
+        PokedexStoreWriter(cls).write(path, resources)
+
+
+class PokedexStoreWriter:
+    """
+    Encodes projected records into the PokedexStore file format.
+    """
+
+    def __init__(self, store_type=PokedexStore):
+        """
+        Initializes a PokedexStoreWriter.
+        :param store_type: the PokedexStore class whose layout is used.
+        """
+        self.store = store_type
+        self.string_ids = {}
+        self.pool = []
+
+    def intern(self, value) -> int:
+        """
+        Adds a string to the string table.
+        :param value: a string, or None.
+        :return: an int, the id of the string.
+        """
+        if value is None:
+            return self.store.NONE
+        string_id = self.string_ids.get(value)
+        if string_id is None:
+            string_id = len(self.string_ids)
+            self.string_ids[value] = string_id
+        return string_id
+
+    def extend(self, values: list) -> tuple:
+        """
+        Appends a list of u32 values to the current pool.
+        :param values: a list of ints
+        :return: a tuple of the offset and length of the list.
+        """
+        offset = len(self.pool)
+        self.pool.extend(values)
+        return offset, len(values)
+
+    @staticmethod
+    def short(value) -> int:
+        """
+        Encodes a nullable value for a signed 16-bit column.
+        :param value: an int, or None
+        :return: an int
+        """
+        return PokedexStore.NONE_SHORT if value is None else int(value)
+
+    @staticmethod
+    def first(entries: list) -> dict:
+        """
+        Gets the first entry of a list, or an empty dictionary.
+        :param entries: a list
+        :return: a dictionary
+        """
+        return entries[0] if entries else {}
+
+    def encode_pokemon(self, record: dict) -> tuple:
+        """
+        Encodes a pokemon record.
+        :param record: a dictionary
+        :return: a tuple of record values
+        """
+        base_stats = {stat["stat"]["name"]: stat["base_stat"]
+                      for stat in record["stats"]}
+        stats = []
+        for stat in record["stats"]:
+            stats += [self.intern(stat["stat"]["name"]), stat["base_stat"]]
+        moves = []
+        for move in record["moves"]:
+            details = move["version_group_details"]
+            moves += [self.intern(move["move"]["name"]),
+                      details[0]["level_learned_at"] if details
+                      else self.store.NONE]
+        return (record["id"], self.intern(record["name"]),
+                record["height"], record["weight"],
+                *[base_stats.get(name, 0) for name in self.store.STAT_NAMES],
+                *self.extend([self.intern(pokemon_type["type"]["name"])
+                              for pokemon_type in record["types"]]),
+                *self.extend(stats),
+                *self.extend([self.intern(ability["ability"]["name"])
+                              for ability in record["abilities"]]),
+                *self.extend(moves))
+
+    def encode_move(self, record: dict) -> tuple:
+        """
+        Encodes a move record.
+        :param record: a dictionary
+        :return: a tuple of record values
+        """
+        effect = self.first(record["effect_entries"])
+        return (record["id"], self.intern(record["name"]),
+                self.short(record["accuracy"]), self.short(record["pp"]),
+                self.short(record["power"]),
+                self.intern(record["type"]["name"]),
+                self.intern(record["damage_class"]["name"]),
+                self.intern(record["generation"]["name"]),
+                self.intern(effect.get("short_effect")))
+
+    def encode_ability(self, record: dict) -> tuple:
+        """
+        Encodes an ability record.
+        :param record: a dictionary
+        :return: a tuple of record values
+        """
+        effect = self.first(record["effect_entries"])
+        return (record["id"], self.intern(record["name"]),
+                self.intern(record["generation"]["name"]),
+                self.intern(effect.get("effect")),
+                self.intern(effect.get("short_effect")),
+                *self.extend([self.intern(pokemon["pokemon"]["name"])
+                              for pokemon in record["pokemon"]]))
+
+    def encode_stat(self, record: dict) -> tuple:
+        """
+        Encodes a stat record.
+        :param record: a dictionary
+        :return: a tuple of record values
+        """
+        return (record["id"], self.intern(record["name"]),
+                int(record["is_battle_only"]))
+
+    def write(self, path: str, resources: dict):
+        """
+        Encodes every section and writes the store file.
+
+        :param path: a string, the path of the store file.
+        :param resources: a dictionary of resource type to a list of
+                          projected records.
+        :return: None
+        """
+        sections = []
+        for req_type, record_format in self.store.RECORDS.items():
+            records = sorted(resources.get(req_type, []),
+                             key=lambda record: record["id"])
+            self.pool = []
+            encode = getattr(self, "encode_" + req_type)
+            rows = b"".join(record_format.pack(*encode(record))
+                            for record in records)
+            id_index = b"".join(
+                self.store.INDEX_ENTRY.pack(record["id"], position)
+                for position, record in enumerate(records))
+            by_name = sorted(range(len(records)),
+                             key=lambda position: records[position]["name"])
+            name_index = b"".join(
+                self.store.INDEX_ENTRY.pack(
+                    self.intern(records[position]["name"]), position)
+                for position in by_name)
+            pool = struct.pack(f"<{len(self.pool)}I", *self.pool)
+            sections.append((self.intern(req_type), len(records),
+                             record_format.size, rows, id_index,
+                             name_index, pool))
+
+        strings = [value.encode("UTF-8") for value in self.string_ids]
+        string_offsets = [0]
+        for value in strings:
+            string_offsets.append(string_offsets[-1] + len(value))
+        section_table_size = len(sections) * self.store.SECTION.size
+        string_offset = self.store.HEADER.size + section_table_size
+        string_table = struct.pack(f"<{len(string_offsets)}I",
+                                   *string_offsets) + b"".join(strings)
+
+        position = string_offset + len(string_table)
+        section_table = []
+        bodies = []
+        for type_id, count, size, rows, id_index, name_index, pool \
+                in sections:
+            offsets = []
+            for body in (rows, id_index, name_index, pool):
+                offsets.append(position)
+                bodies.append(body)
+                position += len(body)
+            section_table.append(
+                self.store.SECTION.pack(type_id, count, size, *offsets))
+
+        with open(path, mode="wb") as file:
+            file.write(self.store.HEADER.pack(
+                self.store.MAGIC, self.store.VERSION, len(sections),
+                len(strings), string_offset))
+            file.write(b"".join(section_table))
+            file.write(string_table)
+            for body in bodies:
+                file.write(body)
@@ -0,0 +1,97 @@
+"""
+Contains the class definition for the process pool that parses, builds
+and renders PokedexObjects off the event loop.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from pokemonretriever.pokedex_json import codec
+
+
+def render_batch(factory_type, payload: bytes, related: bytes,
+                 expand: tuple, writer_type) -> list:
+    """
+    Parses, builds and renders a batch of responses. This runs in a
+    worker process.
+
+    :param factory_type: the PokedexObjectFactory class of the batch.
+    :param payload: bytes, the json encoded list of responses.
+    :param related: bytes, the json encoded dictionary of resource type
+                    to the (name, response) pairs the expanded attributes
+                    of the batch need.
+    :param expand: a tuple of the attributes to expand.
+    :param writer_type: the PokedexWriter class the objects are rendered
+                        for.
+    :return: a list of what writer_type.render() returns for each object.
+    """
+    factory = factory_type(codec.loads(payload), bool(expand),
+                           expand=expand)
+    resolver = getattr(factory, "resolver", None)
+    if resolver is not None:
+        for req_type, pairs in codec.loads(related).items():
+            resolver.add(req_type, [name for name, _ in pairs],
+                         [data for _, data in pairs])
+    return [writer_type.render(pokedex_object)
+            for pokedex_object in factory.create()]
+
+
+class PokedexWorkerPool:
+    """
+    Renders batches of responses into report entries in a pool of worker
+    processes, so parsing, object construction and formatting use every
+    core while the event loop keeps fetching. Batches are sent as compact
+    json bytes of the projected responses rather than as pickled objects.
+    """
+    BATCH_SIZE = 32
+
+    def __init__(self, workers: int, factory_type, writer_type,
+                 expand: tuple = (), batch_size: int = BATCH_SIZE):
+        """
+        Initializes a PokedexWorkerPool.
+
+        :param workers: an int, the number of worker processes.
+        :param factory_type: the PokedexObjectFactory class to build
+                             objects with.
+        :param writer_type: the PokedexWriter class to render for.
+        :param expand: a tuple of the attributes to expand.
+        :param batch_size: an int, the number of responses per batch.
+        """
+        self.workers = workers
+        self.factory_type = factory_type
+        self.writer_type = writer_type
+        self.expand = tuple(expand)
+        self.batch_size = batch_size
+        self.executor = None
+
+    def __enter__(self):
+        """
+        Starts the worker processes.
+        :return: the PokedexWorkerPool
+        """
+        self.executor = ProcessPoolExecutor(self.workers)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Stops the worker processes.
+        :return: None
+        """
+        self.executor.shutdown(cancel_futures=exc_type is not None)
+        self.executor = None
+
+    def render(self, data_set: list, related: dict = None):
+        """
+        Schedules a batch of responses to be rendered by a worker.
+
+        :param data_set: a list of responses.
+        :param related: a dictionary of resource type to a list of
+                        (name, response) pairs for the expanded
+                        attributes, or None.
+        :return: an asyncio Future of the list of rendered entries.
+        """
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(
+            self.executor, render_batch, self.factory_type,
+            codec.dumps([data for data in data_set if data is not None]),
+            codec.dumps(related or {}), self.expand, self.writer_type)
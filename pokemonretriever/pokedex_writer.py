@@ -0,0 +1,520 @@
+"""
+Contains the class definitions for the report writers. Each writer
+streams PokedexObjects to a file as they are written, so a report never
+has to be held in memory or formatted as one large string.
+
+The columnar format stores records in row groups of up to ROW_GROUP
+records. A file starts with the magic b"PDXC" and a version, followed by
+the row groups until the end of the file. A row group is a header with
+its number of rows and columns, then each column: its name, a type tag,
+a compression flag, one validity byte per row (0 for None), and its
+data, zlib-compressed when that makes it smaller.
+"""
+
+import csv
+import os
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+
+from pokemonretriever.pokedex_json import codec
+from pokemonretriever.pokedex_metrics import metrics
+
+
+class PokedexWriter(ABC):
+    """
+    Represents a report writer. A writer is a context manager that opens
+    its file on entry and closes it on exit.
+    """
+    EXTENSION = None
+    BINARY = False
+    NEWLINE = None
+    ECHOES = False
+
+    def __init__(self, path: str, echo=None, offset: int = None,
+                 columns: tuple = None):
+        """
+        Instantiates a PokedexWriter.
+        :param path: a string, the path of the report file.
+        :param echo: a writable text stream, such as sys.stdout, that
+                     writers with ECHOES also print every object to.
+                     Other writers ignore it.
+        :param offset: an int, the size returned by checkpoint() to
+                       resume an existing report at, or None to start a
+                       new one.
+        :param columns: a tuple of the keys of the records written, in
+                        order, such as the RECORD_FIELDS of the objects.
+                        Only used by writers with a fixed header.
+        """
+        self.path = path
+        self.echo = echo
+        self.offset = offset
+        self.file = None
+        self.count = 0
+
+    def __enter__(self):
+        """
+        Opens the report file. A resumed report is truncated to its
+        offset and written after it.
+        :return: the PokedexWriter
+        """
+        mode = "w+" if self.offset is None else "r+"
+        if self.BINARY:
+            self.file = open(self.path, mode=mode + "b")
+        else:
+            self.file = open(self.path, mode=mode, encoding="UTF-8",
+                             newline=self.NEWLINE)
+        if self.offset is not None:
+            self.file.seek(self.offset)
+            self.file.truncate()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Flushes anything buffered and closes the report file.
+        :return: None
+        """
+        try:
+            self.flush()
+        finally:
+            self.file.close()
+
+    def write(self, pokedex_object):
+        """
+        Writes a PokedexObject to the report.
+        :param pokedex_object: a PokedexObject
+        :return: None
+        """
+        with metrics.timer("render"):
+            rendered = self.render(pokedex_object)
+        self.write_rendered(rendered)
+
+    @staticmethod
+    def render(pokedex_object):
+        """
+        Converts a PokedexObject into what the writer writes. This may run
+        in a worker process, so it returns plain, picklable values.
+        :param pokedex_object: a PokedexObject
+        :return: a dictionary, the record of the object.
+        """
+        return pokedex_object.to_record()
+
+    def write_rendered(self, rendered):
+        """
+        Writes an object already converted by render() to the report.
+        :param rendered: the result of render()
+        :return: None
+        """
+        with metrics.timer("write"):
+            self.encode(rendered)
+        self.count += 1
+
+    @abstractmethod
+    def encode(self, rendered):
+        """
+        Encodes a rendered object into the report.
+        :param rendered: the result of render()
+        :return: None
+        """
+        pass
+
+    def flush(self):
+        """
+        Writes anything the writer still buffers.
+        :return: None
+        """
+        pass
+
+    def checkpoint(self) -> int:
+        """
+        Writes everything written so far to disk.
+        :return: an int, the offset to resume the report at.
+        """
+        with metrics.timer("checkpoint"):
+            self.flush()
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            return self.file.tell()
+
+
+class PokedexTee:
+    """
+    A writable text stream that writes everything to several streams.
+    """
+
+    def __init__(self, *streams):
+        """
+        Instantiates a PokedexTee.
+        :param streams: writable text streams
+        """
+        self.streams = streams
+
+    def write(self, text: str) -> int:
+        """
+        Writes text to every stream.
+        :param text: a string
+        :return: an int, the length of the text.
+        """
+        for stream in self.streams:
+            stream.write(text)
+        return len(text)
+
+
+class TextWriter(PokedexWriter):
+    """
+    Writes the human-readable representation of each object. Objects are
+    rendered once, in fragments, to both the file and the echo stream,
+    which gets a blank line after each object like print() would.
+    """
+    EXTENSION = ".txt"
+    ECHOES = True
+
+    def __enter__(self):
+        """
+        Opens the report file and the stream objects are written to.
+        :return: the TextWriter
+        """
+        super().__enter__()
+        self.stream = self.file if self.echo is None \
+            else PokedexTee(self.file, self.echo)
+        return self
+
+    def write(self, pokedex_object):
+        """
+        Writes the representation of a PokedexObject in fragments.
+        :param pokedex_object: a PokedexObject
+        :return: None
+        """
+        with metrics.timer("render"):
+            pokedex_object.write_to(self.stream)
+            if self.echo is not None:
+                self.echo.write("\n")
+        self.count += 1
+
+    @staticmethod
+    def render(pokedex_object) -> str:
+        """
+        Renders the representation of a PokedexObject.
+        :param pokedex_object: a PokedexObject
+        :return: a string
+        """
+        return str(pokedex_object)
+
+    def encode(self, rendered: str):
+        """
+        Writes a rendered representation.
+        :param rendered: a string
+        :return: None
+        """
+        self.stream.write(rendered)
+        if self.echo is not None:
+            self.echo.write("\n")
+
+
+class JSONLinesWriter(PokedexWriter):
+    """
+    Writes one json record per line.
+    """
+    EXTENSION = ".jsonl"
+    BINARY = True
+
+    @staticmethod
+    def render(pokedex_object) -> bytes:
+        """
+        Encodes the record of a PokedexObject as json.
+        :param pokedex_object: a PokedexObject
+        :return: bytes
+        """
+        return codec.dumps(pokedex_object.to_record())
+
+    def encode(self, rendered: bytes):
+        """
+        Writes an encoded record as a json line.
+        :param rendered: bytes
+        :return: None
+        """
+        self.file.write(rendered)
+        self.file.write(b"\n")
+
+
+class CSVWriter(PokedexWriter):
+    """
+    Writes one row per record, with a header of the columns it is given,
+    or of the keys of the first record if it is not given any. Nested
+    values, such as the moves of a pokemon, are written as json in their
+    cell.
+    """
+    EXTENSION = ".csv"
+    NEWLINE = ""
+
+    def __init__(self, path: str, echo=None, offset: int = None,
+                 columns: tuple = None):
+        """
+        Instantiates a CSVWriter.
+        :param path: a string, the path of the report file.
+        :param echo: ignored, csv reports are not printed.
+        :param offset: an int, the offset to resume the report at.
+        :param columns: a tuple of the keys of the records, the header.
+        """
+        super().__init__(path, echo, offset)
+        self.writer = None
+        self.columns = list(columns) if columns else None
+
+    def __enter__(self):
+        """
+        Opens the report file. A resumed report keeps the columns of its
+        header.
+        :return: the CSVWriter
+        """
+        super().__enter__()
+        if self.offset:
+            self.file.seek(0)
+            self.columns = next(csv.reader(self.file))
+            self.writer = csv.writer(self.file)
+            self.file.seek(0, os.SEEK_END)
+        return self
+
+    def encode(self, record: dict):
+        """
+        Writes the record of a PokedexObject as a row.
+        :param record: a dictionary
+        :return: None
+        :raises ValueError: if the record has a key that is not a
+                            column, which the row could not hold.
+        """
+        if self.writer is None:
+            if self.columns is None:
+                self.columns = list(record)
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.columns)
+        unknown = [key for key in record if key not in self.columns]
+        if unknown:
+            raise ValueError(f"The record of '{record.get('name')}' has "
+                             f"fields that are not in the csv header: "
+                             f"{', '.join(unknown)}")
+        self.writer.writerow([self.cell(record.get(column))
+                              for column in self.columns])
+
+    @staticmethod
+    def cell(value):
+        """
+        Converts a value to a csv cell.
+        :param value: a plain value
+        :return: a string or number
+        """
+        if isinstance(value, (list, dict)):
+            return codec.dumps(value).decode("UTF-8")
+        return "" if value is None else value
+
+
+class ColumnarWriter(PokedexWriter):
+    """
+    Writes records in the columnar binary format. Records are buffered
+    by column until a row group is full, and each column is then written
+    as a typed array.
+    """
+    EXTENSION = ".pdxc"
+    BINARY = True
+    MAGIC = b"PDXC"
+    VERSION = 1
+    ROW_GROUP = 1024
+    HEADER = struct.Struct("<4sI")
+    GROUP = struct.Struct("<II")
+    COLUMN = struct.Struct("<HccQ")
+    INT, FLOAT, BOOL, STRING, JSON = b"i", b"f", b"b", b"s", b"j"
+    RAW, ZLIB = b"-", b"z"
+
+    def __init__(self, path: str, echo=None, offset: int = None,
+                 columns: tuple = None, row_group: int = ROW_GROUP):
+        """
+        Instantiates a ColumnarWriter.
+        :param path: a string, the path of the report file.
+        :param echo: ignored, columnar reports are not printed.
+        :param offset: an int, the offset to resume the report at.
+        :param columns: ignored, row groups hold the columns of their
+                        records.
+        :param row_group: an int, the number of records per row group.
+        """
+        super().__init__(path, echo, offset)
+        self.row_group = row_group
+        self.columns = {}
+        self.rows = 0
+
+    def __enter__(self):
+        """
+        Opens the report file and writes the file header, unless the
+        report is resumed.
+        :return: the ColumnarWriter
+        """
+        super().__enter__()
+        if self.offset is None:
+            self.file.write(self.HEADER.pack(self.MAGIC, self.VERSION))
+        return self
+
+    def encode(self, record: dict):
+        """
+        Buffers the record of a PokedexObject, writing a row group once
+        it is full.
+        :param record: a dictionary
+        :return: None
+        """
+        for column in record:
+            if column not in self.columns:
+                self.columns[column] = [None] * self.rows
+        for column, values in self.columns.items():
+            values.append(record.get(column))
+        self.rows += 1
+        if self.rows >= self.row_group:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered records as a row group.
+        :return: None
+        """
+        if not self.rows:
+            return
+        self.file.write(self.GROUP.pack(self.rows, len(self.columns)))
+        for name, values in self.columns.items():
+            tag, data = self.encode_column(values)
+            compression = self.RAW
+            compressed = zlib.compress(data)
+            if len(compressed) < len(data):
+                compression, data = self.ZLIB, compressed
+            name = name.encode("UTF-8")
+            self.file.write(self.COLUMN.pack(len(name), tag, compression,
+                                             len(data)))
+            self.file.write(name)
+            self.file.write(bytes(value is not None for value in values))
+            self.file.write(data)
+        self.columns = {}
+        self.rows = 0
+
+    @classmethod
+    def encode_column(cls, values: list):
+        """
+        Encodes the values of a column with the narrowest type tag that
+        holds them all.
+        :param values: a list of plain values
+        :return: a tuple of the type tag and the encoded bytes.
+        """
+        present = [value for value in values if value is not None]
+        if all(type(value) is bool for value in present):
+            return cls.BOOL, bytes(bool(value) for value in values)
+        if all(type(value) is int for value in present):
+            return cls.INT, array("q", (value if value is not None else 0
+                                        for value in values)).tobytes()
+        if all(type(value) in (int, float) for value in present):
+            return cls.FLOAT, array("d", (value if value is not None else 0
+                                          for value in values)).tobytes()
+        if all(type(value) is str for value in present):
+            return cls.STRING, cls.encode_strings(
+                [value if value is not None else "" for value in values])
+        return cls.JSON, cls.encode_strings(
+            [codec.dumps(value).decode("UTF-8") if value is not None
+             else "" for value in values])
+
+    @staticmethod
+    def encode_strings(values: list) -> bytes:
+        """
+        Encodes strings as an array of end offsets followed by their
+        UTF-8 bytes.
+        :param values: a list of strings
+        :return: bytes
+        """
+        encoded = [value.encode("UTF-8") for value in values]
+        offsets = array("I")
+        end = 0
+        for value in encoded:
+            end += len(value)
+            offsets.append(end)
+        return offsets.tobytes() + b"".join(encoded)
+
+
+class ColumnarReader:
+    """
+    Reads a file written by a ColumnarWriter, one row group at a time.
+    """
+
+    def __init__(self, path: str):
+        """
+        Instantiates a ColumnarReader.
+        :param path: a string, the path of the columnar file.
+        """
+        self.path = path
+
+    def row_groups(self):
+        """
+        Reads the row groups of the file.
+        :return: a generator of dictionaries of column name to a list of
+                 values.
+        :raises ValueError: if the file is not a columnar report.
+        """
+        writer = ColumnarWriter
+        with open(self.path, mode="rb") as file:
+            magic, version = writer.HEADER.unpack(
+                file.read(writer.HEADER.size))
+            if magic != writer.MAGIC or version != writer.VERSION:
+                raise ValueError(f"{self.path} is not a columnar report")
+            while True:
+                header = file.read(writer.GROUP.size)
+                if not header:
+                    return
+                rows, column_count = writer.GROUP.unpack(header)
+                group = {}
+                for _ in range(column_count):
+                    name_size, tag, compression, size = \
+                        writer.COLUMN.unpack(file.read(writer.COLUMN.size))
+                    name = file.read(name_size).decode("UTF-8")
+                    valid = file.read(rows)
+                    data = file.read(size)
+                    if compression == writer.ZLIB:
+                        data = zlib.decompress(data)
+                    group[name] = self.decode(tag, data, rows, valid)
+                yield group
+
+    def records(self):
+        """
+        Reads the records of the file.
+        :return: a generator of dictionaries
+        """
+        for group in self.row_groups():
+            names = list(group)
+            for row in zip(*group.values()):
+                yield dict(zip(names, row))
+
+    @staticmethod
+    def decode(tag: bytes, data: bytes, rows: int, valid: bytes) -> list:
+        """
+        Decodes the data of a column.
+        :param tag: a byte, the type tag of the column.
+        :param data: bytes, the encoded values.
+        :param rows: an int, the number of values.
+        :param valid: bytes, 0 for every value that is None.
+        :return: a list
+        """
+        writer = ColumnarWriter
+        if tag == writer.BOOL:
+            values = [bool(value) for value in data]
+        elif tag in (writer.INT, writer.FLOAT):
+            values = array("q" if tag == writer.INT else "d")
+            values.frombytes(data)
+        else:
+            offsets = array("I")
+            offsets.frombytes(data[:4 * rows])
+            strings = data[4 * rows:]
+            values = []
+            start = 0
+            for end in offsets:
+                values.append(strings[start:end].decode("UTF-8"))
+                start = end
+            if tag == writer.JSON:
+                values = [codec.loads(value) if value else None
+                          for value in values]
+        return [value if present else None
+                for value, present in zip(values, valid)]
+
+
+WRITERS = {"text": TextWriter, "jsonl": JSONLinesWriter, "csv": CSVWriter,
+           "columnar": ColumnarWriter}
@@ -0,0 +1,148 @@
+"""
+Shared fixtures of the tests.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from benchmarks.fixtures import PokedexFixtures
+from benchmarks.mock_server import MockPokeAPI
+from pokemonretriever import pokedex_cache
+from pokemonretriever.pokedex_snapshot import PokedexSnapshot
+
+
+class Clock:
+    """
+    A wall clock that only moves when told to, standing in for the time
+    module of the cache.
+    """
+
+    def __init__(self, now: float = 1700000000.0):
+        """
+        Initializes a Clock.
+        :param now: a number, the starting time in seconds.
+        """
+        self.now = now
+
+    def time(self) -> float:
+        """
+        Reads the clock.
+        :return: a float
+        """
+        return self.now
+
+    def advance(self, seconds: float):
+        """
+        Moves the clock forward.
+        :param seconds: a number
+        :return: None
+        """
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Replaces the clock of the cache.
+    :return: a Clock
+    """
+    clock = Clock()
+    monkeypatch.setattr(pokedex_cache, "time", clock)
+    return clock
+
+
+class MockServerThread:
+    """
+    Runs a MockPokeAPI on a free local port in an event loop of its own,
+    so a test can make requests to it from asyncio.run().
+    """
+
+    def __init__(self, server: MockPokeAPI):
+        """
+        Initializes a MockServerThread.
+        :param server: a MockPokeAPI
+        """
+        self.server = server
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True)
+        self.runner = None
+        self.url = None
+
+    def start(self) -> str:
+        """
+        Starts serving.
+        :return: a string, the root url of the API.
+        """
+        self.thread.start()
+        self.runner, self.url = asyncio.run_coroutine_threadsafe(
+            self.server.start(), self.loop).result(10)
+        return self.url
+
+    def stop(self):
+        """
+        Stops serving and closes the event loop.
+        :return: None
+        """
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(),
+                                         self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+        self.loop.close()
+
+
+@pytest.fixture(scope="session")
+def fixtures():
+    """
+    Generates a small PokeAPI dataset.
+    :return: a PokedexFixtures
+    """
+    return PokedexFixtures(pokemon=120, moves=150, abilities=60)
+
+
+@pytest.fixture(scope="session")
+def snapshot_path(fixtures, tmp_path_factory):
+    """
+    Saves the generated dataset as a snapshot, with its postings file.
+    :return: a string, the path of the snapshot.
+    """
+    snapshot = PokedexSnapshot()
+    for req_type in PokedexSnapshot.RESOURCE_TYPES:
+        for record in fixtures.records(req_type):
+            snapshot.add(req_type, record)
+    path = str(tmp_path_factory.mktemp("snapshot") / "snapshot.pdx")
+    snapshot.save(path)
+    return path
+
+
+@pytest.fixture
+def store(snapshot_path):
+    """
+    Opens the snapshot of the generated dataset.
+    :return: a PokedexStore
+    """
+    store = PokedexSnapshot.load(snapshot_path)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def mock_api(fixtures):
+    """
+    Starts mock PokeAPI servers, all stopped once the test is done.
+    :return: a function of the MockPokeAPI class, the fixtures (the
+             generated ones if None) and the options of the server, that
+             returns the server and its root url.
+    """
+    threads = []
+
+    def start(server_type=MockPokeAPI, data=None, **options):
+        thread = MockServerThread(server_type(data or fixtures, **options))
+        threads.append(thread)
+        return thread.server, thread.start()
+
+    yield start
+    for thread in threads:
+        thread.stop()
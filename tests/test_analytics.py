@@ -0,0 +1,169 @@
+"""
+Tests of the stat analytics: the vectorized percentiles, rankings, type
+aggregates and similar pokemon equal the same computation done one
+pokemon at a time.
+"""
+
+import math
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from pokemonretriever.pokedex_analytics import PokedexStats  # noqa: E402
+
+COLUMNS = PokedexStats.COLUMNS
+
+
+def profile(record: dict) -> dict:
+    """
+    Gets the base stats and total of a pokemon by column name.
+    """
+    values = {stat["stat"]["name"].replace("-", "_"): stat["base_stat"]
+              for stat in record["stats"]}
+    values["total"] = sum(values.values())
+    return values
+
+
+def types(record: dict) -> set:
+    return {entry["type"]["name"] for entry in record["types"]}
+
+
+def percentile(values: list, quantile: float) -> float:
+    """
+    Interpolates a percentile of sorted values linearly between the
+    closest ranks.
+    """
+    rank = (len(values) - 1) * quantile / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+@pytest.fixture
+def stats(store):
+    return PokedexStats.from_store(store)
+
+
+@pytest.fixture
+def pokemon(fixtures):
+    return fixtures.records("pokemon")
+
+
+def test_matrix_is_read_from_the_store(stats, pokemon):
+    assert len(stats) == len(pokemon)
+    assert stats.names == [record["name"] for record in pokemon]
+    assert stats.ids.tolist() == [record["id"] for record in pokemon]
+    assert stats.matrix().tolist() == \
+        [[profile(record)[column] for column in COLUMNS]
+         for record in pokemon]
+    for row, record in enumerate(pokemon):
+        assert {stats.types[column] for column
+                in numpy.flatnonzero(stats.type_mask[row])} == types(record)
+
+
+def test_rows_and_columns(stats, pokemon):
+    assert stats.row("pokemon-7") == stats.row(7) == stats.row("007") == 6
+    assert stats.column("special-attack").tolist() == \
+        [profile(record)["special_attack"] for record in pokemon]
+    with pytest.raises(ValueError):
+        stats.row("missingno")
+    with pytest.raises(ValueError):
+        stats.column("luck")
+    with pytest.raises(ValueError):
+        stats.select("shadow")
+
+
+@pytest.mark.parametrize("type_name", [None, "fire", "dragon"])
+def test_percentiles(stats, pokemon, type_name):
+    records = [record for record in pokemon
+               if type_name is None or type_name in types(record)]
+    for column, values in zip(COLUMNS, stats.percentiles(
+            (0, 10, 50, 90, 100), type_name).T.tolist()):
+        column_values = sorted(profile(record)[column]
+                               for record in records)
+        assert values[0] == column_values[0]
+        assert values[-1] == column_values[-1]
+        assert values[1:4] == pytest.approx(
+            [percentile(column_values, quantile)
+             for quantile in (10, 50, 90)])
+
+
+def test_percentiles_of_a_type_without_pokemon():
+    stats = PokedexStats(numpy.array([1, 2]), ["a", "b"],
+                         [[1] * 6, [2] * 6], ["fire", "water"],
+                         numpy.array([[True, False], [True, False]]))
+    assert numpy.isnan(stats.percentiles(type_name="water")).all()
+
+
+@pytest.mark.parametrize("stat, limit, descending, type_name", [
+    ("total", 10, True, None), ("speed", 5, True, None),
+    ("hp", 7, False, None), ("attack", 3, True, "water"),
+    ("defense", 500, False, "grass"), ("special-defense", 1, True, None)])
+def test_ranking(stats, pokemon, stat, limit, descending, type_name):
+    column = stat.replace("-", "_")
+    records = [record for record in pokemon
+               if type_name is None or type_name in types(record)]
+    sign = -1 if descending else 1
+    ranked = sorted(records, key=lambda record: (
+        sign * profile(record)[column], record["id"]))[:limit]
+    assert [stats.names[row] for row in
+            stats.ranking(stat, limit, descending, type_name).tolist()] == \
+        [record["name"] for record in ranked]
+
+
+def test_empty_ranking(stats):
+    assert len(stats.ranking(limit=0)) == 0
+
+
+def test_type_aggregates(stats, pokemon):
+    counts, means, maxima = stats.type_aggregates()
+    for column, type_name in enumerate(stats.types):
+        records = [profile(record) for record in pokemon
+                   if type_name in types(record)]
+        assert counts[column] == len(records)
+        assert means[column].tolist() == pytest.approx(
+            [sum(record[name] for record in records) / len(records)
+             for name in COLUMNS])
+        assert maxima[column].tolist() == \
+            [max(record[name] for record in records) for name in COLUMNS]
+
+
+@pytest.mark.parametrize("metric", PokedexStats.METRICS)
+def test_similar(stats, pokemon, metric):
+    target = pokemon[10]
+    vector = [stat["base_stat"] for stat in target["stats"]]
+
+    def distance(record):
+        other = [stat["base_stat"] for stat in record["stats"]]
+        if metric == "euclidean":
+            return math.dist(vector, other)
+        dot = sum(a * b for a, b in zip(vector, other))
+        return 1 - dot / (math.hypot(*vector) * math.hypot(*other))
+
+    closest = sorted((record for record in pokemon if record is not target),
+                     key=lambda record: (round(distance(record), 9),
+                                         record["id"]))[:6]
+    row, rows, distances = stats.similar(target["name"], 6, metric)
+    assert row == 10
+    assert [stats.names[other] for other in rows.tolist()] == \
+        [record["name"] for record in closest]
+    assert distances.tolist() == pytest.approx(
+        [distance(record) for record in closest], abs=1e-9)
+
+
+def test_similar_limits(stats):
+    row, rows, distances = stats.similar(1, limit=10 ** 6)
+    assert len(rows) == len(stats) - 1
+    assert row not in rows.tolist()
+    assert (numpy.diff(distances) >= 0).all()
+    with pytest.raises(ValueError):
+        stats.similar(1, metric="manhattan")
+
+
+def test_tables(stats):
+    assert len(stats.format_rows(stats.ranking(limit=3)).splitlines()) == 4
+    assert len(stats.format_percentiles().splitlines()) == \
+        len(PokedexStats.PERCENTILES) + 1
+    assert len(stats.format_types().splitlines()) == len(stats.types) + 1
+    assert len(stats.format_similar(1, 4).splitlines()) == 6
@@ -0,0 +1,148 @@
+"""
+Tests of the persistent response cache: expiry, revalidation, LRU
+eviction and projection versions.
+"""
+
+import sqlite3
+
+import pytest
+
+from pokemonretriever.pokedex_cache import PokedexCache
+from pokemonretriever.pokedex_json import codec
+
+PIKACHU = {"name": "pikachu", "id": 25, "height": 4}
+VALIDATORS = {"ETag": '"abc"', "Last-Modified": "Wed, 01 Jan 2020 00:00:00 "
+                                                "GMT"}
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = PokedexCache(str(tmp_path), ttl=60)
+    yield cache
+    cache.close()
+
+
+def rows(cache: PokedexCache) -> int:
+    return cache.connection.execute(
+        "SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def test_get_returns_the_response_put(cache):
+    cache.put("pokemon", "Pikachu", PIKACHU)
+    assert cache.get("pokemon", " PIKACHU ") == PIKACHU
+    assert cache.get("pokemon", "raichu") is None
+    assert cache.get("move", "pikachu") is None
+
+
+def test_expired_entry_without_validators_is_deleted(cache, clock):
+    cache.put("pokemon", 25, PIKACHU)
+    clock.advance(59)
+    assert cache.get("pokemon", 25) == PIKACHU
+    clock.advance(2)
+    assert cache.get("pokemon", 25) is None
+    assert rows(cache) == 0
+    assert cache.size == 0
+
+
+def test_expired_entry_with_validators_is_kept(cache, clock):
+    cache.put("pokemon", 25, PIKACHU, VALIDATORS)
+    clock.advance(61)
+    assert cache.get("pokemon", 25) is None
+    assert cache.validators("pokemon", 25) == VALIDATORS
+    assert cache.revalidate("pokemon", 25) == PIKACHU
+    assert cache.get("pokemon", 25) == PIKACHU
+
+
+def test_partial_validators(cache):
+    cache.put("pokemon", 25, PIKACHU, {"ETag": '"abc"'})
+    assert cache.validators("pokemon", 25) == {"ETag": '"abc"'}
+    cache.put("pokemon", 26, PIKACHU)
+    assert cache.validators("pokemon", 26) == {}
+    assert cache.validators("pokemon", 27) == {}
+
+
+def test_no_ttl_never_expires(tmp_path, clock):
+    cache = PokedexCache(str(tmp_path), ttl=0)
+    cache.put("pokemon", 25, PIKACHU)
+    clock.advance(10 ** 9)
+    assert cache.get("pokemon", 25) == PIKACHU
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    size = len(codec.dumps({"id": 0, "padding": "x" * 100}))
+    cache = PokedexCache(str(tmp_path), max_size=3 * size)
+    for req_id in range(3):
+        cache.put("move", req_id, {"id": req_id, "padding": "x" * 100})
+        clock.advance(1)
+    assert cache.get("move", 0) is not None
+    clock.advance(1)
+    cache.put("move", 3, {"id": 3, "padding": "x" * 100})
+    assert cache.get("move", 1) is None
+    assert [cache.get("move", req_id)["id"] for req_id in (0, 2, 3)] == \
+        [0, 2, 3]
+    assert cache.size == 3 * size
+    cache.close()
+
+
+def test_response_larger_than_the_budget_is_not_stored(tmp_path, clock):
+    cache = PokedexCache(str(tmp_path), max_size=10)
+    cache.put("pokemon", 25, PIKACHU)
+    assert cache.get("pokemon", 25) is None
+    assert cache.size == 0
+    cache.close()
+
+
+def test_replacing_an_entry_keeps_the_size(cache):
+    cache.put("pokemon", 25, PIKACHU)
+    cache.put("pokemon", 25, dict(PIKACHU, height=40))
+    assert cache.get("pokemon", 25)["height"] == 40
+    assert cache.size == len(codec.dumps(dict(PIKACHU, height=40)))
+
+
+def test_entry_of_another_projection_is_a_miss(cache):
+    cache.put("pokemon", 25, PIKACHU, VALIDATORS, projection="v1")
+    assert cache.get("pokemon", 25, "v1") == PIKACHU
+    assert cache.validators("pokemon", 25, "v2") == {}
+    assert cache.get("pokemon", 25, "v1") is None
+    assert rows(cache) == 0
+    assert cache.size == 0
+
+
+def test_unprojected_entry_is_a_miss_for_a_projection(cache):
+    cache.put("pokemon", 25, PIKACHU)
+    assert cache.revalidate("pokemon", 25, "v1") is None
+    assert rows(cache) == 0
+
+
+def test_entries_persist(tmp_path, clock):
+    cache = PokedexCache(str(tmp_path))
+    cache.put("pokemon", 25, PIKACHU, projection="v1")
+    size = cache.size
+    cache.close()
+    cache = PokedexCache(str(tmp_path))
+    assert cache.size == size
+    assert cache.get("pokemon", 25, "v1") == PIKACHU
+    cache.close()
+
+
+def test_database_without_validators_or_projection_is_migrated(tmp_path,
+                                                               clock):
+    connection = sqlite3.connect(str(tmp_path / PokedexCache.FILE_NAME))
+    payload = codec.dumps(PIKACHU)
+    with connection:
+        connection.execute(
+            "CREATE TABLE responses (req_type TEXT NOT NULL, "
+            "req_id TEXT NOT NULL, data TEXT NOT NULL, "
+            "size INTEGER NOT NULL, stored_at REAL NOT NULL, "
+            "accessed_at REAL NOT NULL, PRIMARY KEY (req_type, req_id))")
+        connection.execute(
+            "INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+            ("pokemon", "25", payload, len(payload), clock.now, clock.now))
+    connection.close()
+    cache = PokedexCache(str(tmp_path))
+    assert cache.size == len(payload)
+    assert cache.validators("pokemon", 25) == {}
+    assert cache.get("pokemon", 25) == PIKACHU
+    assert cache.get("pokemon", 25, "v1") is None
+    cache.close()
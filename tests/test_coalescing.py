@@ -0,0 +1,122 @@
+"""
+Tests of request coalescing: every spelling of a resource requested
+while it is in flight shares one upstream request, and cancelling one
+of the requests does not cancel the others.
+"""
+
+import asyncio
+
+import pytest
+
+from benchmarks.mock_server import MockPokeAPI
+from pokemonretriever.pokedex_index import PokedexIndex
+from pokemonretriever.pokedex_request import PokedexAPI
+
+
+class CountingPokeAPI(MockPokeAPI):
+    """
+    A MockPokeAPI that records the identifier of every resource request
+    it receives.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+
+    async def get_resource(self, request):
+        self.requests.append(request.match_info["req_id"])
+        return await super().get_resource(request)
+
+
+def fetch(api: PokedexAPI, identifiers: list) -> list:
+    return asyncio.run(api.process_requests("pokemon", identifiers))
+
+
+def test_duplicate_ids_share_one_request(mock_api):
+    server, url = mock_api(CountingPokeAPI, latency=0.05)
+    responses = fetch(PokedexAPI(base_url=url), ["1", "2", "1", "1", "2"])
+    assert [response["id"] for response in responses] == [1, 2, 1, 1, 2]
+    assert sorted(server.requests) == ["1", "2"]
+
+
+def test_spellings_of_a_name_or_id_share_one_request(mock_api):
+    server, url = mock_api(CountingPokeAPI, latency=0.05)
+    responses = fetch(PokedexAPI(base_url=url),
+                      ["Pokemon-7", " pokemon-7 ", "POKEMON-7", "25",
+                       "025", "0025", " 25"])
+    assert [response["id"] for response in responses] == \
+        [7, 7, 7, 25, 25, 25, 25]
+    assert sorted(server.requests) == ["25", "pokemon-7"]
+
+
+def test_known_name_and_id_share_one_request(mock_api):
+    server, url = mock_api(CountingPokeAPI, latency=0.05)
+    api = PokedexAPI(base_url=url)
+    api.add_alias("pokemon", "Pokemon-7", "007")
+    responses = fetch(api, ["pokemon-7", "7", "007", "POKEMON-7"])
+    assert [response["name"] for response in responses] == \
+        ["pokemon-7"] * 4
+    assert server.requests == ["7"]
+
+
+def test_names_known_through_the_index_share_one_request(mock_api):
+    server, url = mock_api(CountingPokeAPI, latency=0.05)
+    index = PokedexIndex({"pokemon": [("pokemon-7", 7), ("pokemon-8", 8)]})
+    api = PokedexAPI(base_url=url, index=index)
+    responses = fetch(api, ["Pokemon-7", "7", "008", "pokemon-8", "07"])
+    assert [response["id"] for response in responses] == [7, 7, 8, 8, 7]
+    assert sorted(server.requests) == ["7", "8"]
+
+
+def test_names_learned_from_a_response_map_to_the_id(mock_api):
+    _, url = mock_api()
+    api = PokedexAPI(base_url=url)
+    fetch(api, ["pokemon-9"])
+    assert api.canonical("pokemon", " POKEMON-9 ") == "9"
+    assert api.canonical("pokemon", "009") == "9"
+    assert api.canonical("move", "pokemon-9") == "pokemon-9"
+
+
+def test_cancelling_one_request_does_not_cancel_the_others(mock_api):
+    server, url = mock_api(CountingPokeAPI, latency=0.2)
+    api = PokedexAPI(base_url=url)
+
+    async def run():
+        async with api:
+            first = asyncio.ensure_future(
+                api.process_requests("pokemon", "3"))
+            second = asyncio.ensure_future(
+                api.process_requests("pokemon", "003"))
+            await asyncio.sleep(0.05)
+            first.cancel()
+            response = await second
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return response
+
+    assert asyncio.run(run())["id"] == 3
+    assert server.requests == ["3"]
+    assert api.in_flight == {}
+
+
+def test_request_is_cancelled_once_every_waiter_is(mock_api):
+    _, url = mock_api(latency=0.5)
+    api = PokedexAPI(base_url=url)
+
+    async def run():
+        async with api:
+            waiters = [asyncio.ensure_future(
+                api.process_requests("pokemon", "4")) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            task, _ = api.in_flight[("pokemon", "4")]
+            for waiter in waiters[:2]:
+                waiter.cancel()
+            await asyncio.sleep(0.01)
+            assert not task.done()
+            waiters[2].cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            await asyncio.sleep(0)
+            return task
+
+    assert asyncio.run(run()).cancelled()
+    assert api.in_flight == {}
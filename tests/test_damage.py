@@ -0,0 +1,202 @@
+"""
+Tests of the damage calculator: the type chart, the damage formula on
+hand-computed cases and on the generated dataset, and the rankings.
+"""
+
+import math
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from pokemonretriever.pokedex_analytics import PokedexStats  # noqa: E402
+from pokemonretriever.pokedex_damage import PokedexDamage, \
+    PokedexMoves  # noqa: E402
+
+TYPES = ["dragon", "fire", "flying", "grass", "ice", "normal", "water"]
+# name, base stats, types
+POKEMON = [("charizard", (78, 84, 78, 109, 85, 100), ("fire", "flying")),
+           ("venusaur", (80, 82, 83, 100, 100, 80), ("grass",)),
+           ("dragonite", (91, 134, 95, 100, 100, 80), ("dragon", "flying")),
+           ("snorlax", (160, 110, 65, 65, 110, 30), ("normal",))]
+# name, power, accuracy, type, damage class
+MOVES = [("flamethrower", 90, 100, "fire", "special"),
+         ("fire-punch", 75, 100, "fire", "physical"),
+         ("ice-beam", 90, 100, "ice", "special"),
+         ("body-slam", 85, 100, "normal", "physical"),
+         ("growl", 0, 100, "normal", "status"),
+         ("surf", 90, 100, "water", "special")]
+
+
+def battle_stat(base: int, level: int = 50) -> int:
+    return math.floor((2 * base + 31) * level / 100) + 5
+
+
+def hit_points(base: int, level: int = 50) -> int:
+    return math.floor((2 * base + 31) * level / 100) + level + 10
+
+
+def formula(attacker: tuple, move: tuple, defender: tuple,
+            level: int = 50) -> int:
+    """
+    Computes the damage of a move the slow way, from the formula of the
+    games with the chart of PokedexDamage.
+    """
+    _, power, _, move_type, damage_class = move
+    if damage_class == "status" or not power:
+        return 0
+    offense, defense = (1, 2) if damage_class == "physical" else (3, 4)
+    attack = battle_stat(attacker[1][offense], level)
+    guard = battle_stat(defender[1][defense], level)
+    stab = 1.5 if move_type in attacker[2] else 1
+    effect = 1
+    for defending in defender[2]:
+        effect *= PokedexDamage.CHART[move_type].get(defending, 1)
+    return math.floor(((2 * level / 5 + 2) * power * attack / guard / 50
+                       + 2) * stab * effect)
+
+
+def calculator(level: int = 50) -> PokedexDamage:
+    stats = PokedexStats(
+        numpy.arange(1, len(POKEMON) + 1),
+        [name for name, _, _ in POKEMON],
+        [base for _, base, _ in POKEMON], TYPES,
+        numpy.array([[type_name in pokemon_types for type_name in TYPES]
+                     for _, _, pokemon_types in POKEMON]))
+    classes = numpy.array([damage_class for *_, damage_class in MOVES])
+    power = numpy.array([power for _, power, *_ in MOVES])
+    moves = PokedexMoves(
+        [name for name, *_ in MOVES], power,
+        numpy.array([accuracy for _, _, accuracy, *_ in MOVES]),
+        [move_type for _, _, _, move_type, _ in MOVES],
+        numpy.array([PokedexDamage.code(move_type)
+                     for _, _, _, move_type, _ in MOVES]),
+        classes == "physical", (power > 0) & (classes != "status"))
+    return PokedexDamage(stats, moves, level=level)
+
+
+def test_type_chart():
+    chart = PokedexDamage.type_chart()
+    code = PokedexDamage.code
+    assert chart.shape == (19, 19)
+    assert chart[code("water"), code("fire")] == 2
+    assert chart[code("fire"), code("water")] == 0.5
+    assert chart[code("normal"), code("ghost")] == 0
+    assert chart[code("ghost"), code("normal")] == 0
+    assert chart[code("electric"), code("ground")] == 0
+    assert chart[code("dragon"), code("fairy")] == 0
+    assert chart[code("fire"), code("fire")] == 0.5
+    assert chart[code("normal"), code("normal")] == 1
+    assert (chart[PokedexDamage.NEUTRAL] == 1).all()
+    assert (chart[:, PokedexDamage.NEUTRAL] == 1).all()
+    assert code("shadow") == PokedexDamage.NEUTRAL
+    assert sorted(set(chart.ravel().tolist())) == [0, 0.5, 1, 2]
+
+
+def test_effectiveness_multiplies_both_types():
+    damage = calculator()
+    moves = numpy.array([2, 0, 5])
+    # Ice is 4x on dragon/flying and 1x on fire/flying, fire is 0.5x
+    # on fire/flying and water 2x.
+    effect = damage.effectiveness(moves, numpy.arange(4))
+    assert effect.tolist() == [[1, 2, 4, 1],
+                               [0.5, 2, 0.5, 1],
+                               [2, 0.5, 0.5, 1]]
+
+
+def test_worked_example():
+    # Charizard (special attack 109) uses flamethrower (90, fire) on
+    # venusaur (special defense 100) at level 50: the stats are 129 and
+    # 120, the base damage (22 * 90 * 129 / 120 / 50 + 2) = 44.57, times
+    # 1.5 for STAB and 2 for fire on grass, floored to 133.
+    assert battle_stat(109) == 129 and battle_stat(100) == 120
+    assert formula(POKEMON[0], MOVES[0], POKEMON[1]) == 133
+    assert calculator().damage(numpy.array([0]), numpy.array([0]),
+                               numpy.array([1]))[0, 0, 0] == 133
+
+
+@pytest.mark.parametrize("level", [5, 50, 100])
+def test_damage_equals_the_formula(level):
+    damage = calculator(level)
+    rows = numpy.arange(len(POKEMON))
+    result = damage.damage(rows, numpy.arange(len(MOVES)), rows)
+    assert result.tolist() == [[[formula(attacker, move, defender, level)
+                                 for defender in POKEMON]
+                                for move in MOVES] for attacker in POKEMON]
+
+
+def test_unlearned_moves_do_no_damage():
+    damage = calculator()
+    rows = numpy.arange(len(POKEMON))
+    learned = numpy.ones((len(POKEMON), len(MOVES)), dtype=bool)
+    learned[0, 0] = False
+    result = damage.damage(rows, numpy.arange(len(MOVES)), rows, learned)
+    assert (result[0, 0] == 0).all()
+    assert result[1, 0, 1] == formula(POKEMON[1], MOVES[0], POKEMON[1])
+
+
+def test_rank_orders_by_share_of_hit_points():
+    damage = calculator()
+    results = damage.rank(numpy.arange(4), numpy.arange(len(MOVES)),
+                          limit=10)
+    expected = sorted(
+        ((attacker, move, defender,
+          formula(POKEMON[attacker], MOVES[move], POKEMON[defender]))
+         for attacker in range(4) for move in range(len(MOVES))
+         for defender in range(4)),
+        key=lambda result: (-result[3] / hit_points(
+            POKEMON[result[2]][1][0]), result[0], result[1], result[2]))
+    assert [result[:4] for result in results] == expected[:10]
+    for attacker, move, defender, hp_damage, percent in results:
+        assert percent == pytest.approx(
+            100 * hp_damage / hit_points(POKEMON[defender][1][0]))
+    percents = [result[4] for result in results]
+    assert percents == sorted(percents, reverse=True)
+
+
+def test_rank_best_move_keeps_one_move_per_pair():
+    damage = calculator()
+    results = damage.rank(numpy.arange(4), numpy.arange(len(MOVES)),
+                          limit=100, best_move=True)
+    pairs = [(attacker, defender) for attacker, _, defender, _, _ in results]
+    assert len(pairs) == len(set(pairs)) == 16
+    for attacker, move, defender, hp_damage, _ in results:
+        assert hp_damage == max(formula(POKEMON[attacker], other,
+                                        POKEMON[defender])
+                                for other in MOVES)
+
+
+def test_rank_without_results():
+    damage = calculator()
+    assert damage.rank(numpy.arange(4), numpy.array([4])) == []
+    assert damage.rank(numpy.arange(4), numpy.arange(6), limit=0) == []
+    assert damage.rank(numpy.array([], dtype=int), numpy.arange(6)) == []
+
+
+def test_movepools_of_a_snapshot(fixtures, store):
+    damage = PokedexDamage.from_store(store)
+    attackers = numpy.arange(5)
+    results = damage.rank(attackers, limit=50)
+    pokemon = fixtures.records("pokemon")
+    assert results
+    for attacker, move, defender, hp_damage, _ in results:
+        learned = {entry["move"]["name"]
+                   for entry in pokemon[attacker]["moves"]}
+        assert damage.moves.names[move] in learned
+        assert damage.moves.damaging[move]
+
+
+def test_snapshot_damage_equals_the_formula(fixtures, store):
+    damage = PokedexDamage.from_store(store)
+    pokemon = [(record["name"], [stat["base_stat"]
+                                 for stat in record["stats"]],
+                {entry["type"]["name"] for entry in record["types"]})
+               for record in fixtures.records("pokemon")[:12]]
+    moves = [(record["name"], record["power"], record["accuracy"],
+              record["type"]["name"], record["damage_class"]["name"])
+             for record in fixtures.records("move")[:30]]
+    rows = numpy.arange(len(pokemon))
+    result = damage.damage(rows, numpy.arange(len(moves)), rows)
+    expected = [[[formula(attacker, move, defender) for defender in pokemon]
+                 for move in moves] for attacker in pokemon]
+    assert result.tolist() == expected
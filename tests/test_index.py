@@ -0,0 +1,98 @@
+"""
+Tests of the name and id index: it is built from the list endpoints,
+maps names to ids, rejects unknown identifiers with suggestions and
+loads back as it was saved.
+"""
+
+import asyncio
+
+import pytest
+
+from pokedex import Request
+from pokemonretriever.pokedex_index import PokedexIndex
+from pokemonretriever.pokedex_request import PokedexAPI
+
+RESOURCES = {
+    "pokemon": [("bulbasaur", 1), ("ivysaur", 2), ("venusaur", 3),
+                ("pikachu", 25), ("raichu", 26)],
+    "stat": [("hp", 1), ("attack", 2), ("defense", 3)],
+}
+
+
+@pytest.fixture
+def index():
+    return PokedexIndex(RESOURCES)
+
+
+def test_canonical_maps_names_to_ids(index):
+    assert index.canonical("pokemon", "pikachu") == "25"
+    assert index.canonical("pokemon", " Pikachu ") == "25"
+    assert index.canonical("pokemon", "025") == "25"
+    assert index.canonical("pokemon", 3) == "3"
+    assert index.canonical("pokemon", "pikachoo") is None
+    assert index.canonical("pokemon", "4") is None
+    assert index.canonical("move", "Tackle") == "tackle"
+
+
+def test_check_splits_known_from_unknown_identifiers(index):
+    known, failures = index.check(
+        "pokemon", ["raichu", "pikachoo", "1", "404", "Venusaur"])
+    assert known == ["26", "1", "3"]
+    assert [(failure.req_id, failure.reason) for failure in failures] == \
+        [("pikachoo", "Unknown name or id. Did you mean pikachu?"),
+         ("404", "Unknown name or id")]
+    assert index.check("move", ["Tackle", "1"]) == (["Tackle", "1"], [])
+
+
+def test_suggestions_are_the_closest_names(index):
+    assert index.suggest("pokemon", "ivysaurr") == ["ivysaur", "venusaur"]
+    assert index.suggest("pokemon", "ivysaurr", count=1) == ["ivysaur"]
+    assert index.suggest("pokemon", "Raichoo") == ["raichu"]
+    assert index.suggest("stat", "atack") == ["attack"]
+    assert index.suggest("move", "tackle") == []
+
+
+def test_saved_index_loads_back(index, tmp_path):
+    path = str(tmp_path / "cache" / "index.json")
+    index.save(path)
+    loaded = PokedexIndex.load(path)
+    assert len(loaded) == len(index) == 8
+    assert loaded.names == index.names
+    assert loaded.ids == index.ids
+
+
+def test_load_without_an_index(tmp_path):
+    assert PokedexIndex.load(str(tmp_path / "index.json")) is None
+    path = tmp_path / "other.json"
+    path.write_text('{"version": 0}')
+    with pytest.raises(ValueError):
+        PokedexIndex.load(str(path))
+
+
+def test_index_is_built_from_the_list_endpoints(fixtures, mock_api,
+                                                tmp_path):
+    _, url = mock_api()
+    path = str(tmp_path / "index.json")
+    index = asyncio.run(PokedexIndex.build(PokedexAPI(base_url=url), path))
+    for req_type in PokedexIndex.RESOURCE_TYPES:
+        records = fixtures.records(req_type)
+        assert len(index.names[req_type]) == len(records)
+        for record in records:
+            assert index.canonical(req_type, record["name"]) == \
+                str(record["id"])
+    assert PokedexIndex.load(path).names == index.names
+
+
+def test_request_drops_unknown_identifiers(index, tmp_path):
+    path = str(tmp_path / "index.json")
+    index.save(path)
+    request = Request("pokemon", input_data="Pikachoo", use_cache=False,
+                      index_file=path)
+    assert list(request.input_chunks()) == [(1, [])]
+    failures = [str(failure) for failure in request.api.failures]
+    assert len(failures) == 1
+    assert "Did you mean pikachu?" in failures[0]
+    request = Request("pokemon", input_data="Pikachu", use_cache=False,
+                      index_file=path)
+    assert list(request.input_chunks()) == [(1, ["25"])]
+    assert request.api.failures == []
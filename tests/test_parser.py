@@ -0,0 +1,113 @@
+"""
+Tests of the decoding layer: the json backends, the projection of
+responses onto the fields the parsers read, and the batch parsers.
+"""
+
+import asyncio
+
+import pytest
+
+from pokemonretriever.pokedex_json import PokedexJSON
+from pokemonretriever.pokedex_parser import PARSERS, \
+    PokedexPokemonParser, project
+from pokemonretriever.pokedex_request import PokedexAPI
+from pokemonretriever.pokedex_store import PokedexStore
+
+
+def test_project_keeps_only_the_spec():
+    value = {"name": "bulbasaur", "id": 1, "order": 1,
+             "types": [{"slot": 1, "type": {"name": "grass", "url": "u"}},
+                       {"slot": 2, "type": {"name": "poison"}}],
+             "moves": [{"move": {"name": "cut"},
+                        "version_group_details": [
+                            {"level_learned_at": 0, "version": "a"},
+                            {"level_learned_at": 5, "version": "b"}]}]}
+    spec = {"name": True, "id": True, "missing": True,
+            "types": {"type": {"name": True}},
+            "moves": {"move": True,
+                      "version_group_details": [{"level_learned_at": True}]}}
+    assert project(value, spec) == {
+        "name": "bulbasaur", "id": 1,
+        "types": [{"type": {"name": "grass"}}, {"type": {"name": "poison"}}],
+        "moves": [{"move": {"name": "cut"},
+                   "version_group_details": [{"level_learned_at": 0}]}]}
+
+
+def test_project_keeps_empty_and_null_values():
+    spec = {"power": True, "effect_entries": [{"short_effect": True}],
+            "type": {"name": True}}
+    assert project({"power": None, "effect_entries": [], "type": None},
+                   spec) == {"power": None, "effect_entries": [],
+                             "type": None}
+
+
+@pytest.mark.parametrize("req_type", sorted(PARSERS))
+def test_projected_responses_build_the_same_objects(fixtures, req_type):
+    parser, object_type = PokedexStore.PARSERS[req_type]
+    for record in fixtures.records(req_type):
+        projected = parser.project(record)
+        assert set(projected) == set(parser.FIELDS) & set(record)
+        assert str(object_type(**parser.parse(projected))) == \
+            str(object_type(**parser.parse(record)))
+
+
+def test_projection_drops_the_large_fields(fixtures):
+    record = fixtures.get("pokemon", 1)
+    projected = PokedexPokemonParser.project(record)
+    assert "sprites" not in projected and "game_indices" not in projected
+    assert all(len(move["version_group_details"]) <= 1
+               for move in projected["moves"])
+
+
+@pytest.mark.parametrize("req_type", ["move", "ability", "stat"])
+def test_batch_parsers_build_the_same_objects(fixtures, req_type):
+    parser, object_type = PokedexStore.PARSERS[req_type]
+    records = [parser.project(record)
+               for record in fixtures.records(req_type)]
+    table = parser.parse_many(records)
+    assert len(table) == len(records)
+    assert [str(built) for built in table.build(object_type)] == \
+        [str(object_type(**parser.parse(record))) for record in records]
+
+
+def test_projection_versions():
+    versions = {parser.projection() for parser in PARSERS.values()}
+    assert len(versions) == len(PARSERS)
+    assert PokedexPokemonParser.projection() == \
+        PokedexPokemonParser.projection()
+
+    class SameFields(PokedexPokemonParser):
+        pass
+
+    class MoreFields(PokedexPokemonParser):
+        FIELDS = dict(PokedexPokemonParser.FIELDS, order=True)
+
+    assert SameFields.projection() == PokedexPokemonParser.projection()
+    assert MoreFields.projection() != PokedexPokemonParser.projection()
+    assert len(MoreFields.projection()) == 16
+
+
+@pytest.mark.parametrize("backend", PokedexJSON.available())
+def test_backends_round_trip(backend):
+    codec = PokedexJSON(backend)
+    value = {"name": "flabébé", "id": 669, "power": None,
+             "types": [{"type": {"name": "fairy"}}], "ratio": 0.5}
+    encoded = codec.dumps(value)
+    assert isinstance(encoded, bytes)
+    assert b" " not in encoded
+    assert codec.loads(encoded) == value
+    assert codec.loads(encoded.decode("UTF-8")) == value
+
+
+def test_unknown_backend():
+    assert PokedexJSON.available()[-1] == "json"
+    with pytest.raises(ValueError):
+        PokedexJSON("simdjson")
+
+
+def test_responses_are_projected_when_received(fixtures, mock_api):
+    _, url = mock_api()
+    api = PokedexAPI(base_url=url)
+    responses = asyncio.run(api.process_requests("pokemon", ["1", "2"]))
+    assert responses == [PokedexPokemonParser.project(
+        fixtures.get("pokemon", pokemon_id)) for pokemon_id in (1, 2)]
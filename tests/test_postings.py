@@ -0,0 +1,123 @@
+"""
+Tests of the reverse indexes of a snapshot: they list the pokemon of
+every type, ability and move, survive a save and load, and are rebuilt
+when the snapshot changes.
+"""
+
+import os
+import random
+import shutil
+
+import pytest
+
+from pokemonretriever.pokedex_postings import PokedexPostings, intersect
+from pokemonretriever.pokedex_snapshot import PokedexSnapshot
+
+RELATIONS = {"type": ("types", "type"), "ability": ("abilities", "ability"),
+             "move": ("moves", "move")}
+
+
+def expected(fixtures) -> dict:
+    """
+    Lists the pokemon of every type, ability and move of the generated
+    dataset, in id order.
+    """
+    lists = {relation: {} for relation in RELATIONS}
+    for record in fixtures.records("pokemon"):
+        for relation, (field, key) in RELATIONS.items():
+            for entry in record[field]:
+                lists[relation].setdefault(entry[key]["name"], []) \
+                    .append(record["name"])
+    return lists
+
+
+@pytest.fixture
+def snapshot_copy(snapshot_path, tmp_path):
+    path = str(tmp_path / "snapshot.pdx")
+    shutil.copyfile(snapshot_path, path)
+    store = PokedexSnapshot.load(path)
+    yield store
+    store.close()
+
+
+def assert_same(postings: PokedexPostings, other: PokedexPostings):
+    for relation in PokedexPostings.RELATIONS:
+        assert [list(values) for values in postings.relations[relation]] == \
+            [list(values) for values in other.relations[relation]]
+
+
+def test_build_lists_the_pokemon_of_every_name(fixtures, store):
+    postings = PokedexPostings.build(store)
+    lists = expected(fixtures)
+    for relation, names in lists.items():
+        assert set(postings.keys[relation]) == set(names)
+        for name, pokemon in names.items():
+            assert postings.pokemon(relation, name) == pokemon
+            assert postings.count(relation, name) == len(pokemon)
+    assert len(postings) == sum(len(pokemon) for names in lists.values()
+                                for pokemon in names.values())
+
+
+def test_unknown_names(store):
+    postings = PokedexPostings.build(store)
+    assert list(postings.postings("move", "move-9999")) == []
+    assert postings.count("ability", "levitate") == 0
+    assert postings.pokemon("type", "shadow") == []
+    assert postings.count("type", " FIRE ") == postings.count("type", "fire")
+
+
+def test_snapshot_is_saved_with_its_postings(store):
+    assert_same(PokedexPostings.load(store), PokedexPostings.build(store))
+
+
+def test_save_and_load(snapshot_copy, tmp_path):
+    postings = PokedexPostings.build(snapshot_copy)
+    postings.save()
+    assert os.path.exists(snapshot_copy.path + PokedexPostings.SUFFIX)
+    assert_same(PokedexPostings.load(snapshot_copy), postings)
+    path = str(tmp_path / "other.postings")
+    postings.save(path)
+    assert_same(PokedexPostings.load(snapshot_copy, path), postings)
+
+
+def test_postings_of_another_snapshot_are_stale(snapshot_copy):
+    PokedexPostings.build(snapshot_copy).save()
+    stat = os.stat(snapshot_copy.path)
+    os.utime(snapshot_copy.path, ns=(stat.st_atime_ns,
+                                     stat.st_mtime_ns + 10 ** 9))
+    with pytest.raises(ValueError, match="another version"):
+        PokedexPostings.load(snapshot_copy)
+    assert_same(PokedexPostings.open(snapshot_copy),
+                PokedexPostings.build(snapshot_copy))
+    PokedexPostings.load(snapshot_copy)
+
+
+def test_files_that_are_not_postings(snapshot_copy):
+    path = snapshot_copy.path + PokedexPostings.SUFFIX
+    with pytest.raises(FileNotFoundError):
+        PokedexPostings.load(snapshot_copy)
+    for data in (b"PDXP", b"NOPE" + bytes(PokedexPostings.HEADER.size)):
+        with open(path, mode="wb") as file:
+            file.write(data)
+        with pytest.raises(ValueError):
+            PokedexPostings.load(snapshot_copy)
+    assert PokedexPostings.open(snapshot_copy).count("type", "fire") == \
+        PokedexPostings.build(snapshot_copy).count("type", "fire")
+
+
+def test_intersect_equals_set_intersection():
+    generator = random.Random(23)
+    for _ in range(200):
+        postings = [sorted(generator.sample(range(300),
+                                            generator.randint(0, 120)))
+                    for _ in range(generator.randint(1, 4))]
+        assert intersect(postings) == \
+            sorted(set(postings[0]).intersection(*postings[1:]))
+
+
+def test_intersect_edge_cases():
+    assert intersect([]) == []
+    assert intersect([[1, 5, 9]]) == [1, 5, 9]
+    assert intersect([[1, 2], [3, 4]]) == []
+    assert intersect([[1, 2, 3], []]) == []
+    assert intersect([[2, 4, 6, 8], [8], [1, 8, 9]]) == [8]
@@ -0,0 +1,106 @@
+"""
+Tests of chunked input files and resumed reports: a report interrupted
+after some chunks and resumed with --resume is the report of an
+uninterrupted run, with no entry lost or written twice.
+"""
+
+import asyncio
+
+import pytest
+
+from pokedex import Pokedex, Request
+from pokemonretriever.pokedex_json import codec
+from pokemonretriever.pokedex_progress import PokedexInputFile, \
+    PokedexProgress
+
+CHUNK_SIZE = 5
+
+
+class Interrupted(Exception):
+    """
+    Stands in for whatever stops a run, such as a KeyboardInterrupt.
+    """
+
+
+class InterruptedPokedex(Pokedex):
+    """
+    A Pokedex interrupted once the input lines up to `line` are done,
+    after the entries of the next chunk are written but before their
+    checkpoint is saved.
+    """
+    line = 2 * CHUNK_SIZE
+
+    def checkpoint(self, writer, line: int):
+        if line > self.line:
+            raise Interrupted
+        super().checkpoint(writer, line)
+
+
+def generate(pokedex_type, **options):
+    request = Request("pokemon", use_cache=False, index_file=None,
+                      chunk_size=CHUNK_SIZE, **options)
+
+    async def run():
+        async with request.api:
+            await pokedex_type(request).generate_report()
+
+    asyncio.run(run())
+
+
+@pytest.fixture
+def input_file(fixtures, tmp_path):
+    names = [record["name"] for record in fixtures.records("pokemon")[:21]]
+    names.insert(3, "missingno")
+    path = tmp_path / "input.txt"
+    path.write_text("\n".join(names) + "\n")
+    return str(path)
+
+
+def test_input_file_is_read_in_chunks(input_file):
+    chunks = list(PokedexInputFile(input_file, CHUNK_SIZE).chunks())
+    assert [line for line, _ in chunks] == [5, 10, 15, 20, 22]
+    assert [len(chunk) for _, chunk in chunks] == [5, 5, 5, 5, 2]
+    assert list(PokedexInputFile(input_file, CHUNK_SIZE).chunks(12)) == \
+        [(17, chunks[2][1][2:] + chunks[3][1][:2]),
+         (22, chunks[3][1][2:] + chunks[4][1])]
+
+
+@pytest.mark.parametrize("output_format", ["text", "csv", "jsonl",
+                                           "columnar"])
+@pytest.mark.parametrize("options", [{}, {"stream": True, "ordered": True},
+                                     {"expanded": True, "workers": 2}],
+                         ids=["batch", "stream", "workers"])
+def test_resumed_report_is_the_uninterrupted_report(mock_api, tmp_path,
+                                                    capsys, input_file,
+                                                    output_format,
+                                                    options):
+    _, url = mock_api()
+    options = dict(options, input_file=input_file, api_url=url,
+                   output_format=output_format)
+    expected = tmp_path / "expected.out"
+    generate(Pokedex, output_file=str(expected), **options)
+    assert capsys.readouterr().out.count("Error: ") == 1
+
+    output = tmp_path / "report.out"
+    with pytest.raises(Interrupted):
+        generate(InterruptedPokedex, output_file=str(output), **options)
+    path = tmp_path / ("report.out" + PokedexProgress.SUFFIX)
+    progress = codec.loads(path.read_bytes())
+    assert progress["line"] == InterruptedPokedex.line
+    assert output.stat().st_size > progress["offset"]
+    assert progress["failures"] == \
+        ["Could not retrieve pokemon 'missingno': 404 Not Found"]
+
+    capsys.readouterr()
+    generate(Pokedex, output_file=str(output), resume=True, **options)
+    assert capsys.readouterr().out.count("Error: ") == 1
+    assert output.read_bytes() == expected.read_bytes()
+    assert not path.exists()
+
+
+def test_progress_of_another_report_is_refused(tmp_path):
+    path = str(tmp_path / "report.progress")
+    PokedexProgress(path, {"mode": "pokemon"}).save(5, 120, 4, [])
+    assert PokedexProgress.load(path, {"mode": "pokemon"}).offset == 120
+    with pytest.raises(ValueError):
+        PokedexProgress.load(path, {"mode": "move"})
@@ -0,0 +1,199 @@
+"""
+Tests of the query engine: every query answers what a scan of the
+generated dataset finds, and the planner picks the most selective
+indexes.
+"""
+
+import operator
+
+import pytest
+
+from pokemonretriever.pokedex_object import PokemonAbility
+from pokemonretriever.pokedex_query import PokedexQuery, \
+    PokedexQueryEngine, PokedexQueryError
+
+COMPARISONS = {"=": operator.eq, "!=": operator.ne, "<": operator.lt,
+               "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+QUERIES = {
+    "pokemon": ["", "type = fire", "type = water and speed > 100",
+                "attack >= 120 and defense < 60", "total >= 650",
+                "ability = ability-3", "move = move-10 and type != normal",
+                "type = fire and type = flying", "hp = 100",
+                "name = pokemon-5", "id <= 10 and id != 3",
+                "move = move-9999", "weight > 5000 and height <= 50",
+                "type = 'grass' and move = move-1 and ability = ability-2",
+                "special-attack >= 100 and ability != ability-1"],
+    "move": ["power >= 90 and accuracy = 100",
+             "type = fire and damage_class = special", "accuracy != 100",
+             "generation = 4", "pp <= 10 and power < 50",
+             "damage_class = status and pp > 20"],
+    "ability": ["generation = iii", "id > 50", "name = ability-7"],
+}
+
+
+def attributes(req_type: str, record: dict) -> dict:
+    """
+    Reads the queryable attributes of a response, as a scan would.
+    """
+    values = {"id": record["id"], "name": record["name"]}
+    if req_type == "pokemon":
+        stats = {stat["stat"]["name"].replace("-", "_"): stat["base_stat"]
+                 for stat in record["stats"]}
+        values.update(stats, height=record["height"],
+                      weight=record["weight"], total=sum(stats.values()),
+                      type={entry["type"]["name"]
+                            for entry in record["types"]},
+                      ability={entry["ability"]["name"]
+                               for entry in record["abilities"]},
+                      move={entry["move"]["name"]
+                            for entry in record["moves"]})
+    elif req_type == "move":
+        values.update({field: record[field]
+                       for field in ("accuracy", "pp", "power")},
+                      type=record["type"]["name"],
+                      damage_class=record["damage_class"]["name"],
+                      generation=record["generation"]["name"])
+    else:
+        values["generation"] = record["generation"]["name"]
+    return values
+
+
+def scan(fixtures, req_type: str, expression: str) -> list:
+    """
+    Filters the generated records one by one.
+    """
+    query = PokedexQuery.parse(req_type, expression)
+    names = []
+    for record in fixtures.records(req_type):
+        values = attributes(req_type, record)
+        if all(matches(predicate, values[predicate.field])
+               for predicate in query.predicates):
+            names.append(record["name"])
+    return names
+
+
+def matches(predicate, value) -> bool:
+    """
+    Checks a predicate on a scanned value. A pokemon has a type, ability
+    or move if it is in its set.
+    """
+    if isinstance(value, set):
+        return (predicate.value in value) == (predicate.comparison == "=")
+    return value is not None and \
+        COMPARISONS[predicate.comparison](value, predicate.value)
+
+
+@pytest.fixture
+def engine(store):
+    return PokedexQueryEngine(store)
+
+
+@pytest.mark.parametrize("req_type, expression", [
+    (req_type, expression) for req_type, expressions in QUERIES.items()
+    for expression in expressions])
+def test_results_equal_a_scan(fixtures, engine, req_type, expression):
+    names = [engine.store.name(req_type, position)
+             for position in engine.select(req_type, expression)]
+    assert names == scan(fixtures, req_type, expression)
+
+
+def test_the_scan_finds_results(fixtures):
+    assert all(scan(fixtures, "pokemon", expression)
+               for expression in QUERIES["pokemon"][1:6])
+
+
+def test_sort_and_limit(fixtures, engine):
+    water = [record for record in fixtures.records("pokemon")
+             if record["name"] in scan(fixtures, "pokemon", "type = water")]
+    fastest = sorted(water, key=lambda record: -record["stats"][5][
+        "base_stat"])[:5]
+    positions = engine.select("pokemon", "type = water", sort="speed",
+                              descending=True, limit=5)
+    assert [engine.store.name("pokemon", position)
+            for position in positions] == \
+        [record["name"] for record in fastest]
+
+
+def test_records_without_a_value_sort_last(fixtures, engine):
+    moves = fixtures.records("move")
+    positions = engine.select("move", "", sort="power")
+    powers = [moves[position]["power"] for position in positions]
+    present = [power for power in powers if power is not None]
+    assert present == sorted(present)
+    assert powers == present + [None] * (len(powers) - len(present))
+
+
+def test_query_builds_the_objects(engine):
+    objects = engine.query("ability", "id <= 3", sort="id",
+                           descending=True)
+    assert all(isinstance(ability, PokemonAbility) for ability in objects)
+    assert [ability.id for ability in objects] == [3, 2, 1]
+
+
+def test_generations_are_spelled_in_any_way(engine):
+    results = engine.select("move", "generation = generation-iv")
+    assert results == engine.select("move", "generation = iv") == \
+        engine.select("move", "generation = 4")
+
+
+def test_plan_without_a_selective_index_scans(engine):
+    for expression in ("", "id > 0", "type != fire"):
+        plan = engine.plan("pokemon", expression)
+        assert plan.access == []
+        assert "Plan: scan" in str(plan)
+    plan = engine.plan("pokemon", "id > 0 and type != fire")
+    assert [str(predicate) for predicate in plan.filters] == \
+        ["id > 0", "type != fire"]
+
+
+def test_plan_looks_up_equality_in_the_index(engine):
+    plan = engine.plan("pokemon", "name = pokemon-5 and speed > 10")
+    assert [predicate.field for predicate in plan.access] == ["name"]
+    assert plan.estimate == 1
+    assert [predicate.field for predicate in plan.filters] == ["speed"]
+
+
+def test_plan_intersects_posting_lists_smallest_first(engine):
+    postings = engine.table("pokemon").indexes["type"].postings
+    plan = engine.plan("pokemon", "type = water and move = move-1 and "
+                                  "ability = ability-2")
+    counts = [postings.count(predicate.field, predicate.value)
+              for predicate in plan.access]
+    assert len(plan.access) == 3
+    assert counts == sorted(counts)
+    assert plan.estimate == counts[0]
+    assert "Plan: intersect" in str(plan)
+
+
+def test_plan_uses_only_the_most_selective_range(engine):
+    plan = engine.plan("pokemon", "attack > 150 and id <= 4")
+    assert [str(predicate) for predicate in plan.access] == ["id <= 4"]
+    assert [str(predicate) for predicate in plan.filters] == \
+        ["attack > 150"]
+    assert plan.estimate == 4
+
+
+def test_plan_prefers_a_range_smaller_than_the_postings(engine):
+    plan = engine.plan("pokemon", "type = water and id <= 2")
+    assert [predicate.field for predicate in plan.access] == ["id", "type"]
+    plan = engine.plan("pokemon", "name = pokemon-9 and id <= 50")
+    assert [predicate.field for predicate in plan.access] == ["name"]
+
+
+def test_plan_of_a_missing_value_is_empty(engine):
+    plan = engine.plan("pokemon", "move = move-9999 and speed > 10")
+    assert plan.estimate == 0
+    assert plan.execute() == []
+
+
+@pytest.mark.parametrize("expression", [
+    "power >=", "power >= high", "colour = red", "type > fire",
+    "power >= 90 or pp = 5", "power @ 5", "= 5", "power >= 90 and"])
+def test_malformed_expressions(engine, expression):
+    with pytest.raises(PokedexQueryError):
+        engine.select("move", expression)
+
+
+def test_unknown_sort(engine):
+    with pytest.raises(PokedexQueryError):
+        engine.select("move", "", sort="colour")
@@ -0,0 +1,151 @@
+"""
+Tests of the conditional revalidation of cached responses against the
+mock server: expired entries are requested with their validators, a 304
+reuses the cached body, and a changed resource replaces the entry.
+"""
+
+import asyncio
+import random
+
+import pytest
+
+from benchmarks.fixtures import PokedexFixtures
+from benchmarks.mock_server import MockPokeAPI
+from pokemonretriever.pokedex_cache import PokedexCache
+from pokemonretriever.pokedex_json import codec
+from pokemonretriever.pokedex_parser import PokedexPokemonParser
+from pokemonretriever.pokedex_request import PokedexAPI
+
+PROJECTION = PokedexPokemonParser.projection()
+
+
+class RecordingPokeAPI(MockPokeAPI):
+    """
+    A MockPokeAPI that records the validators every resource request was
+    made with and the status it was answered with.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+
+    async def get_resource(self, request):
+        response = await super().get_resource(request)
+        self.requests.append((request.match_info["req_id"],
+                              request.headers.get("If-None-Match"),
+                              request.headers.get("If-Modified-Since"),
+                              response.status))
+        return response
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = PokedexCache(str(tmp_path), ttl=60)
+    yield cache
+    cache.close()
+
+
+def fetch(url: str, cache: PokedexCache, identifiers: list,
+          revalidate: bool = False) -> list:
+    api = PokedexAPI(cache=cache, base_url=url, revalidate=revalidate)
+    return asyncio.run(api.process_requests("pokemon", identifiers))
+
+
+def entry(cache: PokedexCache, req_id) -> dict:
+    row = cache.connection.execute(
+        "SELECT data, stored_at, etag, last_modified, projection "
+        "FROM responses WHERE req_type = 'pokemon' AND req_id = ?",
+        (str(req_id),)).fetchone()
+    return dict(zip(("data", "stored_at", "etag", "last_modified",
+                     "projection"), row))
+
+
+def test_fresh_entry_is_served_without_a_request(cache, mock_api):
+    server, url = mock_api(RecordingPokeAPI)
+    first = fetch(url, cache, ["1"])
+    assert fetch(url, cache, ["1"]) == first
+    assert server.requests == [("1", None, None, 200)]
+
+
+def test_expired_entry_is_requested_with_its_validators(cache, clock,
+                                                        mock_api):
+    server, url = mock_api(RecordingPokeAPI)
+    first, = fetch(url, cache, ["1"])
+    stored = entry(cache, 1)
+    assert stored["etag"] and stored["last_modified"]
+    assert stored["projection"] == PROJECTION
+    clock.advance(61)
+    assert fetch(url, cache, ["1"]) == [first]
+    assert server.requests == [
+        ("1", None, None, 200),
+        ("1", stored["etag"], stored["last_modified"], 304)]
+
+
+def test_not_modified_reuses_the_body_and_refreshes_it(cache, clock,
+                                                        mock_api):
+    server, url = mock_api(RecordingPokeAPI)
+    first, = fetch(url, cache, ["1"])
+    stored = entry(cache, 1)
+    clock.advance(61)
+    assert fetch(url, cache, ["1"]) == [first]
+    refreshed = entry(cache, 1)
+    assert refreshed["stored_at"] == stored["stored_at"] + 61
+    assert refreshed["data"] == stored["data"]
+    assert refreshed["etag"] == stored["etag"]
+    clock.advance(30)
+    fetch(url, cache, ["1"])
+    assert len(server.requests) == 2
+
+
+def test_changed_resource_replaces_the_entry(cache, clock, mock_api):
+    _, url = mock_api(RecordingPokeAPI)
+    first, = fetch(url, cache, ["1"])
+    stored = entry(cache, 1)
+    changed = PokedexFixtures(pokemon=120, moves=150, abilities=60)
+    changed.get("pokemon", 1)["height"] = first["height"] + 1
+    server, url = mock_api(RecordingPokeAPI, changed)
+    clock.advance(61)
+    second, = fetch(url, cache, ["1"])
+    assert second["height"] == first["height"] + 1
+    assert server.requests == [("1", stored["etag"],
+                                stored["last_modified"], 200)]
+    replaced = entry(cache, 1)
+    assert replaced["etag"] != stored["etag"]
+    assert replaced["stored_at"] == clock.now
+    assert codec.loads(replaced["data"]) == second
+
+
+def test_only_resources_modified_since_are_downloaded(cache, clock,
+                                                      mock_api):
+    identifiers = [str(pokemon_id) for pokemon_id in range(1, 31)]
+    _, url = mock_api(RecordingPokeAPI, change_rate=0.5)
+    first = fetch(url, cache, identifiers)
+    server, url = mock_api(RecordingPokeAPI, change_rate=0.5)
+    clock.advance(61)
+    assert fetch(url, cache, identifiers) == first
+    modified = {req_id for req_id in identifiers if random.Random(
+        f"{server.seed}:pokemon:{req_id}").random() < 0.5}
+    assert 0 < len(modified) < len(identifiers)
+    assert {req_id for req_id, _, _, status in server.requests
+            if status == 200} == modified
+    assert {req_id for req_id, _, _, status in server.requests
+            if status == 304} == set(identifiers) - modified
+
+
+def test_revalidate_checks_fresh_entries(cache, mock_api):
+    server, url = mock_api(RecordingPokeAPI)
+    first = fetch(url, cache, ["1"])
+    assert fetch(url, cache, ["1"], revalidate=True) == first
+    assert [status for _, etag, _, status in server.requests
+            if etag is not None] == [304]
+
+
+def test_entry_of_another_projection_is_downloaded_again(cache,
+                                                         mock_api):
+    server, url = mock_api(RecordingPokeAPI)
+    cache.put("pokemon", "1", {"name": "pokemon-1", "id": 1},
+              {"ETag": '"stale"'}, projection="old")
+    response, = fetch(url, cache, ["1"])
+    assert "moves" in response
+    assert server.requests == [("1", None, None, 200)]
+    assert entry(cache, 1)["projection"] == PROJECTION
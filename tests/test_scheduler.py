@@ -0,0 +1,205 @@
+"""
+Tests of the request scheduler: retries with exponential backoff,
+timeouts, the concurrency bound and the rate limit, alone and through
+PokedexAPI against the mock server.
+"""
+
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from benchmarks.mock_server import MockPokeAPI
+from pokemonretriever import pokedex_scheduler
+from pokemonretriever.pokedex_request import PokedexAPI, \
+    PokedexRequestError
+from pokemonretriever.pokedex_scheduler import RequestScheduler, \
+    TokenBucket
+
+
+class Flaky:
+    """
+    A request that fails a number of times before it succeeds.
+    """
+
+    def __init__(self, failures: int, error=None):
+        self.failures = failures
+        self.error = error if error is not None else PokedexRequestError(
+            "pokemon", "1", 503, "Service Unavailable", retryable=True)
+        self.attempts = 0
+
+    async def __call__(self):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise self.error
+        return "done"
+
+
+class RateLimitedPokeAPI(MockPokeAPI):
+    """
+    A MockPokeAPI whose failures are 429 Too Many Requests.
+    """
+
+    def failure(self) -> web.Response:
+        return web.Response(status=429, reason="Too Many Requests",
+                            headers={"Retry-After": "1"})
+
+
+def recorded_delays(scheduler: RequestScheduler) -> list:
+    """
+    Makes a scheduler retry without waiting, and records the attempts
+    it computed a delay for.
+    """
+    attempts = []
+
+    def delay(attempt, error):
+        attempts.append(attempt)
+        return 0
+
+    scheduler.delay = delay
+    return attempts
+
+
+def test_backoff_doubles_up_to_the_maximum(monkeypatch):
+    monkeypatch.setattr(pokedex_scheduler.random, "uniform",
+                        lambda low, high: high)
+    scheduler = RequestScheduler(backoff=1, max_backoff=4)
+    error = ValueError()
+    assert [scheduler.delay(attempt, error) for attempt in range(5)] == \
+        [1, 2, 4, 4, 4]
+
+
+def test_backoff_is_jittered_down_to_half():
+    scheduler = RequestScheduler(backoff=1, max_backoff=30)
+    delays = [scheduler.delay(3, ValueError()) for _ in range(200)]
+    assert all(4 <= delay <= 8 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_backoff_waits_at_least_the_retry_after():
+    scheduler = RequestScheduler(backoff=0.1, max_backoff=30)
+    error = PokedexRequestError("pokemon", "1", 429, retryable=True,
+                                retry_after=5)
+    assert scheduler.delay(0, error) == 5
+    error.retry_after = 120
+    assert scheduler.delay(0, error) == 30
+
+
+def test_retryable_errors():
+    assert RequestScheduler.is_retryable(asyncio.TimeoutError())
+    assert RequestScheduler.is_retryable(
+        PokedexRequestError("pokemon", "1", 500, retryable=True))
+    assert not RequestScheduler.is_retryable(
+        PokedexRequestError("pokemon", "1", 404))
+    assert not RequestScheduler.is_retryable(ValueError())
+
+
+def test_transient_failures_are_retried():
+    scheduler = RequestScheduler(retries=3)
+    attempts = recorded_delays(scheduler)
+    request = Flaky(2)
+    assert asyncio.run(scheduler.run(request)) == "done"
+    assert request.attempts == 3
+    assert attempts == [0, 1]
+
+
+def test_last_error_is_raised_once_the_retries_are_exhausted():
+    scheduler = RequestScheduler(retries=3)
+    attempts = recorded_delays(scheduler)
+    request = Flaky(10)
+    with pytest.raises(PokedexRequestError) as error:
+        asyncio.run(scheduler.run(request))
+    assert error.value is request.error
+    assert request.attempts == 4
+    assert attempts == [0, 1, 2]
+
+
+def test_errors_that_are_not_retryable_are_raised_at_once():
+    scheduler = RequestScheduler(retries=3)
+    request = Flaky(1, PokedexRequestError("pokemon", "1", 404))
+    with pytest.raises(PokedexRequestError):
+        asyncio.run(scheduler.run(request))
+    assert request.attempts == 1
+
+
+def test_attempts_that_time_out_are_retried():
+    scheduler = RequestScheduler(retries=1, timeout=0.05)
+    recorded_delays(scheduler)
+    attempts = []
+
+    async def request():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            await asyncio.sleep(5)
+        return "done"
+
+    assert asyncio.run(scheduler.run(request)) == "done"
+    assert attempts == [0, 1]
+
+
+def test_requests_in_flight_are_bounded():
+    scheduler = RequestScheduler(concurrency=3)
+    in_flight = []
+    most = []
+
+    async def request():
+        in_flight.append(None)
+        most.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+
+    async def run():
+        await asyncio.gather(*(scheduler.run(request) for _ in range(20)))
+
+    asyncio.run(run())
+    assert len(most) == 20
+    assert max(most) == 3
+
+
+def test_scheduler_can_be_reused_across_event_loops():
+    scheduler = RequestScheduler(concurrency=2, rps=1000)
+    assert asyncio.run(scheduler.run(Flaky(0))) == "done"
+    assert asyncio.run(scheduler.run(Flaky(0))) == "done"
+
+
+def test_token_bucket_limits_the_rate():
+    async def run():
+        bucket = TokenBucket(rate=100, capacity=1)
+        started_at = time.perf_counter()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.perf_counter() - started_at
+
+    assert asyncio.run(run()) >= 0.045
+
+
+def test_server_errors_are_retried_against_the_mock_server(mock_api):
+    _, url = mock_api(error_rate=0.3, seed=7)
+    statuses = []
+    api = PokedexAPI(base_url=url,
+                     scheduler=RequestScheduler(retries=10, backoff=0.001),
+                     request_hook=lambda req_type, req_id, status, seconds:
+                     statuses.append(status))
+    responses = asyncio.run(api.process_requests(
+        "pokemon", [str(pokemon_id) for pokemon_id in range(1, 41)]))
+    assert [response["id"] for response in responses] == \
+        list(range(1, 41))
+    assert api.failures == []
+    assert 503 in statuses
+    assert statuses.count(200) == 40
+
+
+def test_rate_limited_requests_fail_with_the_retry_after(mock_api):
+    _, url = mock_api(RateLimitedPokeAPI, error_rate=1)
+    statuses = []
+    api = PokedexAPI(base_url=url,
+                     scheduler=RequestScheduler(retries=2,
+                                                max_backoff=0.01),
+                     request_hook=lambda req_type, req_id, status, seconds:
+                     statuses.append(status))
+    assert asyncio.run(api.process_requests("pokemon", ["1"])) == [None]
+    assert statuses == [429, 429, 429]
+    failure, = api.failures
+    assert (failure.status, failure.retryable, failure.retry_after) == \
+        (429, True, 1)
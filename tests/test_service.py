@@ -0,0 +1,158 @@
+"""
+Tests of the pokedex service, through an aiohttp test client against
+the mock PokeAPI: lookups, malformed lookups and the failures each
+lookup reports.
+"""
+
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from benchmarks.mock_server import MockPokeAPI
+from pokemonretriever.pokedex_json import codec
+from pokemonretriever.pokedex_request import PokedexAPI
+from pokemonretriever.pokedex_service import PokedexService
+
+
+class BrokenMovePokeAPI(MockPokeAPI):
+    """
+    A MockPokeAPI that answers 404 for the moves in `broken`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.broken = set()
+
+    async def get_resource(self, request):
+        if request.match_info["req_type"] == "move" \
+                and request.match_info["req_id"] in self.broken:
+            return web.Response(status=404, reason="Not Found")
+        return await super().get_resource(request)
+
+
+def serve(url: str, scenario):
+    """
+    Runs a scenario against a PokedexService of the mock PokeAPI.
+    :param url: a string, the root url of the mock PokeAPI.
+    :param scenario: an async function of the service and a TestClient.
+    """
+    async def run():
+        async with PokedexAPI(base_url=url) as api:
+            service = PokedexService(api)
+            async with TestClient(TestServer(service.application())) \
+                    as client:
+                return await scenario(service, client)
+
+    return asyncio.run(run())
+
+
+async def get(client, path: str, **params) -> tuple:
+    response = await client.get(path, params=params)
+    return response.status, codec.loads(await response.read())
+
+
+def test_get_lookup(mock_api):
+    _, url = mock_api()
+
+    async def scenario(service, client):
+        status, body = await get(client, "/pokemon",
+                                 inputdata="pokemon-1, 2,pokemon-1")
+        assert status == 200
+        assert [result["id"] for result in body["results"]] == [1, 2, 1]
+        assert body["errors"] == []
+        status, body = await get(client, "/health")
+        assert (status, body["status"], body["objects"]) == (200, "ok", 3)
+
+    serve(url, scenario)
+
+
+def test_post_lookup(mock_api):
+    _, url = mock_api()
+
+    async def scenario(service, client):
+        response = await client.post("/pokemon", data=codec.dumps({
+            "inputdata": ["pokemon-3", 4], "expand": ["abilities"],
+            "format": "text"}))
+        assert response.status == 200
+        text = await response.text()
+        objects, _ = await service.lookup("pokemon", ["pokemon-3", "4"],
+                                          ("abilities",))
+        assert text == "".join(str(result) + "\n" for result in objects)
+        assert "<Pokemon Abilities>" in text
+
+    serve(url, scenario)
+
+
+def test_malformed_lookups(mock_api):
+    _, url = mock_api()
+
+    async def scenario(service, client):
+        for params in ({"inputdata": "1", "expand": "wings"},
+                       {"inputdata": "1", "format": "xml"},
+                       {"expand": "moves"}):
+            status, body = await get(client, "/pokemon", **params)
+            assert status == 400
+            assert body["error"]
+        response = await client.post("/pokemon", data=b"{inputdata")
+        assert response.status == 400
+        status, _ = await get(client, "/item", inputdata="1")
+        assert status == 404
+
+    serve(url, scenario)
+
+
+def test_lookup_that_finds_nothing(mock_api):
+    _, url = mock_api()
+
+    async def scenario(service, client):
+        status, body = await get(client, "/move", inputdata="missingno")
+        assert status == 404
+        assert body == {"results": [], "errors": [
+            "Could not retrieve move 'missingno': 404 Not Found"]}
+        status, body = await get(client, "/move",
+                                 inputdata="missingno,move-1")
+        assert status == 200
+        assert len(body["results"]) == len(body["errors"]) == 1
+
+    serve(url, scenario)
+
+
+def test_concurrent_lookups_report_their_own_failures(mock_api):
+    _, url = mock_api(latency=0.05)
+
+    async def scenario(service, client):
+        lookups = [get(client, "/pokemon", inputdata=f"missingno-{index}")
+                   for index in range(8)]
+        for index, (status, body) in enumerate(
+                await asyncio.gather(*lookups)):
+            assert status == 404
+            assert body["errors"] == [f"Could not retrieve pokemon "
+                                      f"'missingno-{index}': 404 Not Found"]
+        assert service.api.failures == []
+
+    serve(url, scenario)
+
+
+def test_partial_pokemon_is_not_cached(fixtures, mock_api):
+    server, url = mock_api(BrokenMovePokeAPI)
+    record = fixtures.records("pokemon")[0]
+    move = record["moves"][0]["move"]["name"]
+    server.broken.add(move)
+
+    async def scenario(service, client):
+        service.resolver.retry_after = 0
+        status, body = await get(client, "/pokemon",
+                                 inputdata=record["name"], expand="moves")
+        assert status == 200
+        assert body["errors"] == \
+            [f"Could not retrieve move '{move}': 404 Not Found"]
+        assert service.objects == {}
+        server.broken.clear()
+        status, body = await get(client, "/pokemon",
+                                 inputdata=record["name"], expand="moves")
+        assert body["errors"] == []
+        assert list(service.objects) == [("pokemon", str(record["id"]),
+                                          ("moves",))]
+
+    serve(url, scenario)
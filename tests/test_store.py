@@ -0,0 +1,154 @@
+"""
+Tests of the memory-mapped snapshot store: every record written is read
+back as its projected response, by id, by name and in bulk.
+"""
+
+import pytest
+
+from pokemonretriever.pokedex_parser import PARSERS
+from pokemonretriever.pokedex_snapshot import PokedexSnapshot
+from pokemonretriever.pokedex_store import PokedexStore
+
+RESOURCE_TYPES = PokedexSnapshot.RESOURCE_TYPES
+STATS = ("hp", "attack", "defense", "special-attack", "special-defense",
+         "speed")
+TYPES = ("normal", "fire", "water", "grass", "flying")
+
+
+def reference(name: str) -> dict:
+    return {"name": name, "url": f"https://pokeapi.co/api/v2/{name}/"}
+
+
+def pokemon(pokemon_id: int) -> dict:
+    return {
+        "id": pokemon_id, "name": f"pokemon-{pokemon_id}",
+        "height": pokemon_id * 3, "weight": pokemon_id * 70,
+        "base_experience": 64,
+        "types": [{"slot": slot, "type": reference(name)}
+                  for slot, name in enumerate(
+                      TYPES[pokemon_id % 5:pokemon_id % 5 + 2], 1)],
+        "stats": [{"base_stat": (pokemon_id * 37 + index * 11) % 200 + 5,
+                   "effort": 0, "stat": reference(name)}
+                  for index, name in enumerate(STATS)],
+        "abilities": [{"ability": reference(f"ability-{ability_id}"),
+                       "is_hidden": False, "slot": 1}
+                      for ability_id in (pokemon_id % 3 + 1, 4)],
+        "moves": [{"move": reference(f"move-{move_id}"),
+                   "version_group_details": [
+                       {"level_learned_at": move_id * 5,
+                        "version_group": {"name": version_group}}
+                       for version_group in ("red-blue", "yellow")]}
+                  for move_id in range(1, pokemon_id % 4 + 2)],
+        "sprites": {"front_default": f"{pokemon_id}.png"}}
+
+
+def move(move_id: int) -> dict:
+    status = move_id % 3 == 0
+    return {
+        "id": move_id, "name": f"move-{move_id}",
+        "accuracy": None if move_id == 2 else 100, "pp": 5 * move_id,
+        "power": None if status else 40 + move_id * 5, "priority": 0,
+        "type": reference(TYPES[move_id % 5]),
+        "damage_class": reference("status" if status else "physical"),
+        "generation": reference("generation-i"),
+        "effect_entries": [{"effect": "Inflicts regular damage.",
+                            "short_effect": "Inflicts damage.",
+                            "language": reference("en")}],
+        "learned_by_pokemon": []}
+
+
+def ability(ability_id: int) -> dict:
+    return {
+        "id": ability_id, "name": f"ability-{ability_id}",
+        "generation": reference("generation-iii"),
+        "effect_entries": [{"effect": "Has an effect.",
+                            "short_effect": "Effect.",
+                            "language": reference("en")}],
+        "pokemon": [{"is_hidden": False, "slot": 1,
+                     "pokemon": reference(f"pokemon-{pokemon_id}")}
+                    for pokemon_id in range(ability_id, 13, 4)]}
+
+
+RECORDS = {
+    "pokemon": [pokemon(pokemon_id) for pokemon_id in range(1, 13)],
+    "move": [move(move_id) for move_id in range(1, 7)],
+    "ability": [ability(ability_id) for ability_id in range(1, 5)],
+    "stat": [{"id": stat_id, "name": name, "is_battle_only": False}
+             for stat_id, name in enumerate(STATS, 1)],
+}
+
+
+def projected(req_type: str, record: dict) -> dict:
+    return PARSERS[req_type].project(record)
+
+
+@pytest.fixture
+def store(tmp_path):
+    snapshot = PokedexSnapshot()
+    for req_type, records in RECORDS.items():
+        for record in records:
+            snapshot.add(req_type, record)
+    path = str(tmp_path / "snapshot.pdx")
+    snapshot.save(path)
+    store = PokedexSnapshot.load(path)
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("req_type", RESOURCE_TYPES)
+def test_records_round_trip(store, req_type):
+    records = RECORDS[req_type]
+    assert store.count(req_type) == len(records)
+    for record in records:
+        assert store.get(req_type, record["id"]) == \
+            projected(req_type, record)
+        assert store.get(req_type, record["name"]) == \
+            projected(req_type, record)
+    assert list(store.records(req_type)) == \
+        [projected(req_type, record) for record in records]
+
+
+def test_lookups(store):
+    assert store.find("pokemon", "7") == 6
+    assert store.find("pokemon", " POKEMON-7 ") == 6
+    assert store.find("pokemon", "007") == 6
+    assert store.get("pokemon", "missingno") is None
+    assert store.get("pokemon", 9999) is None
+    assert store.get("item", 1) is None
+    assert len(store) == sum(store.count(req_type)
+                             for req_type in RESOURCE_TYPES)
+
+
+def test_objects_equal_those_built_from_the_responses(store):
+    for req_type in RESOURCE_TYPES:
+        parser, object_type = PokedexStore.PARSERS[req_type]
+        for record in RECORDS[req_type]:
+            expected = object_type(**parser.parse(record))
+            assert str(store.build(req_type, record["name"])) == \
+                str(expected)
+
+
+def test_moves_without_a_level_round_trip(tmp_path):
+    smeargle = dict(pokemon(235), name="smeargle", moves=[
+        {"move": {"name": "sketch"},
+         "version_group_details": [{"level_learned_at": 1}]},
+        {"move": {"name": "tackle"}, "version_group_details": []}])
+    path = str(tmp_path / "snapshot.pdx")
+    PokedexSnapshot({"pokemon": [projected("pokemon", smeargle)]}) \
+        .save(path)
+    store = PokedexSnapshot.load(path)
+    assert store.get("pokemon", "smeargle") == projected("pokemon",
+                                                         smeargle)
+    assert store.build("pokemon", 235).moves == [("sketch", 1),
+                                                 ("tackle", 0)]
+    store.close()
+
+
+def test_empty_snapshot(tmp_path):
+    path = str(tmp_path / "snapshot.pdx")
+    PokedexSnapshot().save(path)
+    store = PokedexSnapshot.load(path)
+    assert len(store) == 0
+    assert store.get("pokemon", 1) is None
+    assert list(store.records("move")) == []
+    store.close()
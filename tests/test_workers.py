@@ -0,0 +1,40 @@
+"""
+Tests of the worker pool: reports rendered in worker processes are byte
+for byte the reports rendered in the event loop.
+"""
+
+import asyncio
+
+import pytest
+
+from pokedex import Request, run
+
+
+def report(url: str, tmp_path, name: str, mode: str, **options) -> bytes:
+    """
+    Runs a request against the mock PokeAPI and reads its report back.
+    """
+    output_file = tmp_path / f"{name}.out"
+    asyncio.run(run(Request(mode, input_file=str(tmp_path / "input.txt"),
+                            output_file=str(output_file), use_cache=False,
+                            api_url=url, index_file=None, **options)))
+    return output_file.read_bytes()
+
+
+@pytest.mark.parametrize("mode", ["pokemon", "move", "ability"])
+@pytest.mark.parametrize("expanded", [False, True])
+@pytest.mark.parametrize("output_format", ["text", "csv", "jsonl"])
+def test_worker_report_is_the_in_process_report(fixtures, mock_api, tmp_path,
+                                                capsys, mode, expanded,
+                                                output_format):
+    _, url = mock_api()
+    names = [record["name"] for record in fixtures.records(mode)[:70]]
+    identifiers = names[::2] + ["missingno"] + names[1::2] + names[:5]
+    (tmp_path / "input.txt").write_text("\n".join(identifiers) + "\n")
+    expected = report(url, tmp_path, "in-process", mode, expanded=expanded,
+                      output_format=output_format)
+    actual = report(url, tmp_path, "workers", mode, expanded=expanded,
+                    output_format=output_format, workers=2)
+    assert expected
+    assert actual == expected
+    assert capsys.readouterr().out.count("Error: ") == 2
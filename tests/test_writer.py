@@ -0,0 +1,117 @@
+"""
+Tests of the report writers: columnar files read back as the records
+written, and csv files have the record schema of their mode as header.
+"""
+
+import csv
+
+import pytest
+
+from pokemonretriever.pokedex_json import codec
+from pokemonretriever.pokedex_object import Pokemon, PokemonAbility, \
+    PokemonMove, PokemonStat
+from pokemonretriever.pokedex_store import PokedexStore
+from pokemonretriever.pokedex_writer import CSVWriter, ColumnarReader, \
+    ColumnarWriter, JSONLinesWriter
+
+MODES = {"pokemon": Pokemon, "ability": PokemonAbility, "move": PokemonMove}
+
+
+def objects(fixtures, req_type: str, count: int = None) -> list:
+    """
+    Builds the objects of the generated records of a resource type.
+    """
+    parser, object_type = PokedexStore.PARSERS[req_type]
+    return [object_type(**parser.parse(record))
+            for record in fixtures.records(req_type)[:count]]
+
+
+def write(writer_type, path: str, pokedex_objects: list, **options):
+    with writer_type(path, **options) as writer:
+        for pokedex_object in pokedex_objects:
+            writer.write(pokedex_object)
+    assert writer.count == len(pokedex_objects)
+
+
+@pytest.mark.parametrize("req_type", sorted(PokedexStore.PARSERS))
+@pytest.mark.parametrize("row_group", [1, 7, ColumnarWriter.ROW_GROUP])
+def test_columnar_file_reads_back_the_records(fixtures, tmp_path,
+                                              req_type, row_group):
+    pokedex_objects = objects(fixtures, req_type, 40)
+    path = str(tmp_path / "report.pdxc")
+    write(ColumnarWriter, path, pokedex_objects, row_group=row_group)
+    assert list(ColumnarReader(path).records()) == \
+        [pokedex_object.to_record() for pokedex_object in pokedex_objects]
+
+
+def test_columnar_file_keeps_missing_values(fixtures, tmp_path):
+    moves = objects(fixtures, "move")
+    assert any(move.power is None for move in moves)
+    assert any(move.accuracy is None for move in moves)
+    path = str(tmp_path / "moves.pdxc")
+    write(ColumnarWriter, path, moves, row_group=16)
+    records = list(ColumnarReader(path).records())
+    assert [record["power"] for record in records] == \
+        [move.power for move in moves]
+    assert [record["accuracy"] for record in records] == \
+        [move.accuracy for move in moves]
+
+
+def test_file_that_is_not_columnar(tmp_path):
+    path = tmp_path / "report.pdxc"
+    path.write_bytes(b"NOPE" + bytes(8))
+    with pytest.raises(ValueError):
+        list(ColumnarReader(str(path)).records())
+
+
+@pytest.mark.parametrize("req_type", sorted(MODES))
+def test_csv_header_is_the_record_schema(fixtures, tmp_path, req_type):
+    object_type = MODES[req_type]
+    pokedex_objects = objects(fixtures, req_type, 10)
+    path = str(tmp_path / "report.csv")
+    write(CSVWriter, path, pokedex_objects, columns=object_type.RECORD_FIELDS)
+    with open(path, encoding="UTF-8", newline="") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == list(object_type.RECORD_FIELDS)
+    for pokedex_object in pokedex_objects:
+        record = pokedex_object.to_record()
+        assert list(record) == [field for field in rows[0]
+                                if field in record]
+    assert len(rows) == len(pokedex_objects) + 1
+    for row, pokedex_object in zip(rows[1:], pokedex_objects):
+        assert row[:2] == [pokedex_object.name, str(pokedex_object.id)]
+
+
+def test_csv_of_moves_with_and_without_learners(fixtures, tmp_path):
+    moves = objects(fixtures, "move", 2)
+    moves[0].learners = ["pokemon-1", "pokemon-2"]
+    path = str(tmp_path / "moves.csv")
+    write(CSVWriter, path, moves, columns=PokemonMove.RECORD_FIELDS)
+    with open(path, encoding="UTF-8", newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert codec.loads(rows[0]["learners"]) == ["pokemon-1", "pokemon-2"]
+    assert rows[1]["learners"] == ""
+
+
+def test_csv_row_with_unknown_keys_is_refused(fixtures, tmp_path):
+    path = str(tmp_path / "report.csv")
+    with pytest.raises(ValueError, match="is_battle_only"):
+        write(CSVWriter, path, objects(fixtures, "stat"),
+              columns=("name", "id"))
+
+
+def test_csv_header_defaults_to_the_first_record(fixtures, tmp_path):
+    stats = objects(fixtures, "stat")
+    path = str(tmp_path / "stats.csv")
+    write(CSVWriter, path, stats)
+    with open(path, encoding="UTF-8", newline="") as file:
+        header = next(csv.reader(file))
+    assert header == list(PokemonStat.RECORD_FIELDS)
+
+
+def test_json_lines(fixtures, tmp_path):
+    abilities = objects(fixtures, "ability", 5)
+    path = tmp_path / "report.jsonl"
+    write(JSONLinesWriter, str(path), abilities)
+    assert [codec.loads(line) for line in path.read_bytes().splitlines()] \
+        == [ability.to_record() for ability in abilities]